@@ -0,0 +1,263 @@
+# core/accruals.py
+"""
+假期累計引擎：依假期策略的頻率 (每日 / 每週 / 每月 / 每年) 為所有符合資格的員工
+計算任意日期範圍內應入帳的期間，寫入 LeaveAccrual 帳本並更新 LeaveBalance。
+
+- 每一期以 (員工, 策略, 期間起始日) 為唯一鍵，重新執行不會重複入帳。
+- 從每位員工最後入帳的期間 (不論是哪個策略) 結束後開始計算，停機期間漏掉的期數會自動補上；
+  員工更換策略時不會重複入帳已由舊策略涵蓋的期間。
+- 舊版指令已在到職週年日入帳的年度假期，由 migration 0035 寫入帳本作為起點，不會再入帳一次。
+- 每日 / 每週 / 每月在期間結束後入帳；每年沿用原本的做法，在到職週年日入帳。
+- 以天為單位的策略依員工班表的每日工時換算成小時，而不是固定 8 小時。
+- 每位員工的下次入帳日 (已考慮等待期與到職週年日) 存放在有索引的欄位中，
+  排程只需處理 next_accrual_date <= 今天 的員工，而不是每次掃描全部員工。
+"""
+from bisect import bisect_right
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from decimal import Decimal
+
+from dateutil.relativedelta import relativedelta
+from django.db import transaction
+from django.db.models import Max, Q
+
+from .models import Employee, LeaveAccrual, LeaveBalance, LeaveType
+
+ANNUAL_LEAVE_TYPE = 'Annual Leave'
+
+DEFAULT_DAILY_HOURS = Decimal('8.00')
+# 班次超過這個時數時扣除 1 小時午休
+LUNCH_BREAK_THRESHOLD_HOURS = 5
+
+# 從未入帳過的員工 (例如剛啟用新引擎) 最多往回補算的天數；更早的期間請用 --start 明確補跑
+ACCRUAL_DEFAULT_LOOKBACK_DAYS = 31
+
+ACCRUAL_CHUNK_SIZE = 500
+
+
+def daily_work_hours(employee):
+    """
+    依員工班表計算平均每日工時 (扣除午休)；沒有班表時為 8 小時。
+    employee 應已 prefetch_related('work_schedule__rules')。
+    """
+    return schedule_daily_hours(employee.work_schedule)
+
+
+def schedule_daily_hours(schedule):
+    """班表的平均每日工時 (扣除午休)；schedule 為 None 或沒有規則時為 8 小時。"""
+    if not schedule:
+        return DEFAULT_DAILY_HOURS
+    durations = []
+    for rule in schedule.rules.all():
+        start = datetime.combine(date.min, rule.start_time)
+        end = datetime.combine(date.min, rule.end_time)
+        if end <= start:
+            end += timedelta(days=1) # 跨夜班
+        hours = Decimal((end - start).total_seconds()) / Decimal(3600)
+        if hours > LUNCH_BREAK_THRESHOLD_HOURS:
+            hours -= 1
+        durations.append(hours)
+    if not durations:
+        return DEFAULT_DAILY_HOURS
+    return (sum(durations) / len(durations)).quantize(Decimal('0.01'))
+
+
+def waiting_period_end(employee, policy):
+    if policy.waiting_period_unit == 'MONTHS':
+        return employee.hire_date + relativedelta(months=policy.waiting_period_amount)
+    return employee.hire_date + relativedelta(days=policy.waiting_period_amount)
+
+
+def years_of_service(hire_date, on_date):
+    return relativedelta(on_date, hire_date).years
+
+
+def entitlement_for_service(policy, years, rules=None):
+    """
+    套用年資規則後每一期的數量 (策略單位)：只採用年資門檻最高的一條規則。
+    rules 為依年資排序的 PolicyRule 清單 (預設讀取 prefetch 的 policy.rules)。
+    """
+    rules = list(policy.rules.all()) if rules is None else rules
+    index = bisect_right([rule.years_of_service for rule in rules], years)
+    if not index:
+        return policy.accrual_amount
+    rule = rules[index - 1]
+    if rule.rule_type == 'SET':
+        return rule.adjustment_amount
+    return policy.accrual_amount + rule.adjustment_amount
+
+
+def accrual_periods(frequency, hire_date, first, as_of):
+    """
+    產生起始日不早於 first、且到 as_of 為止已可入帳的期間 [(起始日, 結束日)]。
+    每日 / 每週 / 每月：期間結束後 (結束日早於 as_of) 入帳；每年：到職週年日當天入帳。
+    """
+    if frequency == 'DAILY':
+        day = first
+        while day < as_of:
+            yield day, day
+            day += timedelta(days=1)
+    elif frequency == 'WEEKLY':
+        monday = first + timedelta(days=(7 - first.weekday()) % 7)
+        while monday + timedelta(days=6) < as_of:
+            yield monday, monday + timedelta(days=6)
+            monday += timedelta(days=7)
+    elif frequency == 'MONTHLY':
+        month = first if first.day == 1 else (first.replace(day=1) + relativedelta(months=1))
+        while month + relativedelta(months=1) <= as_of:
+            yield month, month + relativedelta(months=1) - timedelta(days=1)
+            month += relativedelta(months=1)
+    elif frequency == 'YEARLY':
+        years = max(years_of_service(hire_date, first), 1)
+        while True:
+            anniversary = hire_date + relativedelta(years=years)
+            if anniversary > as_of:
+                break
+            if anniversary >= first:
+                yield anniversary, hire_date + relativedelta(years=years + 1) - timedelta(days=1)
+            years += 1
+
+
+def _last_accrued(employees):
+    """{員工ID: 最後入帳的期間結束日}，不分策略 (以期間結束日為準，換策略後從舊策略涵蓋的期間之後開始)。"""
+    return {
+        row['employee_id']: row['last']
+        for row in LeaveAccrual.objects.filter(employee__in=employees)
+        .values('employee_id').annotate(last=Max('period_end'))
+    }
+
+
+def _first_unaccrued_day(emp, last, as_of):
+    """從哪一天開始找尚未入帳的期間：最後入帳期間結束的隔天，從未入帳時往回 ACCRUAL_DEFAULT_LOOKBACK_DAYS 天。"""
+    first = last + timedelta(days=1) if last is not None else as_of - timedelta(days=ACCRUAL_DEFAULT_LOOKBACK_DAYS)
+    return max(first, waiting_period_end(emp, emp.leave_policy), emp.hire_date)
+
+
+def accrual_credit_date(frequency, period_start, period_end):
+    """期間實際入帳的日期：每年在期間起始日 (到職週年日)，其他頻率在期間結束的隔天。"""
+    if frequency == 'YEARLY':
+        return period_start
+    return period_end + timedelta(days=1)
+
+
+def refresh_next_due(employees, today=None):
+    """重新計算並批次寫入員工的下次入帳日。"""
+    today = today or date.today()
+    employees = [emp for emp in employees]
+    last_accrued = _last_accrued([emp for emp in employees if emp.leave_policy_id])
+
+    for emp in employees:
+        policy = emp.leave_policy
+        if policy is None or emp.status != 'Active':
+            emp.next_accrual_date = None
+            continue
+        first = _first_unaccrued_day(emp, last_accrued.get(emp.id), today)
+        period = next(accrual_periods(policy.accrual_frequency, emp.hire_date, first, date.max), None)
+        if period is None:
+            emp.next_accrual_date = None
+        else:
+            emp.next_accrual_date = accrual_credit_date(policy.accrual_frequency, *period)
+
+    Employee.objects.bulk_update(employees, ['next_accrual_date'], batch_size=1000)
+
+
+def _eligible_employees(employee_ids=None, due_on=None):
+    employees = (
+        Employee.objects.filter(status='Active', leave_policy__isnull=False)
+        .select_related('leave_policy', 'work_schedule')
+        .prefetch_related('leave_policy__rules', 'work_schedule__rules')
+        .order_by('id')
+    )
+    if employee_ids is not None:
+        employees = employees.filter(id__in=employee_ids)
+    if due_on is not None:
+        # 下次入帳日尚未計算過 (NULL) 的員工也要處理一次
+        employees = employees.filter(Q(next_accrual_date__lte=due_on) | Q(next_accrual_date__isnull=True))
+    return employees
+
+
+def plan_accruals(employees, leave_type, as_of, start=None, since=None):
+    """
+    計算 employees 到 as_of 為止尚未入帳的期間，回傳未儲存的 LeaveAccrual 清單。
+    start 為 None 時從每位員工最後入帳的期間之後開始 (自動補上漏掉的期數)；
+    從未入帳過的員工以 since (預設 as_of) 往回 ACCRUAL_DEFAULT_LOOKBACK_DAYS 天為起點，預測未來入帳時傳入今天。
+    """
+    employees = list(employees)
+    last_accrued = _last_accrued(employees)
+
+    planned = []
+    for emp in employees:
+        policy = emp.leave_policy
+        rules = list(policy.rules.all())
+        if start is not None:
+            first = max(start, waiting_period_end(emp, policy), emp.hire_date)
+        else:
+            first = _first_unaccrued_day(emp, last_accrued.get(emp.id), since or as_of)
+
+        hours_per_day = daily_work_hours(emp) if policy.accrual_unit == 'DAYS' else None
+        for period_start, period_end in accrual_periods(policy.accrual_frequency, emp.hire_date, first, as_of):
+            if emp.termination_date and period_start > emp.termination_date:
+                break
+            amount = entitlement_for_service(policy, years_of_service(emp.hire_date, period_start), rules)
+            hours = amount * hours_per_day if hours_per_day is not None else amount
+            planned.append(LeaveAccrual(
+                employee_id=emp.id, policy_id=policy.id, leave_type=leave_type,
+                period_start=period_start, period_end=period_end,
+                amount=amount, hours=hours.quantize(Decimal('0.01')),
+            ))
+
+    # start 明確指定時可能與已入帳的期間重疊：排除已存在的唯一鍵
+    if planned and start is not None:
+        existing = set(
+            LeaveAccrual.objects.filter(employee__in=employees, period_start__gte=start)
+            .values_list('employee_id', 'policy_id', 'period_start')
+        )
+        planned = [a for a in planned if (a.employee_id, a.policy_id, a.period_start) not in existing]
+    return planned
+
+
+def _credit_balances(accruals, leave_type):
+    """把一批入帳的時數依員工加總後，一次更新 (或建立) LeaveBalance。"""
+    hours_by_employee = defaultdict(Decimal)
+    for accrual in accruals:
+        hours_by_employee[accrual.employee_id] += accrual.hours
+
+    balances = {
+        balance.employee_id: balance
+        for balance in LeaveBalance.objects.select_for_update().filter(employee_id__in=hours_by_employee, leave_type=leave_type)
+    }
+    for employee_id, hours in hours_by_employee.items():
+        if employee_id in balances:
+            balances[employee_id].balance_hours += hours
+    LeaveBalance.objects.bulk_update(balances.values(), ['balance_hours'])
+    LeaveBalance.objects.bulk_create([
+        LeaveBalance(employee_id=employee_id, leave_type=leave_type, balance_hours=hours)
+        for employee_id, hours in hours_by_employee.items() if employee_id not in balances
+    ])
+
+
+def accrue_leave(as_of=None, start=None, employee_ids=None, due_only=False, dry_run=False, chunk_size=ACCRUAL_CHUNK_SIZE):
+    """
+    為符合資格的員工入帳到 as_of (預設今天) 為止的假期，回傳 {'employees', 'periods', 'hours'}。
+    due_only=True 時只處理下次入帳日已到的員工 (排程使用)。
+    每個批次的員工在同一個交易中寫入帳本、餘額與下次入帳日。
+    """
+    as_of = as_of or date.today()
+    leave_type = LeaveType.objects.get(name__iexact=ANNUAL_LEAVE_TYPE)
+    stats = {'employees': 0, 'periods': 0, 'hours': Decimal('0')}
+
+    employees = list(_eligible_employees(employee_ids, due_on=as_of if due_only else None))
+    for offset in range(0, len(employees), chunk_size):
+        chunk = employees[offset:offset + chunk_size]
+        with transaction.atomic():
+            planned = plan_accruals(chunk, leave_type, as_of, start)
+            stats['employees'] += len({accrual.employee_id for accrual in planned})
+            stats['periods'] += len(planned)
+            stats['hours'] += sum((accrual.hours for accrual in planned), Decimal('0'))
+            if dry_run:
+                continue
+            # 唯一鍵同時防止兩個程序並行入帳：衝突時整個批次回滾，下次執行再補上
+            LeaveAccrual.objects.bulk_create(planned, batch_size=1000)
+            _credit_balances(planned, leave_type)
+            refresh_next_due(chunk, as_of)
+    return stats
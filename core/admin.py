@@ -8,17 +8,23 @@ from .models import (Role,Department, Position, Employee, LeaveType, LeaveReques
                      OnboardingChecklist, EmployeeTask, SiteConfiguration, LeavePolicy, 
                      PolicyRule, WorkSchedule, ScheduleRule, DutyShift, ContractTemplate,SalaryHistory,
                      PublicHoliday, LeaveBalanceAdjustment,JobOpening, Candidate, Application, EmailTemplate
-                     ,PayrollRun, Payslip, PayslipItem, SalaryHistory,PayrollConfiguration, LeaveBalance) # 確保所有模型都已匯入
-from django.urls import reverse
+                     ,PayrollRun, Payslip, PayslipItem, SalaryHistory,PayrollConfiguration, LeaveBalance,
+                     StaffingRequirement, Interview, AttendanceNetworkPolicy, AttendanceRecord, DailyTimesheet, MonthlyAttendanceSummary,
+                     KioskDevice, KioskPunch, AttendanceCorrection, LeaveAccrual, YearEndSettlement, HolidayCompensation, CompensatoryLeaveLot, PunchImport) # 確保所有模型都已匯入
+from django.urls import reverse, path
+from django.template.response import TemplateResponse
 from django.core.files.base import ContentFile
 from django.utils.html import format_html
-from django.shortcuts import redirect
+from django.shortcuts import redirect, get_object_or_404
 from weasyprint import HTML
 from django.template import Context, Template
 from decimal import Decimal
 from datetime import date,datetime
 import json
 import pprint # 👈 確保 pprint 已匯入
+from .staffing import forecast_from_params, MAX_FORECAST_WEEKS
+from .policy_simulator import current_settings, simulate_from_data
+from .forms import EmployeeAdminForm
 
 # --- INLINE CLASSES ---
 class ScheduleRuleInline(admin.TabularInline):
@@ -53,6 +59,10 @@ class PolicyRuleInline(admin.TabularInline):
     model = PolicyRule
     extra = 1
 
+class StaffingRequirementInline(admin.TabularInline):
+    model = StaffingRequirement
+    extra = 1
+
 # 👇 2. 新增 ApplicationInline
 class ApplicationInline(admin.TabularInline):
     model = Application
@@ -303,6 +313,7 @@ class EmailTemplateAdmin(admin.ModelAdmin):
 
 @admin.register(Employee)
 class EmployeeAdmin(admin.ModelAdmin):
+    form = EmployeeAdminForm
     list_display = ('employee_number', 'user', 'department', 'position', 'status', 'leave_policy','work_schedule')
     list_filter = ('department', 'position', 'status')
     search_fields = ('employee_number', 'user__username', 'user__first_name', 'user__last_name')
@@ -314,7 +325,7 @@ class EmployeeAdmin(admin.ModelAdmin):
             'fields': ('user', 'employee_number', 'status', 'gender', 'date_of_birth')
         }),
         ('職位資訊', {
-            'fields': ('department', 'position', 'manager', 'hire_date', 'role')
+            'fields': ('department', 'position', 'manager', 'hire_date', 'role', 'holiday_region')
         }),
         ('聯絡方式', {
             'fields': ('phone_number', 'emergency_contact_name', 'emergency_contact_phone')
@@ -325,8 +336,15 @@ class EmployeeAdmin(admin.ModelAdmin):
         ('身份資訊', {
             'fields': ('id_number', 'marital_status')
         }),
+        ('打卡機', {
+            'fields': ('badge_id', 'kiosk_pin')
+        }),
     )
 
+    def save_model(self, request, obj, form, change):
+        if form.cleaned_data.get('kiosk_pin'):
+            obj.set_kiosk_pin(form.cleaned_data['kiosk_pin'])
+        super().save_model(request, obj, form, change)
 
     inlines = [EmployeeDocumentInline, SalaryHistoryInline]
     actions = [assign_onboarding_checklist, generate_contract_action]
@@ -446,9 +464,168 @@ class SiteConfigurationAdmin(admin.ModelAdmin):
     def has_delete_permission(self, request, obj=None):
         return False
 
+@admin.register(AttendanceRecord)
+class AttendanceRecordAdmin(admin.ModelAdmin):
+    list_display = ('employee', 'clock_in', 'clock_out', 'ip_address', 'is_manual_entry', 'is_auto_closed', 'needs_review')
+    list_filter = ('needs_review', 'is_auto_closed', 'is_manual_entry', 'employee__department')
+    search_fields = ('employee__user__username', 'employee__user__first_name', 'employee__user__last_name', 'employee__employee_number')
+    raw_id_fields = ('employee',)
+    date_hierarchy = 'clock_in'
+    change_list_template = "admin/core/attendancerecord/change_list.html"
+
+    def get_urls(self):
+        custom_urls = [
+            path('import-punches/', self.admin_site.admin_view(self.import_punches_view), name='core_attendancerecord_import_punches'),
+        ]
+        return custom_urls + super().get_urls()
+
+    def import_punches_view(self, request):
+        """上傳打卡機匯出的 CSV：只存檔並排入佇列，由 process_punch_imports 排程在背景匯入。"""
+        if request.method == 'POST' and request.FILES.get('csv_file'):
+            job = PunchImport.objects.create(csv_file=request.FILES['csv_file'], uploaded_by=request.user)
+            self.message_user(request, f"已排入背景匯入 ({job.csv_file.name})，完成後可在此查看結果。", messages.SUCCESS)
+            return redirect('admin:core_punchimport_changelist')
+
+        context = dict(
+            self.admin_site.each_context(request),
+            title="匯入打卡機資料",
+            opts=self.model._meta,
+        )
+        return TemplateResponse(request, "admin/core/attendancerecord/import_punches.html", context)
+
+@admin.register(PunchImport)
+class PunchImportAdmin(admin.ModelAdmin):
+    list_display = ('csv_file', 'status', 'summary', 'uploaded_by', 'created_at', 'started_at', 'finished_at')
+    list_filter = ('status',)
+    readonly_fields = ('csv_file', 'status', 'stats', 'error', 'uploaded_by', 'created_at', 'started_at', 'finished_at')
+
+    @admin.display(description="結果")
+    def summary(self, obj):
+        stats = obj.stats
+        if not stats:
+            return '-'
+        return (
+            f"{stats.get('rows', 0)} 行：新增 {stats.get('created', 0)} 筆、補上下班時間 {stats.get('closed', 0)} 筆、"
+            f"重複略過 {stats.get('skipped', 0)} 筆；找不到員工 {stats.get('unknown_employee', 0)} 行、"
+            f"格式錯誤 {stats.get('invalid', 0)} 行、無對應上班的下班打卡 {stats.get('unmatched', 0)} 行"
+        )
+
+    # 由匯入打卡機資料頁面建立、process_punch_imports 更新，後台只供查閱
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+@admin.register(AttendanceCorrection)
+class AttendanceCorrectionAdmin(admin.ModelAdmin):
+    list_display = ('employee', 'date', 'action', 'old_clock_in', 'old_clock_out', 'new_clock_in', 'new_clock_out', 'corrected_by', 'created_at')
+    list_filter = ('action', 'employee__department')
+    search_fields = ('employee__user__username', 'employee__user__first_name', 'employee__user__last_name', 'reason')
+    date_hierarchy = 'created_at'
+
+    # 由出勤修正表格產生的稽核記錄，後台只供查閱
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+@admin.register(DailyTimesheet)
+class DailyTimesheetAdmin(admin.ModelAdmin):
+    list_display = ('employee', 'date', 'day_type', 'scheduled_minutes', 'worked_minutes', 'late_minutes', 'early_leave_minutes', 'overtime_minutes', 'is_absent', 'is_stale')
+    list_filter = ('day_type', 'is_absent', 'is_stale', 'employee__department')
+    search_fields = ('employee__user__username', 'employee__user__first_name', 'employee__user__last_name')
+    date_hierarchy = 'date'
+
+    # 由 compute_timesheets 產生，後台只供查閱
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+@admin.register(MonthlyAttendanceSummary)
+class MonthlyAttendanceSummaryAdmin(admin.ModelAdmin):
+    list_display = ('employee', 'year', 'month', 'scheduled_days', 'present_days', 'absent_days', 'late_days', 'worked_minutes', 'overtime_minutes')
+    list_filter = ('year', 'month', 'employee__department')
+    search_fields = ('employee__user__username', 'employee__user__first_name', 'employee__user__last_name')
+
+    # 由 archive_attendance 產生，後台只供查閱
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+@admin.register(AttendanceNetworkPolicy)
+class AttendanceNetworkPolicyAdmin(admin.ModelAdmin):
+    list_display = ('name', 'department', 'networks', 'is_active')
+    list_filter = ('is_active', 'department')
+    list_editable = ('is_active',)
+
+@admin.register(KioskDevice)
+class KioskDeviceAdmin(admin.ModelAdmin):
+    list_display = ('name', 'department', 'is_active', 'last_synced_at', 'kiosk_link')
+    list_filter = ('is_active', 'department')
+    readonly_fields = ('token', 'last_synced_at', 'kiosk_link')
+
+    @admin.display(description="打卡頁面")
+    def kiosk_link(self, obj):
+        if not obj.pk:
+            return "-"
+        url = reverse('core:kiosk', args=[obj.token])
+        return format_html('<a href="{}" target="_blank">{}</a>', url, url)
+
+@admin.register(KioskPunch)
+class KioskPunchAdmin(admin.ModelAdmin):
+    list_display = ('employee', 'timestamp', 'direction', 'device', 'received_at')
+    list_filter = ('device', 'direction')
+    search_fields = ('punch_id', 'employee__user__username', 'employee__employee_number')
+    date_hierarchy = 'timestamp'
+
+    # 由打卡平板同步寫入，後台只供查閱
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
 @admin.register(Department)
 class DepartmentAdmin(admin.ModelAdmin):
-    list_display = ('name', 'description', 'color')
+    list_display = ('name', 'description', 'color', 'holiday_region')
+    inlines = [StaffingRequirementInline] # 自動排班與人力預測使用的每日人力需求
+    change_list_template = "admin/core/department/change_list.html"
+
+    def get_urls(self):
+        custom_urls = [
+            path('staffing-forecast/', self.admin_site.admin_view(self.staffing_forecast_view), name='core_department_staffing_forecast'),
+        ]
+        return custom_urls + super().get_urls()
+
+    def staffing_forecast_view(self, request):
+        """未來 N 週各部門每日在班人數預測，標示低於門檻的日子。"""
+        try:
+            forecast = forecast_from_params(request.GET)
+        except ValueError as e:
+            self.message_user(request, str(e), messages.ERROR)
+            forecast = None
+
+        if forecast:
+            for dept in forecast['departments']:
+                dept['cells'] = list(zip(dept['after_pending'], dept['threshold'], dept['below_threshold']))
+
+        context = dict(
+            self.admin_site.each_context(request),
+            title="部門人力預測",
+            opts=self.model._meta,
+            forecast=forecast,
+            departments=Department.objects.all(),
+            params=request.GET,
+            selected_departments=request.GET.getlist('department'),
+            max_weeks=MAX_FORECAST_WEEKS,
+        )
+        return TemplateResponse(request, "admin/core/department/staffing_forecast.html", context)
     # 為了讓顏色選擇更直覺，可以在 Django 後台整合一個顏色選擇器套件
     # 但最簡單的方式就是直接讓管理者輸入顏色碼
 
@@ -476,11 +653,56 @@ class LeavePolicyAdmin(admin.ModelAdmin):
         ('到職等待期', {
             'fields': ('waiting_period_amount', 'waiting_period_unit')
         }),
+        ('補休設定', {
+            'fields': ('comp_leave_expiry_months',)
+        }),
         # 【↓↓↓ 新增這個區塊 ↓↓↓】
         ('其他設定', {
             'fields': ('enable_holiday_compensation',)
         }),
     )
+    change_form_template = "admin/core/leavepolicy/change_form.html"
+
+    def get_urls(self):
+        custom_urls = [
+            path('<int:policy_id>/simulate/', self.admin_site.admin_view(self.simulate_view), name='core_leavepolicy_simulate'),
+        ]
+        return custom_urls + super().get_urls()
+
+    def simulate_view(self, request, policy_id):
+        """草稿策略試算：比較修改權責發生設定與年資規則前後的年度權益，不會寫入任何資料。"""
+        policy = get_object_or_404(LeavePolicy, id=policy_id)
+        params = request.GET
+        data = {'as_of': params.get('as_of')}
+        if 'simulate' in params:
+            data.update({key: params.get(key) for key in ('accrual_frequency', 'accrual_amount', 'accrual_unit')})
+            # 年資留空的列視為刪除
+            data['rules'] = [
+                {'years_of_service': years, 'rule_type': rule_type, 'adjustment_amount': amount}
+                for years, rule_type, amount in zip(params.getlist('rule_years'), params.getlist('rule_type'), params.getlist('rule_amount'))
+                if years.strip()
+            ]
+        try:
+            simulation = simulate_from_data(policy, data)
+        except ValueError as e:
+            self.message_user(request, str(e), messages.ERROR)
+            simulation = None
+
+        draft = simulation['draft'] if simulation else current_settings(policy)
+        context = dict(
+            self.admin_site.each_context(request),
+            title=f"策略試算：{policy.name}",
+            opts=self.model._meta,
+            original=policy,
+            simulation=simulation,
+            draft=draft,
+            blank_rules=range(3), # 額外的空白列供新增規則
+            params=params,
+            frequency_choices=LeavePolicy.ACCRUAL_FREQUENCY_CHOICES,
+            unit_choices=LeavePolicy.UNIT_CHOICES,
+            rule_type_choices=PolicyRule.RULE_TYPE_CHOICES,
+        )
+        return TemplateResponse(request, "admin/core/leavepolicy/simulate.html", context)
 
 @admin.register(JobOpening)
 class JobOpeningAdmin(admin.ModelAdmin):
@@ -517,6 +739,13 @@ class ApplicationAdmin(admin.ModelAdmin):
     raw_id_fields = ('job', 'candidate')
     actions = [send_interview_invitation_action]
 
+@admin.register(Interview)
+class InterviewAdmin(admin.ModelAdmin):
+    list_display = ('application', 'start_datetime', 'end_datetime', 'location')
+    list_filter = ('start_datetime',)
+    raw_id_fields = ('application',)
+    filter_horizontal = ('interviewers',)
+
 @admin.register(PayrollRun)
 class PayrollRunAdmin(admin.ModelAdmin):
     list_display = ('__str__', 'status', 'created_at')
@@ -532,6 +761,69 @@ class PayslipAdmin(admin.ModelAdmin):
     inlines = [PayslipItemInline]
     raw_id_fields = ['employee'] # Changed from autocomplete_fields
 
+@admin.register(LeaveAccrual)
+class LeaveAccrualAdmin(admin.ModelAdmin):
+    list_display = ('employee', 'policy', 'leave_type', 'period_start', 'period_end', 'amount', 'hours', 'created_at')
+    list_filter = ('policy', 'leave_type')
+    raw_id_fields = ['employee']
+    search_fields = ('employee__user__username', 'employee__employee_number')
+    date_hierarchy = 'period_start'
+
+    # 由 accrue_leave 寫入的假期帳本，後台只供查閱
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+@admin.register(YearEndSettlement)
+class YearEndSettlementAdmin(admin.ModelAdmin):
+    list_display = ('policy', 'fiscal_year', 'employees', 'carried_over_hours', 'forfeited_hours', 'started_at', 'completed_at')
+    list_filter = ('fiscal_year', 'policy')
+
+    # 由 process_year_end 產生，後台只供查閱
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+@admin.register(PublicHoliday)
+class PublicHolidayAdmin(admin.ModelAdmin):
+    list_display = ('date', 'name', 'region', 'compensated_at')
+    list_filter = ('region',)
+    search_fields = ('name',)
+    date_hierarchy = 'date'
+
+@admin.register(HolidayCompensation)
+class HolidayCompensationAdmin(admin.ModelAdmin):
+    list_display = ('employee', 'holiday', 'leave_type', 'hours', 'created_at')
+    list_filter = ('leave_type', 'holiday')
+    raw_id_fields = ['employee']
+    search_fields = ('employee__user__username', 'employee__employee_number', 'holiday__name')
+
+    # 由 compensate_holidays 產生，後台只供查閱
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+@admin.register(CompensatoryLeaveLot)
+class CompensatoryLeaveLotAdmin(admin.ModelAdmin):
+    list_display = ('employee', 'earned_on', 'expiry_date', 'hours', 'remaining_hours', 'expired_hours')
+    list_filter = ('expiry_date',)
+    raw_id_fields = ['employee', 'overtime']
+    search_fields = ('employee__user__username', 'employee__employee_number')
+    date_hierarchy = 'earned_on'
+
+    # 由 approve_overtime_requests 與 expire_comp_leave 產生，後台只供查閱
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
 @admin.register(LeaveBalanceAdjustment)
 class LeaveBalanceAdjustmentAdmin(admin.ModelAdmin):
     list_display = ('employee', 'leave_type', 'hours_changed', 'reason', 'created_at')
@@ -571,5 +863,4 @@ admin.site.register(LeaveRequest)
 admin.site.register(EmployeeDocument)
 admin.site.register(Goal)
 admin.site.register(EmployeeTask)
-admin.site.register(PublicHoliday)
 admin.site.register(SalaryHistory)
\ No newline at end of file
@@ -0,0 +1,128 @@
+# core/annual_leave.py
+"""
+年假餘額重算 (update_annual_leave)：目標餘額 = 策略年資權益 + 年度公眾假期補償。
+
+假期補償先由 core.holiday_compensation 補上新假期與班表變動，再讀取 HolidayCompensation 的年度合計；
+策略、年資規則與班表都只查詢一次，所有員工的目標餘額在記憶體中計算；
+寫入時每個批次使用各自的交易，以批次操作新增調整記錄 (帳本) 並更新 LeaveBalance，
+不會在整個執行期間持有鎖。dry-run 模式只計算並回傳每位員工的前後差異。
+"""
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+
+from django.db import transaction
+
+from .accruals import ANNUAL_LEAVE_TYPE, daily_work_hours, entitlement_for_service, years_of_service
+from .holiday_compensation import compensate_holidays, compensation_hours
+from .models import Employee, LeaveBalance, LeaveBalanceAdjustment, LeaveType
+
+ANNUAL_LEAVE_CHUNK_SIZE = 500
+
+DIFF_COLUMNS = [
+    'employee_id', 'employee_number', 'name', 'policy', 'daily_hours', 'entitlement_hours',
+    'holiday_compensation_hours', 'new_holiday_compensations', 'current_balance', 'target_balance', 'difference',
+]
+
+
+def _employees():
+    return (
+        Employee.objects.filter(status='Active', leave_policy__isnull=False)
+        .select_related('user', 'leave_policy', 'work_schedule')
+        .prefetch_related('leave_policy__rules', 'work_schedule__rules')
+        .order_by('id')
+    )
+
+
+def plan_annual_leave(employees, leave_type, year, today=None, pending=None):
+    """
+    計算一批員工的目標年假餘額，回傳差異列清單 (欄位見 DIFF_COLUMNS)。
+    pending 為尚未寫入的假期補償變動 (compensate_holidays 的 dry-run 結果)，會一併計入。
+    """
+    today = today or date.today()
+    employees = list(employees)
+    balances = dict(
+        LeaveBalance.objects.filter(employee__in=employees, leave_type=leave_type)
+        .values_list('employee_id', 'balance_hours')
+    )
+    compensated = compensation_hours(employees, leave_type, year)
+    pending_hours, pending_counts = defaultdict(Decimal), defaultdict(int)
+    for change in pending or []:
+        pending_hours[change['employee_id']] += change['new_hours'] - change['old_hours']
+        pending_counts[change['employee_id']] += 1
+
+    rows = []
+    for emp in employees:
+        policy = emp.leave_policy
+        daily_hours = daily_work_hours(emp)
+        units = entitlement_for_service(policy, years_of_service(emp.hire_date, today))
+        entitlement_hours = units * daily_hours if policy.accrual_unit == 'DAYS' else units
+        compensation = (compensated.get(emp.id) or Decimal('0.00')) + pending_hours[emp.id]
+
+        current = balances.get(emp.id, Decimal('0.00'))
+        target = (entitlement_hours + compensation).quantize(Decimal('0.01'))
+        rows.append({
+            'employee_id': emp.id,
+            'employee_number': emp.employee_number or '',
+            'name': emp.user.get_full_name() or emp.user.username,
+            'policy': policy.name,
+            'daily_hours': daily_hours,
+            'entitlement_hours': entitlement_hours.quantize(Decimal('0.01')),
+            'holiday_compensation_hours': compensation.quantize(Decimal('0.01')),
+            'new_holiday_compensations': pending_counts[emp.id],
+            'current_balance': current,
+            'target_balance': target,
+            'difference': target - current,
+        })
+    return rows
+
+
+def _apply(rows, leave_type, year):
+    """在一個交易中寫入一批員工的餘額差額記錄與新餘額。"""
+    changed = {row['employee_id']: row for row in rows if row['difference']}
+    if not changed:
+        return
+    with transaction.atomic():
+        balances = {
+            balance.employee_id: balance
+            for balance in LeaveBalance.objects.select_for_update().filter(employee_id__in=changed, leave_type=leave_type)
+        }
+        adjustments, new_balances = [], []
+        for employee_id, row in changed.items():
+            # 重新讀取加鎖後的餘額，避免與同時進行的入帳互相覆蓋
+            balance = balances.get(employee_id)
+            current = balance.balance_hours if balance else Decimal('0.00')
+            difference = row['target_balance'] - current
+            if not difference:
+                continue
+            if balance:
+                balance.balance_hours = row['target_balance']
+            else:
+                new_balances.append(LeaveBalance(employee_id=employee_id, leave_type=leave_type, balance_hours=row['target_balance']))
+            adjustments.append(LeaveBalanceAdjustment(
+                employee_id=employee_id, leave_type=leave_type, hours_changed=difference,
+                reason=f"Annual balance update for {year}. Adjusted from {current} to {row['target_balance']}.",
+            ))
+        LeaveBalance.objects.bulk_update(balances.values(), ['balance_hours'])
+        LeaveBalance.objects.bulk_create(new_balances)
+        LeaveBalanceAdjustment.objects.bulk_create(adjustments, batch_size=1000)
+
+
+def update_annual_leave(year, today=None, dry_run=False, chunk_size=ANNUAL_LEAVE_CHUNK_SIZE):
+    """
+    重算所有在職且有假期策略員工的年假餘額，回傳差異列清單 (dry_run 時不寫入)。
+    找不到 'Annual Leave' 假別時拋出 LeaveType.DoesNotExist。
+    """
+    leave_type = LeaveType.objects.get(name__iexact=ANNUAL_LEAVE_TYPE)
+    # 先補上新假期與班表變動的補償；dry_run 時只取得變動，計入目標餘額但不寫入
+    changes = compensate_holidays(year, today, dry_run=dry_run)
+    pending = changes if dry_run else None
+
+    employees = list(_employees())
+    all_rows = []
+    for offset in range(0, len(employees), chunk_size):
+        rows = plan_annual_leave(employees[offset:offset + chunk_size], leave_type, year, today, pending)
+        if not dry_run:
+            _apply(rows, leave_type, year)
+        all_rows.extend(rows)
+    return all_rows
@@ -9,6 +9,7 @@ class CoreConfig(AppConfig):
         # 這是為了確保只有在主進程中才啟動排程器，而不是在 runserver 的重載進程中
         import os
         from . import scheduler
+        from . import signals  # noqa: F401 註冊 signal receivers
 
         if os.environ.get('RUN_MAIN'):
             print("Starting scheduler from apps.py...")
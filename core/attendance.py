@@ -0,0 +1,189 @@
+# core/attendance.py
+"""
+打卡核心邏輯：網頁打卡與 JSON 打卡 API 共用。
+
+上班尖峰時段 (例如 09:00) 會有大量員工在一分鐘內同時打卡，因此：
+  - 打卡網路策略 (CIDR 網段) 預先編譯成前綴比對表並放入快取，只有策略變動時才重建
+  - 以 (employee, clock_out) 索引查詢尚未下班的記錄
+  - 在交易中鎖定員工資料列，連按兩次也不會開出兩筆上班記錄
+"""
+import ipaddress
+import logging
+from datetime import timedelta
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import PermissionDenied
+from django.db import transaction
+from django.utils import timezone
+
+from .models import AttendanceNetworkPolicy, AttendanceRecord, Employee, SiteConfiguration
+from .punch_import import MAX_SHIFT_HOURS
+
+logger = logging.getLogger(__name__)
+
+NETWORK_POLICY_CACHE_KEY = 'attendance:network_policy'
+
+# 同一位員工在這段時間內的重複打卡視為連按，不會改變狀態
+CLOCK_DEBOUNCE_SECONDS = 10
+
+
+def compile_networks(networks):
+    """
+    把網段清單編譯成前綴比對表：{IP 版本: {前綴長度: {網段前綴整數}}}。
+    比對時每種前綴長度只需一次位移與一次 set 查詢，與網段數量無關。
+    """
+    table = {4: {}, 6: {}}
+    for network in networks:
+        shift = network.max_prefixlen - network.prefixlen
+        table[network.version].setdefault(network.prefixlen, set()).add(int(network.network_address) >> shift)
+    return table
+
+
+def network_matches(table, client_ip):
+    try:
+        address = ipaddress.ip_address(client_ip)
+    except ValueError:
+        return False
+    if address.version == 6 and address.ipv4_mapped:
+        address = address.ipv4_mapped
+    value = int(address)
+    return any(
+        (value >> (address.max_prefixlen - prefixlen)) in prefixes
+        for prefixlen, prefixes in table[address.version].items()
+    )
+
+
+def _parse_legacy_allowlist(raw):
+    """
+    解析 SiteConfiguration.allowed_ip_addresses (逗號分隔)，回傳 (網段清單, 是否有設定)。
+    無法解析的項目會被略過並記錄警告；有設定但沒有任何項目能解析時，呼叫端應拒絕所有 IP。
+    """
+    entries = [entry.strip() for entry in raw.split(',') if entry.strip()]
+    networks = []
+    for entry in entries:
+        try:
+            networks.append(ipaddress.ip_network(entry, strict=False))
+        except ValueError:
+            logger.warning("Ignoring invalid entry in allowed_ip_addresses: %r", entry)
+    return networks, bool(entries)
+
+
+def network_policy():
+    """
+    回傳編譯好的打卡網路策略：{'company': 比對表 或 None, 'departments': {部門ID: 比對表}}。
+    None 代表該層級沒有設定任何限制；舊設定或啟用中的策略無法解析時，
+    該層級仍有比對表 (只含可解析的網段，全部無法解析時為空表，拒絕所有 IP)。
+    """
+    policy = cache.get(NETWORK_POLICY_CACHE_KEY)
+    if policy is None:
+        department_networks = {}
+        raw = SiteConfiguration.objects.filter(pk=1).values_list('allowed_ip_addresses', flat=True).first() or ''
+        company_networks, legacy_configured = _parse_legacy_allowlist(raw)
+        if legacy_configured and not company_networks:
+            logger.error("allowed_ip_addresses is set but has no valid entries; clock-in is denied from every IP.")
+
+        company_configured = legacy_configured
+        for item in AttendanceNetworkPolicy.objects.filter(is_active=True):
+            try:
+                networks = item.network_list()
+            except ValueError:
+                # 格式錯誤的策略不能讓該範圍變成不限制：仍視為有設定，只是沒有可比對的網段 (拒絕)
+                logger.error("Attendance network policy %r (id=%s) cannot be parsed; its networks are denied.", item.name, item.id)
+                networks = None
+            if item.department_id is None:
+                company_configured = company_configured or networks is None or bool(networks)
+                company_networks.extend(networks or [])
+            else:
+                department_networks.setdefault(item.department_id, []).extend(networks or [])
+
+        policy = {
+            'company': compile_networks(company_networks) if company_configured else None,
+            'departments': {dept_id: compile_networks(networks) for dept_id, networks in department_networks.items()},
+        }
+        cache.set(NETWORK_POLICY_CACHE_KEY, policy, timeout=None)
+    return policy
+
+
+def invalidate_network_policy():
+    cache.delete(NETWORK_POLICY_CACHE_KEY)
+
+
+def is_ip_allowed(client_ip, department_id=None):
+    """
+    員工符合全公司或所屬部門任一網段即可打卡；
+    全公司與該部門都沒有設定網段時不限制。
+    """
+    policy = network_policy()
+    tables = [policy['company'], policy['departments'].get(department_id)]
+    tables = [table for table in tables if table is not None]
+    return not tables or any(network_matches(table, client_ip) for table in tables)
+
+
+@lru_cache(maxsize=None)
+def _trusted_proxies():
+    return compile_networks(ipaddress.ip_network(proxy, strict=False) for proxy in getattr(settings, 'TRUSTED_PROXIES', []))
+
+
+def get_client_ip(request):
+    """
+    取得用戶端 IP。只有當請求來自 settings.TRUSTED_PROXIES 中的反向代理時才採用
+    X-Forwarded-For，並由右往左略過受信任的代理，避免用戶自行偽造標頭繞過網段限制。
+    """
+    remote_addr = request.META.get('REMOTE_ADDR')
+    proxies = _trusted_proxies()
+    if not network_matches(proxies, remote_addr):
+        return remote_addr
+
+    forwarded = [ip.strip() for ip in request.META.get('HTTP_X_FORWARDED_FOR', '').split(',') if ip.strip()]
+    for ip in reversed(forwarded):
+        if not network_matches(proxies, ip):
+            return ip
+    return forwarded[0] if forwarded else remote_addr
+
+
+def toggle_clock(user, client_ip):
+    """
+    為 user 對應的員工打卡：有未下班的記錄就下班，否則上班。
+
+    回傳 (action, record, duplicate)：
+      - action:    'in' 或 'out'，代表打卡後的狀態
+      - record:    相關的 AttendanceRecord
+      - duplicate: True 代表這是連按，沒有寫入任何資料
+    員工不存在時拋出 Employee.DoesNotExist；IP 不符合打卡網路策略時拋出 PermissionDenied。
+    """
+    now = timezone.now()
+    debounce_since = now - timedelta(seconds=CLOCK_DEBOUNCE_SECONDS)
+
+    with transaction.atomic():
+        # 鎖定員工資料列：同一位員工的並行打卡會在這裡排隊
+        employee = Employee.objects.select_for_update().filter(user=user).values_list('id', 'department_id').first()
+        if employee is None:
+            raise Employee.DoesNotExist
+        employee_id, department_id = employee
+        if not is_ip_allowed(client_ip, department_id):
+            raise PermissionDenied(f"您的 IP 位址 ({client_ip}) 不在允許打卡的範圍內。")
+
+        records = AttendanceRecord.objects.filter(employee_id=employee_id)
+        open_record = records.filter(clock_out__isnull=True, needs_review=False).order_by('-clock_in').first()
+
+        if open_record and now - open_record.clock_in > timedelta(hours=MAX_SHIFT_HOURS):
+            # 忘記打下班卡：不要把昨天的記錄關成 30 小時的班，交給主管補登，這次視為上班
+            open_record.needs_review = True
+            open_record.save(update_fields=['needs_review'])
+            open_record = None
+
+        if open_record:
+            if open_record.clock_in >= debounce_since:
+                return 'in', open_record, True
+            open_record.clock_out = now
+            open_record.save(update_fields=['clock_out'])
+            return 'out', open_record, False
+
+        just_closed = records.filter(clock_out__gte=debounce_since).order_by('-clock_out').first()
+        if just_closed:
+            return 'out', just_closed, True
+
+        record = AttendanceRecord.objects.create(employee_id=employee_id, clock_in=now, ip_address=client_ip)
+        return 'in', record, False
@@ -0,0 +1,170 @@
+# core/attendance_archive.py
+"""
+出勤資料的每月彙總與封存。
+
+AttendanceRecord 只保留最近 ATTENDANCE_HOT_MONTHS 個月 (打卡、當日記錄等熱門查詢只掃描這部分)，
+更早的月份先彙總成 MonthlyAttendanceSummary，再整批搬到 ArchivedAttendanceRecord。
+
+註：MySQL 原生分割表要求分割欄位包含在每個主鍵/唯一鍵中，
+與 Django 的自動遞增主鍵不相容，因此採用封存表的方式。
+"""
+from datetime import date, datetime, timedelta
+
+from django.db import connection, transaction
+from django.db.models import Count, Q, Sum
+from django.utils import timezone
+
+from .models import AttendanceCorrection, AttendanceRecord, ArchivedAttendanceRecord, DailyTimesheet, MonthlyAttendanceSummary
+from .timesheets import compute_timesheets, upsert_target
+
+ATTENDANCE_HOT_MONTHS = 3
+ARCHIVE_BATCH_SIZE = 5000
+
+SUMMARY_FIELDS = [
+    'scheduled_days', 'present_days', 'absent_days', 'leave_days', 'late_days', 'scheduled_minutes',
+    'worked_minutes', 'late_minutes', 'early_leave_minutes', 'overtime_minutes', 'updated_at',
+]
+
+
+def month_bounds(year, month):
+    """回傳該月的第一天與最後一天。"""
+    first = date(year, month, 1)
+    last = (first + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+    return first, last
+
+
+def day_bounds(start, end):
+    """
+    回傳 [start 當地零時, end 隔天當地零時) 的 aware datetime，
+    用範圍條件取代 clock_in__date，才能使用 (employee, clock_in) 索引。
+    """
+    return (
+        timezone.make_aware(datetime.combine(start, datetime.min.time())),
+        timezone.make_aware(datetime.combine(end + timedelta(days=1), datetime.min.time())),
+    )
+
+
+def hot_cutoff(today=None):
+    """此日期 (月初) 之前的出勤記錄會被封存。"""
+    today = today or timezone.localdate()
+    year, month = today.year, today.month - (ATTENDANCE_HOT_MONTHS - 1)
+    while month < 1:
+        year, month = year - 1, month + 12
+    return date(year, month, 1)
+
+
+def build_monthly_summaries(year, month, employee_ids=None):
+    """以每日工時表彙總該月出勤，upsert 到 MonthlyAttendanceSummary，回傳寫入筆數。"""
+    first, last = month_bounds(year, month)
+    timesheets = DailyTimesheet.objects.filter(date__range=[first, last])
+    if employee_ids is not None:
+        timesheets = timesheets.filter(employee_id__in=employee_ids)
+
+    rows = timesheets.values('employee_id').annotate(
+        scheduled_days=Count('id', filter=Q(day_type='work')),
+        present_days=Count('id', filter=Q(first_clock_in__isnull=False)),
+        absent_days=Count('id', filter=Q(is_absent=True)),
+        leave_days=Count('id', filter=Q(day_type='leave')),
+        late_days=Count('id', filter=Q(late_minutes__gt=0)),
+        total_scheduled=Sum('scheduled_minutes'),
+        total_worked=Sum('worked_minutes'),
+        total_late=Sum('late_minutes'),
+        total_early=Sum('early_leave_minutes'),
+        total_overtime=Sum('overtime_minutes'),
+    )
+    now = timezone.now()
+    summaries = [
+        MonthlyAttendanceSummary(
+            employee_id=row['employee_id'], year=year, month=month,
+            scheduled_days=row['scheduled_days'], present_days=row['present_days'],
+            absent_days=row['absent_days'], leave_days=row['leave_days'], late_days=row['late_days'],
+            scheduled_minutes=row['total_scheduled'] or 0, worked_minutes=row['total_worked'] or 0,
+            late_minutes=row['total_late'] or 0, early_leave_minutes=row['total_early'] or 0,
+            overtime_minutes=row['total_overtime'] or 0, updated_at=now,
+        )
+        for row in rows
+    ]
+    MonthlyAttendanceSummary.objects.bulk_create(
+        summaries,
+        update_conflicts=True,
+        unique_fields=upsert_target(['employee', 'year', 'month']),
+        update_fields=SUMMARY_FIELDS,
+    )
+    return len(summaries)
+
+
+def archive_records(before, batch_size=ARCHIVE_BATCH_SIZE):
+    """把上班時間早於 before (日期) 的出勤記錄分批搬到封存表，回傳搬移筆數。"""
+    cutoff, _ = day_bounds(before, before)
+    columns = [
+        'id', 'employee_id', 'clock_in', 'clock_out', 'ip_address', 'is_manual_entry', 'notes', 'source_hash',
+        'is_auto_closed', 'needs_review',
+    ]
+    moved = 0
+    while True:
+        with transaction.atomic():
+            batch = list(
+                AttendanceRecord.objects.filter(clock_in__lt=cutoff, clock_out__isnull=False)
+                .order_by('id').values_list(*columns)[:batch_size]
+            )
+            if not batch:
+                break
+            ArchivedAttendanceRecord.objects.bulk_create(
+                [
+                    ArchivedAttendanceRecord(original_id=row[0], **dict(zip(columns[1:], row[1:])))
+                    for row in batch
+                ],
+                ignore_conflicts=True,
+            )
+            record_ids = [row[0] for row in batch]
+            # 直接 SQL 刪除不會套用 on_delete=SET_NULL，先解除修正記錄的關聯 (稽核內容保留日期與前後時間)
+            AttendanceCorrection.objects.filter(record_id__in=record_ids).update(record=None)
+            # 直接以 SQL 刪除，不觸發 signal：記錄只是搬家，工時表不需要重算
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"DELETE FROM {AttendanceRecord._meta.db_table} WHERE id IN ({', '.join(['%s'] * len(record_ids))})",
+                    record_ids,
+                )
+        moved += len(batch)
+    return moved
+
+
+def archive_attendance(today=None, batch_size=ARCHIVE_BATCH_SIZE):
+    """
+    封存超過保留期的出勤記錄：逐月先計算工時表與月彙總，再搬移記錄。
+    尚未下班的記錄會留在主表，等主管補登後再封存。
+    回傳 {(年, 月): 搬移筆數}。
+    """
+    before = hot_cutoff(today)
+    cutoff_dt, _ = day_bounds(before, before)
+    oldest = AttendanceRecord.objects.filter(clock_in__lt=cutoff_dt, clock_out__isnull=False).order_by('clock_in').values_list('clock_in', flat=True).first()
+    if oldest is None:
+        return {}
+
+    results = {}
+    current = timezone.localtime(oldest).date().replace(day=1)
+    while current < before:
+        first, last = month_bounds(current.year, current.month)
+        month_start, month_end = day_bounds(first, last)
+        # 包含已離職員工：只要當月有打卡記錄就要產生彙總
+        employee_ids = list(
+            AttendanceRecord.objects.filter(clock_in__gte=month_start, clock_in__lt=month_end)
+            .values_list('employee_id', flat=True).distinct()
+        )
+        if employee_ids:
+            compute_timesheets(first, last, employee_ids)
+            build_monthly_summaries(current.year, current.month, employee_ids)
+        results[(current.year, current.month)] = archive_records(min(last + timedelta(days=1), before), batch_size)
+        current = last + timedelta(days=1)
+    return results
+
+
+def refresh_recent_summaries(today=None):
+    """重新彙總仍在主表中的月份 (保留期內)，讓歷史頁面的本月與上月數字保持最新。"""
+    today = today or timezone.localdate()
+    current = hot_cutoff(today)
+    written = 0
+    while current <= today:
+        written += build_monthly_summaries(current.year, current.month)
+        current = month_bounds(current.year, current.month)[1] + timedelta(days=1)
+    return written
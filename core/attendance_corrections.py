@@ -0,0 +1,251 @@
+# core/attendance_corrections.py
+"""
+主管的「一週 x 團隊」出勤修正表格。
+
+每個格子是一位員工一天的打卡 (一組上下班時間)，旁邊顯示排定班次。
+表單為每個格子附上載入時顯示的原值與版本 (記錄ID與完整的上下班時間)。
+送出時只處理主管改過的格子 (送出值與原值不同)；若資料庫中該格已不是載入時的版本
+(例如載入頁面後員工才打卡)，該格視為衝突而不套用，避免覆蓋或刪除新的打卡。
+其餘變更轉成新增 / 修改 / 刪除，在同一個交易中以批次操作寫入，
+並為每一筆變更留下 AttendanceCorrection 稽核記錄。
+"""
+from datetime import datetime, timedelta
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .attendance_archive import day_bounds, hot_cutoff
+from .models import AttendanceCorrection, AttendanceRecord, DailyTimesheet
+from .presence import invalidate_presence
+from .punch_import import MAX_SHIFT_HOURS
+from .roster import date_range, day_statuses
+
+CORRECTION_NOTE = "Corrected by manager {username}"
+
+
+def week_start(day):
+    return day - timedelta(days=day.weekday())
+
+
+def _cell_key(employee_id, day):
+    return f"{employee_id}_{day.isoformat()}"
+
+
+def _hhmm(value):
+    return timezone.localtime(value).strftime('%H:%M') if value else ''
+
+
+def _cell_version(day_records):
+    """格子的版本：沒有打卡為空字串，否則為每筆記錄的 ID 與完整上下班時間。"""
+    return ';'.join(
+        f"{record.id}/{record.clock_in.isoformat()}/{record.clock_out.isoformat() if record.clock_out else ''}"
+        for record in day_records
+    )
+
+
+def _posted_cell(data, key):
+    """送出的格子值 (上下班時間、載入時的原值與版本)。"""
+    return {
+        name: data.get(f'{name}_{key}', '').strip()
+        for name in ('in', 'out', 'orig_in', 'orig_out', 'version')
+    }
+
+
+def _is_edited(posted):
+    return (posted['in'], posted['out']) != (posted['orig_in'], posted['orig_out'])
+
+
+def _week_records(employee_ids, days, lock=False):
+    """{(員工ID, 上班當地日期): [記錄, ...]}"""
+    start, end = day_bounds(days[0], days[-1])
+    records = AttendanceRecord.objects.filter(employee_id__in=employee_ids, clock_in__gte=start, clock_in__lt=end).order_by('clock_in')
+    if lock:
+        records = records.select_for_update()
+    grouped = {}
+    for record in records:
+        grouped.setdefault((record.employee_id, timezone.localtime(record.clock_in).date()), []).append(record)
+    return grouped
+
+
+def build_week_grid(employees, first_day, data=None, conflicts=()):
+    """
+    回傳樣板使用的 (日期清單, 每位員工一列的格子資料)。
+    data 為驗證失敗的 request.POST 時，主管改過的格子保留送出的值 (連同原值與版本)，
+    其餘格子與 conflicts 中的衝突格子則顯示資料庫現況。
+    """
+    employees = list(employees)
+    days = date_range(first_day, first_day + timedelta(days=6))
+    statuses = day_statuses(employees, days[0], days[-1])
+    records = _week_records([emp.id for emp in employees], days)
+    cutoff = hot_cutoff()
+
+    rows = []
+    for emp in employees:
+        cells = []
+        for day, status in zip(days, statuses[emp.id]):
+            day_records = records.get((emp.id, day), [])
+            # 一天有多筆打卡 (例如中途外出) 時只能到後台逐筆處理，避免表格覆蓋其中一筆
+            editable = day >= cutoff and len(day_records) <= 1
+            record = day_records[0] if len(day_records) == 1 else None
+            key = _cell_key(emp.id, day)
+            clock_in, clock_out = (_hhmm(record.clock_in), _hhmm(record.clock_out)) if record else ('', '')
+            cell = {
+                'key': key,
+                'day': day,
+                'status': status,
+                'records': day_records,
+                'editable': editable,
+                'clock_in': clock_in,
+                'clock_out': clock_out,
+                'orig_in': clock_in,
+                'orig_out': clock_out,
+                'version': _cell_version(day_records),
+                'conflict': key in conflicts,
+                'needs_review': any(r.needs_review for r in day_records),
+            }
+            if data is not None and editable and key not in conflicts and f'in_{key}' in data:
+                posted = _posted_cell(data, key)
+                if _is_edited(posted):
+                    cell.update(
+                        clock_in=posted['in'], clock_out=posted['out'], orig_in=posted['orig_in'],
+                        orig_out=posted['orig_out'], version=posted['version'],
+                    )
+            cells.append(cell)
+        rows.append({'employee': emp, 'cells': cells})
+    return days, rows
+
+
+def _combine(day, hhmm):
+    return timezone.make_aware(datetime.combine(day, datetime.strptime(hhmm, '%H:%M').time()))
+
+
+def apply_week_corrections(user, employees, first_day, data, reason=''):
+    """
+    套用送出的表格 (data 為 request.POST) 中主管改過的格子。
+    回傳 (統計, 錯誤清單, 衝突格子的 key 集合)；有任何錯誤或衝突時不會寫入任何資料。
+    """
+    employees = {emp.id: emp for emp in employees}
+    days = [day for day in date_range(first_day, first_day + timedelta(days=6)) if day >= hot_cutoff()]
+    stats = {'created': 0, 'updated': 0, 'deleted': 0}
+    if not days:
+        return stats, [], set()
+
+    note = CORRECTION_NOTE.format(username=user.username) + (f": {reason}" if reason else "")
+    errors = []
+    conflicts = set()
+    with transaction.atomic():
+        existing = _week_records(list(employees), days, lock=True)
+        to_create, to_update, to_delete, audits = [], [], [], []
+
+        for emp_id, emp in employees.items():
+            for day in days:
+                key = _cell_key(emp_id, day)
+                if f'in_{key}' not in data:
+                    continue # 不可編輯的格子不會出現在表單中
+                posted = _posted_cell(data, key)
+                if not _is_edited(posted):
+                    continue # 沒改過的格子不套用，載入頁面後才發生的打卡不會被覆蓋
+                label = f"{emp.user.get_full_name() or emp.user.username} {day:%m-%d}"
+                day_records = existing.get((emp_id, day), [])
+                if _cell_version(day_records) != posted['version']:
+                    conflicts.add(key)
+                    errors.append(f"{label}：載入頁面後打卡記錄已有變動，已顯示最新記錄，請確認後重新修改。")
+                    continue
+                record = day_records[0] if day_records else None
+                clock_in_str, clock_out_str = posted['in'], posted['out']
+
+                if not clock_in_str:
+                    if clock_out_str:
+                        errors.append(f"{label}：只有下班時間，請填入上班時間。")
+                    elif record:
+                        to_delete.append(record)
+                        audits.append((AttendanceCorrection(
+                            employee_id=emp_id, date=day, action='delete',
+                            old_clock_in=record.clock_in, old_clock_out=record.clock_out,
+                        ), None))
+                    continue
+
+                # 時間沒有變動的格子沿用原值 (表單只到分鐘，原記錄可能有秒數)
+                if record and clock_in_str == _hhmm(record.clock_in):
+                    clock_in = record.clock_in
+                else:
+                    try:
+                        clock_in = _combine(day, clock_in_str)
+                    except ValueError:
+                        errors.append(f"{label}：上班時間格式錯誤。")
+                        continue
+                if not clock_out_str:
+                    clock_out = None
+                elif record and record.clock_out and clock_out_str == _hhmm(record.clock_out):
+                    clock_out = record.clock_out
+                else:
+                    try:
+                        clock_out = _combine(day, clock_out_str)
+                    except ValueError:
+                        errors.append(f"{label}：下班時間格式錯誤。")
+                        continue
+                    if clock_out <= clock_in:
+                        clock_out += timedelta(days=1) # 跨夜班
+                if clock_out and clock_out - clock_in > timedelta(hours=MAX_SHIFT_HOURS):
+                    errors.append(f"{label}：工時超過 {MAX_SHIFT_HOURS} 小時，請確認時間。")
+                    continue
+
+                if record is None:
+                    new_record = AttendanceRecord(
+                        employee_id=emp_id, clock_in=clock_in, clock_out=clock_out,
+                        is_manual_entry=True, notes=note[:255],
+                    )
+                    to_create.append(new_record)
+                    audits.append((AttendanceCorrection(
+                        employee_id=emp_id, date=day, action='create',
+                        new_clock_in=clock_in, new_clock_out=clock_out,
+                    ), new_record))
+                elif (clock_in, clock_out) != (record.clock_in, record.clock_out):
+                    audits.append((AttendanceCorrection(
+                        employee_id=emp_id, date=day, action='update',
+                        old_clock_in=record.clock_in, old_clock_out=record.clock_out,
+                        new_clock_in=clock_in, new_clock_out=clock_out,
+                    ), record))
+                    if clock_out != record.clock_out:
+                        record.is_auto_closed = False
+                    record.clock_in, record.clock_out = clock_in, clock_out
+                    record.needs_review = False # 主管已經確認過這一天
+                    record.notes = (f"{record.notes}; {note}" if record.notes else note)[:255]
+                    to_update.append(record)
+
+        if errors:
+            transaction.set_rollback(True)
+            return stats, errors, conflicts
+
+        AttendanceRecord.objects.bulk_create(to_create)
+        if any(record.pk is None for record in to_create):
+            # MySQL 的 bulk_create 不會回填主鍵，以 (員工, 上班時間) 查回新記錄的 ID
+            created_ids = {
+                (emp_id, clock_in): pk
+                for pk, emp_id, clock_in in AttendanceRecord.objects.filter(
+                    employee_id__in={record.employee_id for record in to_create},
+                    clock_in__in=[record.clock_in for record in to_create],
+                ).values_list('id', 'employee_id', 'clock_in')
+            }
+            for record in to_create:
+                record.pk = created_ids.get((record.employee_id, record.clock_in))
+        AttendanceRecord.objects.bulk_update(to_update, ['clock_in', 'clock_out', 'is_auto_closed', 'needs_review', 'notes'])
+        AttendanceRecord.objects.filter(id__in=[record.id for record in to_delete]).delete()
+        for audit, record in audits:
+            audit.record_id = record.pk if record else None
+            audit.reason = reason[:255]
+            audit.corrected_by = user
+        AttendanceCorrection.objects.bulk_create([audit for audit, _ in audits])
+
+        # bulk_create / bulk_update 不會觸發 signal：自行標記工時表並讓在班看板重建
+        if audits:
+            stale = Q()
+            for audit, _ in audits:
+                stale |= Q(employee_id=audit.employee_id, date=audit.date)
+            DailyTimesheet.objects.filter(stale, is_stale=False).update(is_stale=True)
+
+    if audits:
+        invalidate_presence()
+    stats.update(created=len(to_create), updated=len(to_update), deleted=len(to_delete))
+    return stats, [], set()
@@ -0,0 +1,124 @@
+# core/attendance_reconcile.py
+"""
+每晚處理忘記打下班卡的出勤記錄。
+
+以 (clock_out, clock_in) 索引一次找出全公司仍未下班的記錄，對照排定班次：
+  - 班次已結束超過 RECONCILE_GRACE_HOURS：自動以班次下班時間補上 (is_auto_closed)
+  - 找不到對應班次且已超過 MAX_SHIFT_HOURS：標記為待主管確認 (needs_review)
+最後依主管分組，每位主管只收到一封彙整郵件，且全部共用同一個 SMTP 連線。
+"""
+from datetime import datetime, timedelta
+
+from django.db import transaction
+from django.db.models import Q
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from .models import AttendanceRecord, DailyTimesheet, Employee
+from .notifications import send_batch
+from .presence import invalidate_presence
+from .punch_import import MAX_SHIFT_HOURS
+from .roster import resolve_shifts
+
+RECONCILE_GRACE_HOURS = 2
+
+AUTO_CLOSE_NOTE = "Auto clocked out at scheduled shift end"
+
+
+def _shift_end(day, shift):
+    start = timezone.make_aware(datetime.combine(day, shift[0]))
+    end = timezone.make_aware(datetime.combine(day, shift[1]))
+    if end <= start:
+        end += timedelta(days=1) # 跨夜班
+    return end
+
+
+def find_forgotten_clock_outs(now=None):
+    """
+    回傳 (to_close, to_flag)：
+      - to_close: [(記錄, 自動下班時間)]
+      - to_flag:  [記錄]
+    """
+    now = now or timezone.now()
+    records = list(
+        AttendanceRecord.objects.filter(clock_out__isnull=True, needs_review=False, clock_in__lt=now - timedelta(hours=RECONCILE_GRACE_HOURS))
+        .only('id', 'employee_id', 'clock_in', 'notes')
+    )
+    if not records:
+        return [], []
+
+    employees = Employee.objects.filter(id__in={record.employee_id for record in records}).select_related('work_schedule').prefetch_related('work_schedule__rules')
+    days = [timezone.localtime(record.clock_in).date() for record in records]
+    shifts = resolve_shifts(employees, min(days), max(days))
+
+    to_close, to_flag = [], []
+    grace = timedelta(hours=RECONCILE_GRACE_HOURS)
+    for record, day in zip(records, days):
+        shift = shifts.get((record.employee_id, day))
+        if shift:
+            shift_end = _shift_end(day, shift)
+            if shift_end + grace > now:
+                continue # 班次還沒結束
+            if shift_end > record.clock_in:
+                to_close.append((record, shift_end))
+                continue
+        if now - record.clock_in > timedelta(hours=MAX_SHIFT_HOURS):
+            to_flag.append(record)
+    return to_close, to_flag
+
+
+def _notify_managers(closed, flagged):
+    """依主管分組，每位主管一封郵件。"""
+    items_by_employee = {}
+    for record, clock_out in closed:
+        items_by_employee.setdefault(record.employee_id, []).append({'clock_in': record.clock_in, 'clock_out': clock_out, 'auto_closed': True})
+    for record in flagged:
+        items_by_employee.setdefault(record.employee_id, []).append({'clock_in': record.clock_in, 'clock_out': None, 'auto_closed': False})
+
+    by_manager = {}
+    employees = Employee.objects.filter(id__in=items_by_employee, manager__isnull=False).select_related('user', 'manager__user')
+    for emp in employees:
+        entry = by_manager.setdefault(emp.manager_id, {'manager': emp.manager, 'items': []})
+        for item in items_by_employee[emp.id]:
+            entry['items'].append(dict(item, employee_name=emp.user.get_full_name() or emp.user.username))
+
+    messages = []
+    for entry in by_manager.values():
+        manager = entry['manager']
+        items = sorted(entry['items'], key=lambda item: (item['employee_name'], item['clock_in']))
+        body = render_to_string('core/emails/notify_manager_open_attendance.txt', {
+            'manager_name': manager.user.get_full_name(),
+            'items': items,
+        })
+        messages.append((f"[出勤提醒] {len(items)} 筆忘記打下班卡的記錄", body, manager.user.email))
+    return send_batch(messages)
+
+
+def reconcile_open_attendance(now=None, notify=True, dry_run=False):
+    """執行一次對帳，回傳 {'closed', 'flagged', 'notified'}。"""
+    to_close, to_flag = find_forgotten_clock_outs(now)
+    stats = {'closed': len(to_close), 'flagged': len(to_flag), 'notified': 0}
+    if dry_run or not (to_close or to_flag):
+        return stats
+
+    with transaction.atomic():
+        for record, clock_out in to_close:
+            record.clock_out = clock_out
+            record.is_auto_closed = True
+            record.notes = (f"{record.notes}; {AUTO_CLOSE_NOTE}" if record.notes else AUTO_CLOSE_NOTE)[:255]
+        AttendanceRecord.objects.bulk_update([record for record, _ in to_close], ['clock_out', 'is_auto_closed', 'notes'], batch_size=1000)
+        AttendanceRecord.objects.filter(id__in=[record.id for record in to_flag]).update(needs_review=True)
+
+        # bulk_update / update 不會觸發 signal：自行標記工時表並讓在班看板重建
+        affected = {}
+        for record in [record for record, _ in to_close] + to_flag:
+            affected.setdefault(record.employee_id, set()).add(timezone.localtime(record.clock_in).date())
+        stale = Q()
+        for employee_id, days in affected.items():
+            stale |= Q(employee_id=employee_id, date__in=days)
+        DailyTimesheet.objects.filter(stale, is_stale=False).update(is_stale=True)
+    invalidate_presence()
+
+    if notify:
+        stats['notified'] = _notify_managers(to_close, to_flag)
+    return stats
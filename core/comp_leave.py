@@ -0,0 +1,191 @@
+# core/comp_leave.py
+"""
+補休批次：每一筆批准的加班換得的補休以 CompensatoryLeaveLot 記錄取得日、到期日與剩餘時數。
+
+- 批准加班 (overtime.approve_overtime_requests) 時，每筆加班建立一個批次，
+  到期日為取得日加上員工假期策略的 comp_leave_expiry_months (0 表示不會到期)。
+- 補休的休假被批准時，依取得日由舊到新 (FIFO) 扣減未到期批次的剩餘時數；
+  批准被撤銷、時數變更或休假被刪除時，依相反順序把時數還給被扣減過的批次。
+- 到期排程只查詢 expiry_date <= 今天且仍有剩餘時數的批次 (expiry_date 有索引)，
+  每個批次在一個交易中寫入作廢的調整記錄 (帳本) 並從 LeaveBalance 扣除。
+- LeaveBalance.balance_hours 仍是維護好的總數，讀取餘額不需要加總批次 (剩餘 = 餘額 - 已核准時數)。
+"""
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+
+from dateutil.relativedelta import relativedelta
+from django.db import transaction
+from django.db.models import F, Q
+
+from .models import CompensatoryLeaveLot, LeaveBalance, LeaveBalanceAdjustment, LeaveType
+
+COMPENSATORY_LEAVE_TYPE = 'Compensatory'
+
+COMP_LEAVE_EXPIRY_CHUNK_SIZE = 500
+
+COMP_LEAVE_EXPIRY_REASON = "Compensatory leave expired: {hours} hours earned on {earned_on}"
+
+EXPIRY_COLUMNS = ['lot_id', 'employee_id', 'employee_number', 'name', 'earned_on', 'expiry_date', 'expired_hours']
+
+
+def lot_expiry_date(policy, earned_on):
+    """依假期策略的補休有效期計算到期日；沒有策略或有效期為 0 時不會到期 (None)。"""
+    months = policy.comp_leave_expiry_months if policy else 0
+    return earned_on + relativedelta(months=months) if months else None
+
+
+def create_lots(overtimes):
+    """
+    為一批已批准的加班建立補休批次 (應在呼叫端的交易中執行)。
+    overtimes 應已 select_related('employee__leave_policy')。
+    """
+    CompensatoryLeaveLot.objects.bulk_create([
+        CompensatoryLeaveLot(
+            employee_id=overtime.employee_id, overtime=overtime, earned_on=overtime.date,
+            expiry_date=lot_expiry_date(overtime.employee.leave_policy, overtime.date),
+            hours=overtime.hours, remaining_hours=overtime.hours,
+        )
+        for overtime in overtimes
+    ], batch_size=1000)
+
+
+def consume_lots(employee_id, hours, today=None):
+    """依取得日由舊到新扣減未到期批次的剩餘時數，回傳批次不足而沒有扣到的時數。"""
+    today = today or date.today()
+    lots = list(
+        CompensatoryLeaveLot.objects.select_for_update()
+        .filter(Q(expiry_date__isnull=True) | Q(expiry_date__gt=today), employee_id=employee_id, remaining_hours__gt=0)
+        .order_by('earned_on', 'id')
+    )
+    changed = []
+    for lot in lots:
+        if hours <= 0:
+            break
+        used = min(lot.remaining_hours, hours)
+        lot.remaining_hours -= used
+        hours -= used
+        changed.append(lot)
+    CompensatoryLeaveLot.objects.bulk_update(changed, ['remaining_hours'])
+    return hours
+
+
+def restore_lots(employee_id, hours):
+    """
+    依取得日由新到舊把時數還給被扣減過的批次 (每個批次最多還原到取得時數減去已作廢的時數)，
+    回傳沒有批次可還原的時數。還原到已過期的批次會在下次到期排程時作廢。
+    """
+    lots = list(
+        CompensatoryLeaveLot.objects.select_for_update()
+        .filter(employee_id=employee_id, remaining_hours__lt=F('hours') - F('expired_hours'))
+        .order_by('-earned_on', '-id')
+    )
+    changed = []
+    for lot in lots:
+        if hours <= 0:
+            break
+        restored = min(lot.hours - lot.expired_hours - lot.remaining_hours, hours)
+        lot.remaining_hours += restored
+        hours -= restored
+        changed.append(lot)
+    CompensatoryLeaveLot.objects.bulk_update(changed, ['remaining_hours'])
+    return hours
+
+
+def _consumed_hours(leave_type_id, status, hours, comp_type_id):
+    return hours if status == 'Approved' and leave_type_id == comp_type_id else Decimal('0.00')
+
+
+def sync_leave_request(leave_request, previous=None, deleted=False):
+    """
+    休假的狀態、假別或時數變動後，依差額扣減或還原補休批次。
+    previous 為儲存前的 {'status', 'leave_type_id', 'duration_hours'} (新建立時為 None)。
+    """
+    comp_type_id = LeaveType.objects.filter(name=COMPENSATORY_LEAVE_TYPE).values_list('id', flat=True).first()
+    if comp_type_id is None:
+        return
+    before = _consumed_hours(previous['leave_type_id'], previous['status'], previous['duration_hours'], comp_type_id) if previous else Decimal('0.00')
+    after = Decimal('0.00') if deleted else _consumed_hours(leave_request.leave_type_id, leave_request.status, leave_request.duration_hours, comp_type_id)
+    if before == after:
+        return
+    with transaction.atomic():
+        if after > before:
+            consume_lots(leave_request.employee_id, after - before)
+        else:
+            restore_lots(leave_request.employee_id, before - after)
+
+
+def _apply_expiry(lot_ids, leave_type, today):
+    """在一個交易中作廢一批到期批次的剩餘時數，寫入調整記錄並扣減餘額。回傳 {批次ID: 作廢時數}。"""
+    with transaction.atomic():
+        # 重新鎖定讀取：列出之後才被休假扣減的時數不會被作廢
+        lots = list(
+            CompensatoryLeaveLot.objects.select_for_update()
+            .filter(id__in=lot_ids, expiry_date__lte=today, remaining_hours__gt=0)
+        )
+        expired = {}
+        deltas = defaultdict(Decimal)
+        adjustments = []
+        for lot in lots:
+            expired[lot.id] = lot.remaining_hours
+            deltas[lot.employee_id] += lot.remaining_hours
+            adjustments.append(LeaveBalanceAdjustment(
+                employee_id=lot.employee_id, leave_type=leave_type, hours_changed=-lot.remaining_hours,
+                reason=COMP_LEAVE_EXPIRY_REASON.format(hours=lot.remaining_hours, earned_on=lot.earned_on),
+            ))
+            lot.expired_hours += lot.remaining_hours
+            lot.remaining_hours = Decimal('0.00')
+        CompensatoryLeaveLot.objects.bulk_update(lots, ['remaining_hours', 'expired_hours'])
+        LeaveBalanceAdjustment.objects.bulk_create(adjustments, batch_size=1000)
+
+        balances = list(LeaveBalance.objects.select_for_update().filter(employee_id__in=deltas, leave_type=leave_type))
+        for balance in balances:
+            balance.balance_hours -= deltas[balance.employee_id]
+        LeaveBalance.objects.bulk_update(balances, ['balance_hours'])
+    return expired
+
+
+def expire_comp_leave(today=None, dry_run=False, chunk_size=COMP_LEAVE_EXPIRY_CHUNK_SIZE):
+    """
+    作廢 today (預設今天) 或之前到期的補休批次的剩餘時數，回傳作廢列清單 (欄位見 EXPIRY_COLUMNS)。
+    dry_run 時只列出，不寫入。
+    """
+    today = today or date.today()
+    due = list(
+        CompensatoryLeaveLot.objects.filter(expiry_date__lte=today, remaining_hours__gt=0)
+        .select_related('employee__user').order_by('id')
+    )
+    leave_type = LeaveType.objects.filter(name=COMPENSATORY_LEAVE_TYPE).first()
+    if not due or leave_type is None:
+        return []
+
+    if dry_run:
+        expired = {lot.id: lot.remaining_hours for lot in due}
+    else:
+        expired = {}
+        for offset in range(0, len(due), chunk_size):
+            expired.update(_apply_expiry([lot.id for lot in due[offset:offset + chunk_size]], leave_type, today))
+
+    return [
+        {
+            'lot_id': lot.id,
+            'employee_id': lot.employee_id,
+            'employee_number': lot.employee.employee_number or '',
+            'name': lot.employee.user.get_full_name() or lot.employee.user.username,
+            'earned_on': lot.earned_on,
+            'expiry_date': lot.expiry_date,
+            'expired_hours': expired[lot.id],
+        }
+        for lot in due if lot.id in expired
+    ]
+
+
+def open_lots(employees):
+    """{員工ID: [[到期日, 剩餘時數]]}：仍有剩餘時數的批次，依取得日由舊到新 (扣減順序)。供餘額預測使用。"""
+    lots = defaultdict(list)
+    for employee_id, expiry, remaining in (
+        CompensatoryLeaveLot.objects.filter(employee__in=employees, remaining_hours__gt=0)
+        .order_by('earned_on', 'id').values_list('employee_id', 'expiry_date', 'remaining_hours')
+    ):
+        lots[employee_id].append([expiry, remaining])
+    return lots
@@ -71,4 +71,21 @@ class EmployeeUpdateForm(forms.ModelForm):
         ]
         widgets = {
             'date_of_birth': forms.DateInput(attrs={'type': 'date'}),
-        }
\ No newline at end of file
+        }
+class EmployeeAdminForm(forms.ModelForm):
+    # PIN 只寫不讀：資料庫只保存雜湊，留空代表不變更
+    kiosk_pin = forms.CharField(
+        label="打卡機 PIN", required=False,
+        widget=forms.PasswordInput(render_value=False),
+        help_text="供沒有員工卡時在打卡平板上使用，留空則不變更。",
+    )
+
+    class Meta:
+        model = Employee
+        fields = '__all__'
+
+    def clean_kiosk_pin(self):
+        pin = self.cleaned_data.get('kiosk_pin', '').strip()
+        if pin and (not pin.isdigit() or len(pin) < 4):
+            raise forms.ValidationError("PIN 必須是至少 4 位的數字。")
+        return pin
@@ -0,0 +1,85 @@
+# core/holiday_calendars.py
+"""
+依地區的公眾假期行事曆：員工的假期地區為員工本身的設定，其次為部門的設定，都沒有時為 PublicHoliday.DEFAULT_REGION。
+
+每個 (地區, 年份) 的假期只查詢一次並存放在快取中，部門的地區對照表也一樣；
+休假時數計算、班表、值日表等在快取命中時不需要任何額外的資料庫查詢。
+假期或部門變動時 (signals 與 upsert_holidays) 會更新版本號，讓所有快取一起失效；
+不經過 signal 的變更 (例如 QuerySet.update) 最多在 HOLIDAY_CACHE_TIMEOUT 秒後生效。
+"""
+import time
+
+from django.core.cache import cache
+
+from .models import Department, PublicHoliday
+
+HOLIDAY_VERSION_KEY = 'holidays:version'
+HOLIDAY_CACHE_KEY = 'holidays:{version}:{region}:{year}'
+DEPARTMENT_REGIONS_CACHE_KEY = 'holidays:{version}:departments'
+HOLIDAY_CACHE_TIMEOUT = 60 * 60
+
+
+def invalidate_holiday_calendars():
+    cache.set(HOLIDAY_VERSION_KEY, time.time(), timeout=HOLIDAY_CACHE_TIMEOUT)
+
+
+def _version():
+    version = cache.get(HOLIDAY_VERSION_KEY)
+    if version is None:
+        version = time.time()
+        cache.set(HOLIDAY_VERSION_KEY, version, timeout=HOLIDAY_CACHE_TIMEOUT)
+    return version
+
+
+def department_regions():
+    """{部門ID: 假期地區}，只包含有設定地區的部門。"""
+    key = DEPARTMENT_REGIONS_CACHE_KEY.format(version=_version())
+    regions = cache.get(key)
+    if regions is None:
+        regions = dict(Department.objects.exclude(holiday_region='').values_list('id', 'holiday_region'))
+        cache.set(key, regions, timeout=HOLIDAY_CACHE_TIMEOUT)
+    return regions
+
+
+def employee_region(employee, departments=None):
+    """員工的假期地區；處理多位員工時可傳入 department_regions() 的結果。"""
+    if employee.holiday_region:
+        return employee.holiday_region
+    if departments is None:
+        departments = department_regions()
+    return departments.get(employee.department_id) or PublicHoliday.DEFAULT_REGION
+
+
+def region_holidays(region, year):
+    """{日期: 假期名稱}：region 在 year 年的所有公眾假期。"""
+    key = HOLIDAY_CACHE_KEY.format(version=_version(), region=region, year=year)
+    holidays = cache.get(key)
+    if holidays is None:
+        holidays = dict(PublicHoliday.objects.filter(region=region, date__year=year).values_list('date', 'name'))
+        cache.set(key, holidays, timeout=HOLIDAY_CACHE_TIMEOUT)
+    return holidays
+
+
+def holidays_between(region, start, end):
+    """{日期: 假期名稱}：region 在 start 到 end (含) 之間的公眾假期。"""
+    holidays = {}
+    for year in range(start.year, end.year + 1):
+        holidays.update({day: name for day, name in region_holidays(region, year).items() if start <= day <= end})
+    return holidays
+
+
+def employee_holiday_maps(employees, start, end):
+    """
+    {員工ID: {日期: 假期名稱}}；同一地區的員工共用同一個字典，
+    因此查詢數只與地區數有關 (快取命中時為 0)。
+    """
+    departments = department_regions()
+    by_region = {}
+    maps = {}
+    for emp in employees:
+        region = employee_region(emp, departments)
+        if region not in by_region:
+            by_region[region] = holidays_between(region, start, end)
+        maps[emp.id] = by_region[region]
+    return maps
+
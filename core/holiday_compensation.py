@@ -0,0 +1,221 @@
+# core/holiday_compensation.py
+"""
+公眾假期補償：員工假期地區 (員工或部門的設定) 的公眾假期落在員工休息日 (班表沒有規則的星期) 時，
+補償一天的年假時數 (依班表每日工時)。
+
+- 所有員工、班表規則與年度假期一次載入，在記憶體中比對假期與休息日。
+- 補償記錄以 (員工, 假期, 假別) 為唯一鍵存放在 HolidayCompensation，每個批次在一個交易中
+  以批次操作新增 / 更新 / 刪除補償、寫入調整記錄 (帳本) 並更新 LeaveBalance。
+- 每次執行只處理尚未處理過的假期 (PublicHoliday.compensated_at 為空)，以及班表或資格有變動的員工
+  (該年度的 HolidayCompensationSignature 與目前的班表摘要不同)；沒有變動時幾乎不需要任何寫入。
+  摘要依年度記錄：先執行其他年度 (例如 --year 提前處理明年) 不會讓這個年度錯過變動。
+- 已經過去的假期不會因為之後的班表變動而收回補償。
+"""
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Q, Sum
+from django.utils import timezone
+
+from .accruals import ANNUAL_LEAVE_TYPE, daily_work_hours
+from .holiday_calendars import department_regions, employee_region
+from .models import (
+    Employee, HolidayCompensation, HolidayCompensationSignature, LeaveBalance, LeaveBalanceAdjustment, LeaveType, PublicHoliday,
+)
+
+HOLIDAY_COMPENSATION_CHUNK_SIZE = 500
+
+HOLIDAY_COMPENSATION_REASON = "Holiday Compensation: {name} on {date}"
+
+CHANGE_COLUMNS = ['employee_id', 'employee_number', 'name', 'holiday', 'date', 'old_hours', 'new_hours']
+
+
+def compensation_signature(employee, region):
+    """
+    影響假期補償的假期地區、班表與資格摘要；不符合補償資格 (非在職、沒有班表或策略未啟用補償) 時為空字串。
+    employee 應已 select_related('leave_policy', 'work_schedule') 並 prefetch_related('work_schedule__rules')。
+    """
+    policy = employee.leave_policy
+    if employee.status != 'Active' or not employee.work_schedule or policy is None or not policy.enable_holiday_compensation:
+        return ''
+    work_days = ''.join(str(day) for day in sorted({rule.day_of_week for rule in employee.work_schedule.rules.all()}))
+    return f"{region}:{employee.work_schedule_id}:{work_days}:{daily_work_hours(employee)}:{employee.hire_date}:{employee.termination_date or ''}"
+
+
+def _employees(year):
+    # 該年度曾經符合資格的離職員工也要載入，才能收回尚未到來的假期補償
+    qualified = HolidayCompensationSignature.objects.filter(employee=OuterRef('pk'), year=year).exclude(signature='')
+    return (
+        Employee.objects.filter(Q(status='Active') | Exists(qualified))
+        .select_related('user', 'leave_policy', 'work_schedule')
+        .prefetch_related('work_schedule__rules')
+        .order_by('id')
+    )
+
+
+def target_hours(employee, region, signature, holiday):
+    """員工在某個公眾假期應得的補償時數 (不是員工地區的假期、工作日、到職前或離職後為 0)。"""
+    if not signature or holiday.region != region:
+        return Decimal('0.00')
+    work_days = {rule.day_of_week for rule in employee.work_schedule.rules.all()}
+    if holiday.date.weekday() in work_days or holiday.date < employee.hire_date:
+        return Decimal('0.00')
+    if employee.termination_date and holiday.date > employee.termination_date:
+        return Decimal('0.00')
+    return daily_work_hours(employee)
+
+
+def plan_compensations(employees, holidays, leave_type, today=None, previous=None):
+    """
+    計算一批員工需要變動的假期補償，回傳 (變動列清單, {員工ID: 新的班表摘要})。
+    previous 為 {員工ID: 這個年度上次計算時的班表摘要}。
+    變動列的欄位見 CHANGE_COLUMNS，另含 'holiday_obj' 與 'compensation' (既有記錄或 None)。
+    """
+    today = today or date.today()
+    previous = previous or {}
+    employees = list(employees)
+    new_holidays = [holiday for holiday in holidays if holiday.compensated_at is None]
+    existing = {
+        (compensation.employee_id, compensation.holiday_id): compensation
+        for compensation in HolidayCompensation.objects.filter(employee__in=employees, holiday__in=holidays, leave_type=leave_type)
+    }
+
+    departments = department_regions()
+    changes, signatures = [], {}
+    for emp in employees:
+        region = employee_region(emp, departments)
+        signature = compensation_signature(emp, region)
+        previous_signature = previous.get(emp.id, '')
+        if signature == previous_signature:
+            candidates = new_holidays
+        else:
+            signatures[emp.id] = signature
+            if previous_signature:
+                # 班表或假期地區變動：重新檢查尚未到來的假期 (包含原地區的假期) 與新假期
+                candidates = [holiday for holiday in holidays if holiday.date >= today or holiday.compensated_at is None]
+            else:
+                # 第一次計算 (新員工或剛符合資格)：檢查整個年度
+                candidates = holidays
+
+        for holiday in candidates:
+            compensation = existing.get((emp.id, holiday.id))
+            old_hours = compensation.hours if compensation else Decimal('0.00')
+            new_hours = target_hours(emp, region, signature, holiday)
+            if new_hours == old_hours or (new_hours < old_hours and holiday.date < today):
+                continue
+            changes.append({
+                'employee_id': emp.id,
+                'employee_number': emp.employee_number or '',
+                'name': emp.user.get_full_name() or emp.user.username,
+                'holiday': holiday.name,
+                'date': holiday.date,
+                'old_hours': old_hours,
+                'new_hours': new_hours,
+                'holiday_obj': holiday,
+                'compensation': compensation,
+            })
+    return changes, signatures
+
+
+def _apply(changes, signatures, leave_type, year=None):
+    """在一個交易中寫入一批員工的補償記錄、調整記錄與餘額，並記下該年度新的班表摘要。"""
+    with transaction.atomic():
+        created, updated, deleted = [], [], []
+        deltas = defaultdict(Decimal)
+        for change in changes:
+            compensation = change['compensation']
+            if compensation is None:
+                created.append(HolidayCompensation(
+                    employee_id=change['employee_id'], holiday=change['holiday_obj'], leave_type=leave_type, hours=change['new_hours'],
+                ))
+            elif change['new_hours']:
+                compensation.hours = change['new_hours']
+                updated.append(compensation)
+            else:
+                deleted.append(compensation.id)
+            deltas[change['employee_id']] += change['new_hours'] - change['old_hours']
+
+        HolidayCompensation.objects.bulk_create(created, batch_size=1000)
+        HolidayCompensation.objects.bulk_update(updated, ['hours'], batch_size=1000)
+        HolidayCompensation.objects.filter(id__in=deleted).delete()
+        LeaveBalanceAdjustment.objects.bulk_create([
+            LeaveBalanceAdjustment(
+                employee_id=change['employee_id'], leave_type=leave_type, hours_changed=change['new_hours'] - change['old_hours'],
+                reason=HOLIDAY_COMPENSATION_REASON.format(name=change['holiday'], date=change['date']),
+            )
+            for change in changes
+        ], batch_size=1000)
+
+        balances = list(LeaveBalance.objects.select_for_update().filter(employee_id__in=deltas, leave_type=leave_type))
+        for balance in balances:
+            balance.balance_hours += deltas.pop(balance.employee_id)
+        LeaveBalance.objects.bulk_update(balances, ['balance_hours'])
+        LeaveBalance.objects.bulk_create([
+            LeaveBalance(employee_id=employee_id, leave_type=leave_type, balance_hours=delta)
+            for employee_id, delta in deltas.items()
+        ])
+
+        stored = list(HolidayCompensationSignature.objects.select_for_update().filter(employee_id__in=signatures, year=year))
+        for row in stored:
+            row.signature = signatures[row.employee_id]
+        HolidayCompensationSignature.objects.bulk_update(stored, ['signature'], batch_size=1000)
+        stored_ids = {row.employee_id for row in stored}
+        HolidayCompensationSignature.objects.bulk_create([
+            HolidayCompensationSignature(employee_id=employee_id, year=year, signature=signature)
+            for employee_id, signature in signatures.items() if employee_id not in stored_ids
+        ], batch_size=1000)
+
+
+def compensate_holidays(year=None, today=None, dry_run=False, chunk_size=HOLIDAY_COMPENSATION_CHUNK_SIZE):
+    """
+    處理 year (預設今年) 的公眾假期補償，回傳變動列清單 (dry_run 時不寫入)。
+    找不到 'Annual Leave' 假別時拋出 LeaveType.DoesNotExist。
+    """
+    today = today or date.today()
+    year = year or today.year
+    leave_type = LeaveType.objects.get(name__iexact=ANNUAL_LEAVE_TYPE)
+    holidays = list(PublicHoliday.objects.filter(date__year=year).order_by('date'))
+
+    all_changes = []
+    employees = list(_employees(year))
+    for offset in range(0, len(employees), chunk_size):
+        chunk = employees[offset:offset + chunk_size]
+        previous = dict(
+            HolidayCompensationSignature.objects.filter(employee__in=chunk, year=year).values_list('employee_id', 'signature')
+        )
+        changes, signatures = plan_compensations(chunk, holidays, leave_type, today, previous)
+        if not dry_run and (changes or signatures):
+            _apply(changes, signatures, leave_type, year)
+        all_changes.extend(changes)
+
+    if not dry_run:
+        PublicHoliday.objects.filter(id__in=[holiday.id for holiday in holidays if holiday.compensated_at is None]).update(compensated_at=timezone.now())
+    return all_changes
+
+
+def revoke_holiday(holiday):
+    """收回某個公眾假期的所有補償 (假期被刪除時)，寫入負數的調整記錄並扣回餘額。"""
+    changes = [
+        {
+            'employee_id': compensation.employee_id, 'holiday': holiday.name, 'date': holiday.date,
+            'old_hours': compensation.hours, 'new_hours': Decimal('0.00'),
+            'holiday_obj': holiday, 'compensation': compensation,
+        }
+        for compensation in HolidayCompensation.objects.filter(holiday=holiday).select_related('leave_type')
+    ]
+    by_leave_type = defaultdict(list)
+    for change in changes:
+        by_leave_type[change['compensation'].leave_type].append(change)
+    for leave_type, leave_type_changes in by_leave_type.items():
+        _apply(leave_type_changes, {}, leave_type)
+    return changes
+
+
+def compensation_hours(employees, leave_type, year):
+    """{員工ID: year 年度已補償的時數}"""
+    return dict(
+        HolidayCompensation.objects.filter(employee__in=employees, leave_type=leave_type, holiday__date__year=year)
+        .values('employee_id').annotate(total=Sum('hours')).values_list('employee_id', 'total')
+    )
@@ -0,0 +1,107 @@
+# core/ical.py
+"""
+產生 iCalendar (.ics) 行事曆內容：班次、已批准的休假與國定假日。
+"""
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.utils import timezone
+
+from .models import LeaveRequest
+from .roster import resolve_shifts, employee_holidays_map
+
+# 訂閱範圍：過去 30 天到未來 90 天
+FEED_DAYS_BEFORE = 30
+FEED_DAYS_AFTER = 90
+
+
+def feed_window(today=None):
+    today = today or timezone.localdate()
+    return today - timedelta(days=FEED_DAYS_BEFORE), today + timedelta(days=FEED_DAYS_AFTER)
+
+
+def _escape(text):
+    return (str(text).replace('\\', '\\\\').replace(';', '\\;')
+            .replace(',', '\\,').replace('\n', '\\n'))
+
+
+def _utc(dt):
+    return dt.astimezone(dt_timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def _fold(line):
+    # RFC 5545：每行最多 75 個位元組，續行以空白開頭
+    encoded = line.encode('utf-8')
+    if len(encoded) <= 75:
+        return line
+    parts, current = [], b''
+    for char in line:
+        char_bytes = char.encode('utf-8')
+        if len(current) + len(char_bytes) > (75 if not parts else 74):
+            parts.append(current.decode('utf-8'))
+            current = b''
+        current += char_bytes
+    parts.append(current.decode('utf-8'))
+    return '\r\n '.join(parts)
+
+
+def build_calendar(employees, name, today=None):
+    """回傳 employees 的班次、休假與國定假日組成的 iCalendar 字串。"""
+    employees = list(employees)
+    start, end = feed_window(today)
+    names = {emp.id: emp.user.get_full_name() or emp.user.username for emp in employees}
+    show_names = len(employees) > 1
+    stamp = _utc(timezone.now())
+
+    lines = [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        'PRODID:-//Love 21 HRM//Roster//ZH',
+        'CALSCALE:GREGORIAN',
+        f'X-WR-CALNAME:{_escape(name)}',
+    ]
+
+    def add_event(uid, summary, dtstart, dtend, all_day=False):
+        lines.append('BEGIN:VEVENT')
+        lines.append(f'UID:{uid}@hrm')
+        lines.append(f'DTSTAMP:{stamp}')
+        if all_day:
+            lines.append(f'DTSTART;VALUE=DATE:{dtstart:%Y%m%d}')
+            lines.append(f'DTEND;VALUE=DATE:{dtend:%Y%m%d}')
+        else:
+            lines.append(f'DTSTART:{_utc(dtstart)}')
+            lines.append(f'DTEND:{_utc(dtend)}')
+        lines.append(f'SUMMARY:{_escape(summary)}')
+        lines.append('END:VEVENT')
+
+    for (emp_id, day), (start_time, end_time) in sorted(resolve_shifts(employees, start, end).items(), key=lambda item: (item[0][1], item[0][0])):
+        shift_start = timezone.make_aware(datetime.combine(day, start_time))
+        shift_end = timezone.make_aware(datetime.combine(day, end_time))
+        if shift_end <= shift_start:
+            shift_end += timedelta(days=1) # 跨夜班
+        summary = f'{names[emp_id]} 上班' if show_names else '上班'
+        add_event(f'shift-{emp_id}-{day:%Y%m%d}', summary, shift_start, shift_end)
+
+    leaves = LeaveRequest.objects.filter(
+        employee_id__in=names.keys(),
+        status='Approved',
+        start_datetime__date__lte=end,
+        end_datetime__date__gte=start,
+    ).select_related('leave_type').order_by('start_datetime')
+    for leave in leaves:
+        summary = f'{leave.leave_type.name}'
+        if show_names:
+            summary = f'{names[leave.employee_id]} {summary}'
+        add_event(f'leave-{leave.id}', summary, leave.start_datetime, leave.end_datetime)
+
+    # 團隊成員可能屬於不同的假期地區：同一天的不同假期合併成一個事件
+    holidays = {}
+    for employee_holidays in employee_holidays_map(employees, start, end).values():
+        for day, holiday_name in employee_holidays.items():
+            day_names = holidays.setdefault(day, [])
+            if holiday_name not in day_names:
+                day_names.append(holiday_name)
+    for day, holiday_names in sorted(holidays.items()):
+        add_event(f'holiday-{day:%Y%m%d}', ' / '.join(holiday_names), day, day + timedelta(days=1), all_day=True)
+
+    lines.append('END:VCALENDAR')
+    return '\r\n'.join(_fold(line) for line in lines) + '\r\n'
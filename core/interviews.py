@@ -0,0 +1,105 @@
+# core/interviews.py
+"""
+面試時段搜尋：把每位面試官的上班時間與忙碌時段 (既有面試) 轉成排序好的區間，
+取所有面試官上班時間的交集，再扣掉合併後的忙碌區間，得到共同空檔。
+"""
+from datetime import datetime, timedelta
+
+from django.utils import timezone
+
+from .models import Interview
+from .roster import resolve_shifts
+
+
+def merge_intervals(intervals):
+    """合併重疊或相連的區間，回傳排序好的 [(start, end), ...]。"""
+    merged = []
+    for start, end in sorted(intervals):
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1] = (merged[-1][0], end)
+        else:
+            merged.append((start, end))
+    return merged
+
+
+def intersect_intervals(a, b):
+    """兩組已排序、不重疊區間的交集 (雙指標掃描)。"""
+    result = []
+    i = j = 0
+    while i < len(a) and j < len(b):
+        start = max(a[i][0], b[j][0])
+        end = min(a[i][1], b[j][1])
+        if start < end:
+            result.append((start, end))
+        if a[i][1] < b[j][1]:
+            i += 1
+        else:
+            j += 1
+    return result
+
+
+def subtract_intervals(free, busy):
+    """從已排序的 free 區間中扣除已合併排序的 busy 區間。"""
+    result = []
+    j = 0
+    for start, end in free:
+        while j < len(busy) and busy[j][1] <= start:
+            j += 1
+        k = j
+        current = start
+        while k < len(busy) and busy[k][0] < end:
+            if busy[k][0] > current:
+                result.append((current, busy[k][0]))
+            current = max(current, busy[k][1])
+            k += 1
+        if current < end:
+            result.append((current, end))
+    return result
+
+
+def working_intervals(employees, start_date, end_date):
+    """{員工ID: [(上班開始, 上班結束), ...]}，已排除休假與國定假日。"""
+    intervals = {emp.id: [] for emp in employees}
+    for (emp_id, day), (start_time, end_time) in resolve_shifts(employees, start_date, end_date).items():
+        shift_start = timezone.make_aware(datetime.combine(day, start_time))
+        shift_end = timezone.make_aware(datetime.combine(day, end_time))
+        if shift_end <= shift_start:
+            shift_end += timedelta(days=1) # 跨夜班
+        intervals[emp_id].append((shift_start, shift_end))
+    return {emp_id: merge_intervals(items) for emp_id, items in intervals.items()}
+
+
+def find_common_slots(employees, start_date, end_date, duration, exclude_interview=None):
+    """
+    回傳所有面試官在 start_date 到 end_date (含) 之間都有空、且長度至少 duration 的時段。
+    """
+    employees = list(employees)
+    if not employees:
+        return []
+
+    per_employee = working_intervals(employees, start_date, end_date)
+    common = None
+    for emp in employees:
+        common = per_employee[emp.id] if common is None else intersect_intervals(common, per_employee[emp.id])
+        if not common:
+            return []
+
+    window_start = timezone.make_aware(datetime.combine(start_date, datetime.min.time()))
+    window_end = timezone.make_aware(datetime.combine(end_date + timedelta(days=1), datetime.min.time()))
+    interviews = Interview.objects.filter(
+        interviewers__in=employees,
+        start_datetime__lt=window_end,
+        end_datetime__gt=window_start,
+    )
+    if exclude_interview is not None:
+        interviews = interviews.exclude(pk=exclude_interview.pk)
+    busy = merge_intervals(interviews.values_list('start_datetime', 'end_datetime').distinct())
+
+    # 已經過去的時間不能再安排
+    now = timezone.now()
+    if now > window_start:
+        busy = merge_intervals(busy + [(window_start, now)])
+
+    free = subtract_intervals(common, busy)
+    return [(start, end) for start, end in free if end - start >= duration]
@@ -0,0 +1,156 @@
+# core/kiosk.py
+"""
+離線 Kiosk 打卡的批次同步。
+
+共用平板斷線時把打卡 (含真實打卡時間與裝置產生的 punch_id) 暫存在本機，
+恢復連線後一次上傳一整批。伺服器依 punch_id 去重 (包括同一批中重複的 punch_id)，
+因此重送同一批是安全的；配對上下班沿用 punch_import 的 pair_punches / save_pairs。
+
+同步 API 不需登入，因此以員工編號 + PIN 識別時，每位員工與每台裝置的 PIN 錯誤次數
+記錄在快取中，超過上限後在 KIOSK_LOCKOUT_SECONDS 內拒絕以 PIN 識別的打卡。
+"""
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+
+from .models import AttendanceRecord, Employee, KioskPunch
+from .punch_import import pair_punches, parse_timestamp, punch_hash, save_pairs
+
+MAX_KIOSK_BATCH = 1000
+
+# PIN 錯誤次數上限：每位員工 / 每台裝置，最後一次錯誤後 KIOSK_LOCKOUT_SECONDS 內有效
+KIOSK_EMPLOYEE_MAX_PIN_FAILURES = 5
+KIOSK_DEVICE_MAX_PIN_FAILURES = 20
+KIOSK_LOCKOUT_SECONDS = 15 * 60
+
+UNIDENTIFIED_ERROR = '無法識別員工 (卡號或 PIN 錯誤)。'
+LOCKED_OUT_ERROR = 'PIN 錯誤次數過多，請稍後再試。'
+UNMATCHED_OUT_ERROR = '沒有對應的上班打卡。'
+
+
+def _failure_key(kind, pk):
+    return f'kiosk_pin_failures:{kind}:{pk}'
+
+
+def _record_pin_failure(key):
+    cache.set(key, cache.get(key, 0) + 1, KIOSK_LOCKOUT_SECONDS)
+
+
+def _identify(device, punches):
+    """
+    回傳 ({punch_id: 員工ID}, {punch_id: 錯誤訊息})；卡號優先，否則使用員工編號 + PIN。
+    PIN 錯誤會累計在員工與裝置的錯誤次數上，被鎖定時不再檢查 PIN。
+    """
+    badges = {p.get('badge') for p in punches if p.get('badge')}
+    numbers = {p.get('employee_number') for p in punches if not p.get('badge') and p.get('employee_number')}
+
+    by_badge = dict(Employee.objects.filter(badge_id__in=badges, status='Active').values_list('badge_id', 'id'))
+    by_number = {emp.employee_number: emp for emp in Employee.objects.filter(employee_number__in=numbers, status='Active').only('id', 'employee_number', 'kiosk_pin_hash')}
+
+    device_key = _failure_key('device', device.id)
+    identified, errors = {}, {}
+    for punch in punches:
+        if punch.get('badge'):
+            employee_id = by_badge.get(punch['badge'])
+        else:
+            emp = by_number.get(punch.get('employee_number'))
+            employee_key = _failure_key('employee', emp.id) if emp else None
+            if (cache.get(device_key, 0) >= KIOSK_DEVICE_MAX_PIN_FAILURES
+                    or (employee_key and cache.get(employee_key, 0) >= KIOSK_EMPLOYEE_MAX_PIN_FAILURES)):
+                errors[punch['punch_id']] = LOCKED_OUT_ERROR
+                continue
+            if emp and emp.check_kiosk_pin(str(punch.get('pin', ''))):
+                employee_id = emp.id
+                cache.delete(employee_key)
+            else:
+                employee_id = None
+                _record_pin_failure(device_key)
+                if employee_key:
+                    _record_pin_failure(employee_key)
+        if employee_id:
+            identified[punch['punch_id']] = employee_id
+        else:
+            errors[punch['punch_id']] = UNIDENTIFIED_ERROR
+    return identified, errors
+
+
+def ingest_punches(device, punches):
+    """
+    匯入一批 Kiosk 打卡。punches 為 dict 清單：
+      punch_id (必填)、badge 或 employee_number + pin、timestamp (ISO)、direction (可選 IN / OUT)
+
+    回傳 {'accepted': [...], 'duplicates': [...], 'rejected': [{'punch_id', 'error'}]}。
+    accepted 與 duplicates 都代表伺服器已經有這筆資料，裝置可以把它們從佇列中移除。
+    沒有對應上班打卡的下班打卡會被拒絕且不會記錄，等上班打卡同步後可以重送。
+    """
+    result = {'accepted': [], 'duplicates': [], 'rejected': []}
+
+    valid = []
+    seen = set()
+    for punch in punches:
+        punch_id = str(punch.get('punch_id') or '')[:64]
+        if not punch_id:
+            result['rejected'].append({'punch_id': None, 'error': '缺少 punch_id。'})
+            continue
+        if punch_id in seen:
+            continue # 同一批中重複的 punch_id 只處理第一筆
+        seen.add(punch_id)
+        try:
+            stamp = parse_timestamp(str(punch.get('timestamp', '')))
+        except ValueError:
+            result['rejected'].append({'punch_id': punch_id, 'error': '打卡時間格式錯誤。'})
+            continue
+        direction = str(punch.get('direction') or '').upper()
+        if direction not in ('', 'IN', 'OUT'):
+            result['rejected'].append({'punch_id': punch_id, 'error': '方向必須是 IN 或 OUT。'})
+            continue
+        valid.append(dict(punch, punch_id=punch_id, timestamp=stamp, direction=direction))
+
+    existing = set(KioskPunch.objects.filter(punch_id__in=[p['punch_id'] for p in valid]).values_list('punch_id', flat=True))
+    result['duplicates'] = sorted(existing)
+    valid = [p for p in valid if p['punch_id'] not in existing]
+
+    identified, errors = _identify(device, valid)
+    new_punches = []
+    for punch in valid:
+        employee_id = identified.get(punch['punch_id'])
+        if employee_id is None:
+            result['rejected'].append({'punch_id': punch['punch_id'], 'error': errors[punch['punch_id']]})
+            continue
+        new_punches.append(KioskPunch(
+            punch_id=punch['punch_id'], device=device, employee_id=employee_id,
+            timestamp=punch['timestamp'], direction=punch['direction'],
+        ))
+
+    with transaction.atomic():
+        # 員工在網頁上已經打了上班卡 (尚未下班)：把它當成配對的起點，並補上 source_hash 讓 save_pairs 能找到它
+        employee_ids = {punch.employee_id for punch in new_punches}
+        open_records = list(
+            AttendanceRecord.objects.select_for_update()
+            .filter(employee_id__in=employee_ids, clock_out__isnull=True, needs_review=False)
+            .only('id', 'employee_id', 'clock_in', 'source_hash')
+        )
+        unhashed = [record for record in open_records if not record.source_hash]
+        for record in unhashed:
+            record.source_hash = punch_hash(record.employee_id, record.clock_in)
+        AttendanceRecord.objects.bulk_update(unhashed, ['source_hash'])
+
+        stream = [(record.employee_id, record.clock_in, 'IN') for record in open_records]
+        stream += [(punch.employee_id, punch.timestamp, punch.direction or None) for punch in new_punches]
+        stream.sort(key=lambda item: item[1])
+        stats = {'unmatched': 0}
+        unmatched = []
+        save_pairs(list(pair_punches(stream, stats, unmatched=unmatched)), note=f"Kiosk: {device.name}")
+
+        # 沒有對應上班打卡的下班打卡不記錄，回報給裝置
+        unmatched = set(unmatched)
+        orphans = {punch.punch_id for punch in new_punches if punch.direction != 'IN' and (punch.employee_id, punch.timestamp) in unmatched}
+        new_punches = [punch for punch in new_punches if punch.punch_id not in orphans]
+        result['rejected'] += [{'punch_id': punch_id, 'error': UNMATCHED_OUT_ERROR} for punch_id in sorted(orphans)]
+        KioskPunch.objects.bulk_create(new_punches, ignore_conflicts=True)
+
+        device.last_synced_at = timezone.now()
+        device.save(update_fields=['last_synced_at'])
+
+    result['accepted'] = [punch.punch_id for punch in new_punches]
+    return result
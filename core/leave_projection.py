@@ -0,0 +1,323 @@
+# core/leave_projection.py
+"""
+假期餘額預測：合併目前的帳本餘額、依策略排程的未來累計、公眾假期補償、
+已核准 / 待審核的休假與年終作廢，計算任意未來日期的預計餘額。
+
+- 預計餘額 = 帳本餘額 (LeaveBalance) + 之後入帳的累計與假期補償 - 年終作廢 - 到該日為止已開始的休假。
+  尚未開始的休假在開始日扣除，因此今天的預計值可能高於個人頁面的「剩餘」(已扣除所有已核准的休假)。
+- 年終作廢沿用 year_end 的算法：假期年度開始時，剩餘 (帳本 - 所有已知的休假) 超過結轉上限的部分作廢。
+- 只有年假 (ANNUAL_LEAVE_TYPE) 有累計、補償與作廢；補休 (COMPENSATORY_LEAVE_TYPE) 的批次在到期日作廢剩餘時數，
+  尚未批准的休假依取得日由舊到新扣減批次 (已批准的在批准時已扣減)；其他假別只計算帳本餘額與休假。
+- 一位員工或全公司都以同一組批次查詢計算，查詢數只與批次數有關，每位員工的事件在記憶體中依日期推進。
+"""
+from collections import defaultdict
+from datetime import date, timedelta
+from decimal import Decimal
+
+from dateutil.relativedelta import relativedelta
+from django.db.models import Sum
+from django.utils import timezone
+
+from .accruals import ANNUAL_LEAVE_TYPE, accrual_credit_date, plan_accruals
+from .comp_leave import COMPENSATORY_LEAVE_TYPE, open_lots
+from .holiday_calendars import department_regions, employee_region
+from .holiday_compensation import compensation_signature, target_hours
+from .models import Employee, HolidayCompensation, LeaveBalance, LeaveRequest, LeaveType, PublicHoliday
+from .year_end import due_policies, max_carry_over_hours, split_remaining
+
+PROJECTION_CHUNK_SIZE = 500
+# 未指定日期時預測到幾個月後 (每月月底一個點)
+DEFAULT_PROJECTION_MONTHS = 12
+MAX_PROJECTION_DAYS = 3 * 366
+MAX_PROJECTION_DATES = 100
+
+# 同一天的事件順序：入帳與補償先於年終作廢 (作廢較多、預測較保守)；
+# 補休批次在到期日當天已不能使用，因此先作廢再扣減休假
+ACCRUAL, COMPENSATION, YEAR_END, LOT_EXPIRY, LEAVE, LOT_CONSUME = range(6)
+
+
+def _employees(employee_ids=None):
+    employees = (
+        Employee.objects.filter(status='Active')
+        .select_related('user', 'leave_policy', 'work_schedule')
+        .prefetch_related('leave_policy__rules', 'work_schedule__rules')
+        .order_by('id')
+    )
+    if employee_ids is not None:
+        employees = employees.filter(id__in=employee_ids)
+    return employees
+
+
+def _statuses(include_pending):
+    return ['Approved', 'Pending'] if include_pending else ['Approved']
+
+
+def _accrual_events(employees, leave_type, today, horizon):
+    """{員工ID: [(入帳日, ACCRUAL, 時數)]}：到 horizon 為止尚未入帳的期間 (已到期但排程尚未執行的算在今天)。"""
+    events = defaultdict(list)
+    with_policy = [emp for emp in employees if emp.leave_policy_id]
+    frequencies = {emp.id: emp.leave_policy.accrual_frequency for emp in with_policy}
+    for accrual in plan_accruals(with_policy, leave_type, horizon, since=today):
+        credit = accrual_credit_date(frequencies[accrual.employee_id], accrual.period_start, accrual.period_end)
+        events[accrual.employee_id].append((max(credit, today), ACCRUAL, accrual.hours))
+    return events
+
+
+def _compensation_events(employees, leave_type, holidays, today):
+    """
+    {員工ID: [(日期, COMPENSATION, 時數)]}：尚未到來 (或尚未處理) 的假期，應得補償與已入帳補償的差額。
+    與 compensate_holidays 相同，已經過去的假期不會收回補償。
+    """
+    events = defaultdict(list)
+    if not holidays:
+        return events
+    existing = {
+        (compensation.employee_id, compensation.holiday_id): compensation.hours
+        for compensation in HolidayCompensation.objects.filter(employee__in=employees, holiday__in=holidays, leave_type=leave_type)
+    }
+    departments = department_regions()
+    for emp in employees:
+        region = employee_region(emp, departments)
+        signature = compensation_signature(emp, region)
+        for holiday in holidays:
+            if holiday.region != region and (emp.id, holiday.id) not in existing:
+                continue
+            delta = target_hours(emp, region, signature, holiday) - existing.get((emp.id, holiday.id), Decimal('0.00'))
+            # 保守估計：補償在假期當天才算入，收回則在下次執行 (今天) 就扣除
+            if delta > 0:
+                events[emp.id].append((max(holiday.date, today), COMPENSATION, delta))
+            elif delta < 0 and holiday.date > today:
+                events[emp.id].append((today, COMPENSATION, delta))
+    return events
+
+
+def _year_end_events(employees, today, horizon, due_now):
+    """{員工ID: [(假期年度起始日, YEAR_END, 結轉上限時數)]}；本年度尚未結算的策略算在今天。"""
+    events = defaultdict(list)
+    for emp in employees:
+        policy = emp.leave_policy
+        if policy is None:
+            continue
+        max_carry = max_carry_over_hours(emp)
+        if policy.id in due_now:
+            events[emp.id].append((today, YEAR_END, max_carry))
+        for year in range(today.year, horizon.year + 1):
+            start = date(year, policy.fiscal_year_start_month, 1)
+            if today < start <= horizon:
+                events[emp.id].append((start, YEAR_END, max_carry))
+    return events
+
+
+def _leave_events(employees, leave_type, today, include_pending):
+    """
+    回傳 ({員工ID: 今天或之前開始的休假時數}, {員工ID: [(開始日, LEAVE, 時數)]})。
+    待審核的休假另有 LOT_CONSUME 事件 (今天或開始日)，批准時才會扣減補休批次。
+    """
+    leaves = LeaveRequest.objects.filter(employee__in=employees, leave_type=leave_type, status__in=_statuses(include_pending))
+    taken = defaultdict(Decimal)
+    events = defaultdict(list)
+    for employee_id, status, total in (
+        leaves.filter(start_datetime__date__lte=today)
+        .values('employee_id', 'status').annotate(total=Sum('duration_hours')).values_list('employee_id', 'status', 'total')
+    ):
+        taken[employee_id] += total or Decimal('0.00')
+        if status == 'Pending':
+            events[employee_id].append((today, LOT_CONSUME, total or Decimal('0.00')))
+    for employee_id, status, start, hours in (
+        leaves.filter(start_datetime__date__gt=today).values_list('employee_id', 'status', 'start_datetime', 'duration_hours')
+    ):
+        start = timezone.localtime(start).date()
+        events[employee_id].append((start, LEAVE, hours))
+        if status == 'Pending':
+            events[employee_id].append((start, LOT_CONSUME, hours))
+    return taken, events
+
+
+def _lot_events(lots, today):
+    """{員工ID: [(到期日, LOT_EXPIRY, 批次)]}；已到期但排程尚未執行的批次算在今天。"""
+    events = defaultdict(list)
+    for employee_id, employee_lots in lots.items():
+        for lot in employee_lots:
+            if lot[0] is not None:
+                events[employee_id].append((max(lot[0], today), LOT_EXPIRY, lot))
+    return events
+
+
+def _series(dates, balance, taken, events, lots=()):
+    """依日期推進一位員工的事件，回傳每個日期的預測點。lots 為補休批次 [[到期日, 剩餘時數]] (依扣減順序)。"""
+    events = sorted(events, key=lambda event: (event[0], event[1]))
+    # 年終結算的剩餘以所有已知的休假計算 (與 year_end 相同，尚未開始的休假也會扣除)
+    known_leave = taken + sum((hours for _, kind, hours in events if kind == LEAVE), Decimal('0.00'))
+    ledger = balance
+    totals = {'accrued_hours': Decimal('0.00'), 'compensation_hours': Decimal('0.00'), 'leave_hours': Decimal('0.00'), 'forfeited_hours': Decimal('0.00')}
+
+    points, index = [], 0
+    for day in dates:
+        while index < len(events) and events[index][0] <= day:
+            event_day, kind, value = events[index]
+            if kind == ACCRUAL:
+                ledger += value
+                totals['accrued_hours'] += value
+            elif kind == COMPENSATION:
+                ledger += value
+                totals['compensation_hours'] += value
+            elif kind == YEAR_END:
+                # value 為結轉上限時數
+                forfeited = split_remaining(ledger - known_leave, value)[1]
+                ledger -= forfeited
+                totals['forfeited_hours'] += forfeited
+            elif kind == LOT_EXPIRY:
+                # value 為補休批次 [到期日, 剩餘時數]
+                ledger -= value[1]
+                totals['forfeited_hours'] += value[1]
+                value[1] = Decimal('0.00')
+            elif kind == LEAVE:
+                taken += value
+                totals['leave_hours'] += value
+            else:
+                for lot in lots:
+                    if value <= 0:
+                        break
+                    if lot[0] is None or lot[0] > event_day:
+                        used = min(lot[1], value)
+                        lot[1] -= used
+                        value -= used
+            index += 1
+        points.append({'date': day, 'projected_hours': (ledger - taken).quantize(Decimal('0.01')), **{
+            key: value.quantize(Decimal('0.01')) for key, value in totals.items()
+        }})
+    return points
+
+
+def project_balances(dates, employee_ids=None, leave_type=None, today=None, include_pending=True, extra_leaves=(), chunk_size=PROJECTION_CHUNK_SIZE):
+    """
+    計算在職員工在 dates (今天或之後的日期) 的預計餘額，回傳 {員工ID: [預測點]}。
+    預測點包含 date、projected_hours，以及今天之後累計的 accrued_hours、compensation_hours、leave_hours、forfeited_hours。
+    employee_ids 為 None 時計算全公司；leave_type 預設為年假；extra_leaves 為尚未儲存的休假 [(員工ID, 開始日, 時數)]。
+    """
+    today = today or date.today()
+    dates = sorted(set(dates))
+    if not dates:
+        return {}
+    horizon = dates[-1]
+    leave_type = leave_type or LeaveType.objects.get(name__iexact=ANNUAL_LEAVE_TYPE)
+    is_annual = leave_type.name.lower() == ANNUAL_LEAVE_TYPE.lower()
+
+    is_comp = leave_type.name.lower() == COMPENSATORY_LEAVE_TYPE.lower()
+
+    extra = defaultdict(list)
+    for employee_id, start, hours in extra_leaves:
+        extra[employee_id] += [(max(start, today), LEAVE, Decimal(hours)), (max(start, today), LOT_CONSUME, Decimal(hours))]
+
+    holidays, due_now = [], set()
+    if is_annual:
+        # compensate_holidays 只處理今年起的假期；今天之前但尚未處理的新假期會在下次執行時入帳
+        holidays = [
+            holiday for holiday in PublicHoliday.objects.filter(date__year__gte=today.year, date__lte=horizon).order_by('date')
+            if holiday.date > today or holiday.compensated_at is None
+        ]
+        due_now = {policy.id for policies in due_policies(today).values() for policy, _ in policies}
+
+    result = {}
+    employees = list(_employees(employee_ids))
+    for offset in range(0, len(employees), chunk_size):
+        chunk = employees[offset:offset + chunk_size]
+        balances = dict(
+            LeaveBalance.objects.filter(employee__in=chunk, leave_type=leave_type).values_list('employee_id', 'balance_hours')
+        )
+        taken, leave_events = _leave_events(chunk, leave_type, today, include_pending)
+        lots = open_lots(chunk) if is_comp else {}
+        event_sources = [leave_events, extra, _lot_events(lots, today)]
+        if is_annual:
+            event_sources += [
+                _accrual_events(chunk, leave_type, today, horizon),
+                _compensation_events(chunk, leave_type, holidays, today),
+                _year_end_events(chunk, today, horizon, due_now),
+            ]
+        for emp in chunk:
+            events = [event for source in event_sources for event in source.get(emp.id, [])]
+            result[emp.id] = _series(
+                dates, balances.get(emp.id, Decimal('0.00')), taken.get(emp.id, Decimal('0.00')), events, lots.get(emp.id, []),
+            )
+    return result
+
+
+def tracks_balance(employee, leave_type):
+    """這個假別是否有餘額可扣：員工有 LeaveBalance 記錄，或為有假期策略的年假。"""
+    if leave_type.name.lower() == ANNUAL_LEAVE_TYPE.lower() and employee.leave_policy_id:
+        return True
+    return LeaveBalance.objects.filter(employee=employee, leave_type=leave_type).exists()
+
+
+def projected_shortfall(leave_request, today=None):
+    """
+    加上這筆 (尚未儲存的) 休假後，預計餘額最低會不足多少時數；足夠或假別沒有餘額時回傳 None。
+    檢查休假開始日以及之後每一筆已知休假的開始日 (餘額只會在這些日期減少)。
+    """
+    today = today or date.today()
+    employee, leave_type = leave_request.employee, leave_request.leave_type
+    if employee.status != 'Active' or not tracks_balance(employee, leave_type):
+        return None
+
+    hours = leave_request.calculate_work_hours()
+    start = max(timezone.localtime(leave_request.start_datetime).date(), today)
+    later = (
+        LeaveRequest.objects.filter(employee=employee, leave_type=leave_type, status__in=_statuses(True), start_datetime__date__gt=start)
+        .exclude(id=leave_request.id).values_list('start_datetime', flat=True)
+    )
+    checkpoints = [start] + [timezone.localtime(day).date() for day in later]
+    series = project_balances(checkpoints, [employee.id], leave_type, today, extra_leaves=[(employee.id, start, hours)])
+    lowest = min((point['projected_hours'] for point in series.get(employee.id, [])), default=Decimal('0.00'))
+    return -lowest if lowest < 0 else None
+
+
+def month_ends(start, end):
+    """start 所在月份到 end 之間的每個月底 (最後一個點為 end)。"""
+    days = []
+    month_end = start.replace(day=1) + relativedelta(months=1) - timedelta(days=1)
+    while month_end < end:
+        days.append(month_end)
+        month_end = month_end.replace(day=1) + relativedelta(months=2) - timedelta(days=1)
+    days.append(end)
+    return days
+
+
+def projection_from_params(params, employee_ids):
+    """
+    從 GET 參數 (date 可多個 / until、leave_type、pending) 產生預測，供 API 使用。
+    沒有 date 時以每月月底到 until (預設 DEFAULT_PROJECTION_MONTHS 個月後) 為預測點。參數錯誤時拋出 ValueError。
+    """
+    today = date.today()
+    try:
+        dates = sorted({date.fromisoformat(day) for day in params.getlist('date') if day})
+        until = date.fromisoformat(params['until']) if params.get('until') else today + relativedelta(months=DEFAULT_PROJECTION_MONTHS)
+        leave_type_id = int(params['leave_type']) if params.get('leave_type') else None
+    except ValueError:
+        raise ValueError("參數格式錯誤：date、until 應為 YYYY-MM-DD，leave_type 應為整數。")
+    if not dates:
+        if until < today:
+            raise ValueError("until 不能早於今天。")
+        dates = month_ends(today, until)
+    if dates[0] < today:
+        raise ValueError("只能預測今天或之後的日期。")
+    if (dates[-1] - today).days > MAX_PROJECTION_DAYS or len(dates) > MAX_PROJECTION_DATES:
+        raise ValueError(f"最多只能預測 {MAX_PROJECTION_DAYS} 天內、{MAX_PROJECTION_DATES} 個日期。")
+
+    try:
+        leave_type = LeaveType.objects.get(id=leave_type_id) if leave_type_id else LeaveType.objects.get(name__iexact=ANNUAL_LEAVE_TYPE)
+    except LeaveType.DoesNotExist:
+        raise ValueError("找不到指定的假別。")
+
+    series = project_balances(dates, employee_ids, leave_type, today, include_pending=params.get('pending') != '0')
+    return {
+        'leave_type': leave_type.name,
+        'today': today,
+        'dates': dates,
+        'employees': {
+            employee_id: [
+                {key: float(value) if isinstance(value, Decimal) else value for key, value in point.items()}
+                for point in points
+            ]
+            for employee_id, points in series.items()
+        },
+    }
@@ -1,84 +1,39 @@
 # core/management/commands/accrue_leave.py
-from django.core.management.base import BaseCommand
-from core.models import Employee, LeavePolicy, LeaveBalance, LeaveType
-from datetime import date
-from dateutil.relativedelta import relativedelta
-from decimal import Decimal
+import time
+from datetime import date, datetime
+from django.core.management.base import BaseCommand, CommandError
+from core.accruals import ANNUAL_LEAVE_TYPE, accrue_leave
+from core.models import LeaveType
 
 class Command(BaseCommand):
-    help = 'Accrues leave for all active employees based on their policies.'
+    help = 'Accrues leave for all active employees based on their policies (daily, weekly, monthly or yearly), catching up any missed periods.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--date', type=str, help='Accrue up to this day (YYYY-MM-DD). Defaults to today.')
+        parser.add_argument('--start', type=str, help='Backfill periods starting on or after this day (YYYY-MM-DD). Periods already credited are skipped.')
+        parser.add_argument('--all', action='store_true', help='Check every eligible employee instead of only those whose next accrual date is due.')
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be credited.')
 
     def handle(self, *args, **options):
-        self.stdout.write("Starting leave accrual process...")
+        started = time.perf_counter()
+        try:
+            as_of = datetime.strptime(options['date'], '%Y-%m-%d').date() if options['date'] else date.today()
+            start = datetime.strptime(options['start'], '%Y-%m-%d').date() if options['start'] else None
+        except ValueError as e:
+            raise CommandError(f"Invalid date: {e}")
 
-        today = date.today()
-        active_employees = Employee.objects.filter(status='Active', leave_policy__isnull=False)
-        
         try:
-            annual_leave_type = LeaveType.objects.get(name__iexact='Annual Leave')
+            stats = accrue_leave(
+                as_of=as_of, start=start, dry_run=options['dry_run'],
+                # 排程每分鐘執行：預設只處理下次入帳日已到的員工
+                due_only=not (options['all'] or start),
+            )
         except LeaveType.DoesNotExist:
-            self.stdout.write(self.style.ERROR("Error: 'Annual Leave' type not found. Please create it."))
+            self.stdout.write(self.style.ERROR(f"Error: '{ANNUAL_LEAVE_TYPE}' type not found. Please create it."))
             return
 
-        for employee in active_employees:
-            policy = employee.leave_policy
-            
-            # --- Calculate Years of Service ---
-            service_duration = relativedelta(today, employee.hire_date)
-            years_of_service = service_duration.years
-
-            # --- Determine Waiting Period ---
-            waiting_period_end = employee.hire_date
-            if policy.waiting_period_unit == 'DAYS':
-                waiting_period_end += relativedelta(days=policy.waiting_period_amount)
-            elif policy.waiting_period_unit == 'MONTHS':
-                waiting_period_end += relativedelta(months=policy.waiting_period_amount)
-
-            if today < waiting_period_end:
-                # self.stdout.write(f"Employee {employee.user.username} is still in waiting period.")
-                continue
-
-            # --- Accrual Logic ---
-            accrual_amount = policy.accrual_amount
-            should_accrue = False
-
-            if policy.accrual_frequency == 'YEARLY':
-                # Accrue on the anniversary of the hire date each year
-                if today.month == employee.hire_date.month and today.day == employee.hire_date.day and today > employee.hire_date:
-                    should_accrue = True
-            
-            # Add other frequencies (MONTHLY, etc.) here if needed
-
-            # --- Apply Policy Rules ---
-            applicable_rules = policy.rules.filter(years_of_service__lte=years_of_service).order_by('-years_of_service')
-            for rule in applicable_rules:
-                if rule.rule_type == 'ADD':
-                    accrual_amount += rule.adjustment_amount
-                elif rule.rule_type == 'SET':
-                    accrual_amount = rule.adjustment_amount
-                # Only apply the highest-matching rule
-                break 
-
-            if should_accrue:
-                balance, created = LeaveBalance.objects.get_or_create(
-                    employee=employee,
-                    leave_type=annual_leave_type,
-                    defaults={'balance_hours': Decimal('0.0')}
-                )
-                
-                # Assuming the policy accrual unit is 'DAYS', convert to hours (8 hours/day)
-                # This part may need adjustment if your policies are in hours
-                if policy.accrual_unit == 'DAYS':
-                    accrual_hours = accrual_amount * 8
-                else: # Assumes HOURS
-                    accrual_hours = accrual_amount
-
-                balance.balance_hours += Decimal(str(accrual_hours))
-                balance.save()
-
-                self.stdout.write(self.style.SUCCESS(
-                    f"Accrued {accrual_hours} hours ({accrual_amount} days) for {employee.user.username}"
-                ))
-        
-        # This line was incorrectly indented. It now belongs to the 'handle' method.
-        self.stdout.write("Leave accrual process finished.")
\ No newline at end of file
+        prefix = "[Dry run] Would credit" if options['dry_run'] else "Credited"
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix} {stats['periods']} accrual periods ({stats['hours']} hours) for {stats['employees']} employees "
+            f"up to {as_of} in {time.perf_counter() - started:.1f}s."
+        ))
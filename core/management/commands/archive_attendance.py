@@ -0,0 +1,31 @@
+# core/management/commands/archive_attendance.py
+import time
+from datetime import datetime
+from django.core.management.base import BaseCommand, CommandError
+from core.attendance_archive import archive_attendance, refresh_recent_summaries, hot_cutoff, ATTENDANCE_HOT_MONTHS
+
+class Command(BaseCommand):
+    help = (
+        f'Rolls attendance up into monthly summaries and moves records older than {ATTENDANCE_HOT_MONTHS} months '
+        'into the archive table.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--today', type=str, help='Treat this date (YYYY-MM-DD) as today. Defaults to the current date.')
+        parser.add_argument('--summaries-only', action='store_true', help='Only refresh the summaries of the months still in the main table.')
+
+    def handle(self, *args, **options):
+        try:
+            today = datetime.strptime(options['today'], '%Y-%m-%d').date() if options['today'] else None
+        except ValueError as e:
+            raise CommandError(f"Invalid date: {e}")
+
+        started = time.perf_counter()
+        if not options['summaries_only']:
+            results = archive_attendance(today)
+            for (year, month), moved in sorted(results.items()):
+                self.stdout.write(f"  {year}-{month:02d}: archived {moved} records")
+            self.stdout.write(f"Archived records before {hot_cutoff(today)}.")
+
+        written = refresh_recent_summaries(today)
+        self.stdout.write(self.style.SUCCESS(f"Refreshed {written} monthly summaries in {time.perf_counter() - started:.1f}s."))
@@ -0,0 +1,46 @@
+# core/management/commands/auto_schedule.py
+import time
+from datetime import date, datetime, timedelta
+from django.core.management.base import BaseCommand
+from core.models import Employee, Department
+from core.shift_solver import solve_shifts
+
+class Command(BaseCommand):
+    help = 'Previews automatic shift assignments against department staffing requirements (nothing is saved).'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--start',
+            type=str,
+            help='First day to schedule (YYYY-MM-DD). Defaults to next Monday.'
+        )
+        parser.add_argument('--weeks', type=int, default=1, help='Number of weeks to schedule.')
+        parser.add_argument('--department', type=int, help='Only schedule this department ID.')
+
+    def handle(self, *args, **options):
+        if options['start']:
+            start = datetime.strptime(options['start'], '%Y-%m-%d').date()
+        else:
+            today = date.today()
+            start = today + timedelta(days=(7 - today.weekday()))
+        end = start + timedelta(days=7 * options['weeks'] - 1)
+
+        employees = Employee.objects.filter(status='Active').select_related('work_schedule').prefetch_related('work_schedule__rules')
+        if options['department']:
+            employees = employees.filter(department_id=options['department'])
+        employees = list(employees)
+
+        started = time.perf_counter()
+        assignments, shortfalls = solve_shifts(employees, start, end)
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(f"Scheduled {len(employees)} employees from {start} to {end}: {len(assignments)} shifts in {elapsed:.2f}s.")
+
+        department_names = dict(Department.objects.values_list('id', 'name'))
+        for shortfall in shortfalls:
+            self.stdout.write(self.style.WARNING(
+                f"  - {shortfall['date']} {department_names.get(shortfall['department_id'], shortfall['department_id'])}: "
+                f"required {shortfall['required']}, assigned {shortfall['assigned']}"
+            ))
+        if not shortfalls:
+            self.stdout.write(self.style.SUCCESS("All staffing requirements are covered."))
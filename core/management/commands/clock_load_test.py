@@ -0,0 +1,135 @@
+# core/management/commands/clock_load_test.py
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.urls import reverse
+from django.utils.crypto import get_random_string
+from core.models import Employee, AttendanceRecord
+
+class Command(BaseCommand):
+    help = (
+        'Simulates a shift-start burst against the JSON clock endpoint and reports latency percentiles. '
+        'With --url the punches are sent over concurrent HTTP to a running server (e.g. gunicorn on staging), '
+        'which is what the percentiles should be quoted from; without it they go through the in-process test client, '
+        'which only measures the view and database and leaves out the network, WSGI server and worker queueing. '
+        'Run it against a staging database: the punches it creates are deleted afterwards unless --keep is given.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--employees', type=int, default=200, help='Number of employees punching at the same time.')
+        parser.add_argument('--threads', type=int, default=32, help='Number of concurrent clients.')
+        parser.add_argument('--double-tap', action='store_true', help='Send every punch twice to check that no duplicate records are opened.')
+        parser.add_argument('--url', type=str, help='Base URL of a running server sharing this database (e.g. https://staging.example.com).')
+        parser.add_argument('--timeout', type=float, default=30, help='HTTP timeout in seconds (with --url).')
+        parser.add_argument('--ip', type=str, default='127.0.0.1', help='Client IP address to punch from (in-process mode only).')
+        parser.add_argument('--keep', action='store_true', help='Keep the attendance records created by the test.')
+
+    def handle(self, *args, **options):
+        open_employee_ids = AttendanceRecord.objects.filter(clock_out__isnull=True).values('employee_id')
+        employees = list(
+            Employee.objects.filter(status='Active', user__isnull=False)
+            .exclude(id__in=open_employee_ids)
+            .select_related('user')[:options['employees']]
+        )
+        if not employees:
+            self.stdout.write(self.style.WARNING('No active employees without an open attendance record.'))
+            return
+
+        path = reverse('core:clock_api')
+        base_url = options['url'].rstrip('/') if options['url'] else None
+        if base_url and not base_url.startswith(('http://', 'https://')):
+            raise CommandError('--url must start with http:// or https://')
+
+        # 測試 Client 預設的 Host 'testserver' 不在 ALLOWED_HOSTS 內，每次打卡都會得到 400；
+        # 改用允許的主機 (ALLOWED_HOSTS 為空時 DEBUG 模式允許 localhost)
+        host = next((h.lstrip('.') for h in settings.ALLOWED_HOSTS if h != '*'), 'localhost')
+
+        # 以測試 Client 登入會在資料庫建立 session；HTTP 模式把同一個 session cookie 送給真正的伺服器
+        clients = {}
+        for emp in employees:
+            client = Client(REMOTE_ADDR=options['ip'], HTTP_HOST=host, raise_request_exception=False)
+            client.force_login(emp.user)
+            clients[emp.id] = client
+
+        jobs = [emp.id for emp in employees]
+        if options['double_tap']:
+            jobs = [emp_id for emp_id in jobs for _ in range(2)]
+
+        latencies = []
+        statuses = {}
+        record_ids = set()
+        lock = threading.Lock()
+        csrf_token = get_random_string(32)
+
+        def post_http(emp_id):
+            cookie = f"{settings.SESSION_COOKIE_NAME}={clients[emp_id].cookies[settings.SESSION_COOKIE_NAME].value}; {settings.CSRF_COOKIE_NAME}={csrf_token}"
+            request = urllib.request.Request(base_url + path, data=b'', method='POST', headers={
+                'Cookie': cookie, 'X-CSRFToken': csrf_token, 'Origin': base_url, 'Referer': base_url + path,
+            })
+            try:
+                with urllib.request.urlopen(request, timeout=options['timeout']) as response:
+                    return response.status, response.read()
+            except urllib.error.HTTPError as e:
+                return e.code, b''
+            except OSError:
+                return 'error', b''
+
+        def post_in_process(emp_id):
+            response = clients[emp_id].post(path)
+            return response.status_code, response.content
+
+        def punch(emp_id):
+            started = time.perf_counter()
+            status, body = (post_http if base_url else post_in_process)(emp_id)
+            elapsed = (time.perf_counter() - started) * 1000
+            with lock:
+                latencies.append(elapsed)
+                statuses[status] = statuses.get(status, 0) + 1
+                if status == 200:
+                    record_ids.add(json.loads(body)['id'])
+            connection.close()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options['threads']) as executor:
+            list(executor.map(punch, jobs))
+        wall = time.perf_counter() - started
+
+        latencies.sort()
+        def percentile(p):
+            return latencies[min(len(latencies) - 1, int(round(p / 100 * (len(latencies) - 1))))]
+
+        mode = f"HTTP against {base_url}" if base_url else "in-process test client (view + database only, not server latency)"
+        self.stdout.write(
+            f"{len(jobs)} punches from {len(employees)} employees in {wall:.2f}s "
+            f"({len(jobs) / wall:.0f} req/s, {options['threads']} threads, {mode})."
+        )
+        self.stdout.write(
+            f"{'Latency' if base_url else 'In-process latency'} ms: p50={percentile(50):.1f} p95={percentile(95):.1f} "
+            f"p99={percentile(99):.1f} max={latencies[-1]:.1f}"
+        )
+        self.stdout.write(f"Status codes: {dict(sorted(statuses.items(), key=lambda item: str(item[0])))}")
+
+        open_counts = AttendanceRecord.objects.filter(
+            employee_id__in=clients.keys(), clock_out__isnull=True
+        ).values('employee_id').distinct().count()
+        opened = AttendanceRecord.objects.filter(id__in=record_ids).count()
+
+        if not options['keep']:
+            AttendanceRecord.objects.filter(id__in=record_ids).delete()
+        for client in clients.values():
+            client.logout() # 刪除測試建立的 session
+
+        failed = len(jobs) - statuses.get(200, 0)
+        if failed:
+            raise CommandError(f"{failed} of {len(jobs)} punches did not return 200: {dict(sorted(statuses.items(), key=lambda item: str(item[0])))}")
+        if opened != len(employees):
+            raise CommandError(f"Expected one record per employee: {opened} records opened for {len(employees)} employees.")
+        self.stdout.write(self.style.SUCCESS(f"{opened} records opened, {open_counts} employees clocked in, no duplicates."))
@@ -0,0 +1,58 @@
+# core/management/commands/compensate_holidays.py
+import csv
+import sys
+import time
+from datetime import date
+from django.core.management.base import BaseCommand
+from core.holiday_compensation import CHANGE_COLUMNS, compensate_holidays
+from core.models import LeaveType
+
+class Command(BaseCommand):
+    help = 'Compensates employees for public holidays that fall on their rest day. Only new holidays and employees whose schedule changed are processed.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--year',
+            type=int,
+            default=date.today().year,
+            help='The year to process for holiday compensation. Defaults to the current year.'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Do not write anything; output every compensation that would change as CSV.'
+        )
+        parser.add_argument(
+            '--output',
+            type=str,
+            help='Write the CSV to this file instead of stdout (with --dry-run).'
+        )
+
+    def handle(self, *args, **options):
+        year = options['year']
+        started = time.perf_counter()
+
+        try:
+            changes = compensate_holidays(year, dry_run=options['dry_run'])
+        except LeaveType.DoesNotExist:
+            self.stdout.write(self.style.ERROR("Could not find a LeaveType named 'Annual Leave'. Please create it first."))
+            return
+
+        hours = sum(change['new_hours'] - change['old_hours'] for change in changes)
+        employees = len({change['employee_id'] for change in changes})
+        summary = f"{len(changes)} compensations changed ({hours} hours) for {employees} employees in {year}"
+
+        if options['dry_run']:
+            output = open(options['output'], 'w', newline='', encoding='utf-8-sig') if options['output'] else self.stdout
+            try:
+                writer = csv.DictWriter(output, fieldnames=CHANGE_COLUMNS, extrasaction='ignore')
+                writer.writeheader()
+                writer.writerows(changes)
+            finally:
+                if options['output']:
+                    output.close()
+            # 摘要寫到 stderr，stdout 保持為純 CSV
+            sys.stderr.write(f"[Dry run] {summary} ({time.perf_counter() - started:.1f}s).\n")
+            return
+
+        self.stdout.write(self.style.SUCCESS(f"--- Holiday compensation finished: {summary} in {time.perf_counter() - started:.1f}s ---"))
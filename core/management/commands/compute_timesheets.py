@@ -0,0 +1,35 @@
+# core/management/commands/compute_timesheets.py
+import time
+from datetime import date, datetime, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from core.timesheets import compute_timesheets, recompute_stale_timesheets
+
+class Command(BaseCommand):
+    help = 'Computes daily timesheets (worked minutes, lateness, early leave, unplanned overtime) from attendance and scheduled shifts.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', type=str, help='First day to compute (YYYY-MM-DD). Defaults to yesterday.')
+        parser.add_argument('--end', type=str, help='Last day to compute (YYYY-MM-DD). Defaults to --start.')
+        parser.add_argument('--month', type=str, help='Compute a whole month (YYYY-MM) instead of --start/--end.')
+        parser.add_argument('--stale-only', action='store_true', help='Only recompute timesheets marked stale by corrected punches.')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        if not options['stale_only']:
+            try:
+                if options['month']:
+                    start = datetime.strptime(options['month'], '%Y-%m').date()
+                    end = (start + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+                else:
+                    start = datetime.strptime(options['start'], '%Y-%m-%d').date() if options['start'] else date.today() - timedelta(days=1)
+                    end = datetime.strptime(options['end'], '%Y-%m-%d').date() if options['end'] else start
+            except ValueError as e:
+                raise CommandError(f"Invalid date: {e}")
+            if end < start:
+                raise CommandError("--end must not be before --start.")
+
+            written = compute_timesheets(start, end)
+            self.stdout.write(f"Computed {written} timesheets from {start} to {end} in {time.perf_counter() - started:.1f}s.")
+
+        refreshed = recompute_stale_timesheets()
+        self.stdout.write(self.style.SUCCESS(f"Recomputed {refreshed} stale timesheets. Total time {time.perf_counter() - started:.1f}s."))
@@ -0,0 +1,54 @@
+# core/management/commands/expire_comp_leave.py
+import csv
+import sys
+import time
+from datetime import date, datetime
+from django.core.management.base import BaseCommand, CommandError
+from core.comp_leave import EXPIRY_COLUMNS, expire_comp_leave
+
+class Command(BaseCommand):
+    help = 'Forfeits the remaining hours of compensatory leave lots that have expired. Only lots due on or before the date are read (indexed by expiry date).'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--date',
+            type=str,
+            help='Expire lots due on or before this date (YYYY-MM-DD) instead of today.'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Do not write anything; output every lot that would expire as CSV.'
+        )
+        parser.add_argument(
+            '--output',
+            type=str,
+            help='Write the CSV to this file instead of stdout (with --dry-run).'
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            today = datetime.strptime(options['date'], '%Y-%m-%d').date() if options['date'] else date.today()
+        except ValueError as e:
+            raise CommandError(f"Invalid date: {e}")
+
+        rows = expire_comp_leave(today, dry_run=options['dry_run'])
+        hours = sum(row['expired_hours'] for row in rows)
+        employees = len({row['employee_id'] for row in rows})
+        summary = f"{len(rows)} lots expired ({hours} hours) for {employees} employees as of {today}"
+
+        if options['dry_run']:
+            output = open(options['output'], 'w', newline='', encoding='utf-8-sig') if options['output'] else self.stdout
+            try:
+                writer = csv.DictWriter(output, fieldnames=EXPIRY_COLUMNS, extrasaction='ignore')
+                writer.writeheader()
+                writer.writerows(rows)
+            finally:
+                if options['output']:
+                    output.close()
+            # 摘要寫到 stderr，stdout 保持為純 CSV
+            sys.stderr.write(f"[Dry run] {summary} ({time.perf_counter() - started:.1f}s).\n")
+            return
+
+        self.stdout.write(self.style.SUCCESS(f"--- Compensatory leave expiry finished: {summary} in {time.perf_counter() - started:.1f}s ---"))
@@ -0,0 +1,61 @@
+# core/management/commands/generate_holidays.py
+import time
+from datetime import date
+from django.core.management.base import BaseCommand, CommandError
+from core.public_holidays import generate_holidays, upsert_holidays
+
+class Command(BaseCommand):
+    help = 'Generates public holidays for one or more regions (e.g. HK, MY, MY-14) offline from the holidays package and bulk upserts them.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--region',
+            nargs='+',
+            default=['HK'],
+            help='Region codes: ISO country code, optionally with a subdivision (e.g. HK MY MY-14). Defaults to HK.'
+        )
+        parser.add_argument(
+            '--start-year',
+            type=int,
+            default=date.today().year,
+            help='First year to generate. Defaults to the current year.'
+        )
+        parser.add_argument(
+            '--end-year',
+            type=int,
+            help='Last year to generate (inclusive). Defaults to --start-year.'
+        )
+        parser.add_argument(
+            '--language',
+            type=str,
+            help='Language of the holiday names if supported by the region (e.g. zh_HK, en_US).'
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Only list the holidays that would be generated.'
+        )
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        start_year = options['start_year']
+        end_year = options['end_year'] or start_year
+        if end_year < start_year:
+            raise CommandError("--end-year must not be earlier than --start-year.")
+
+        try:
+            entries = generate_holidays(options['region'], range(start_year, end_year + 1), language=options['language'])
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        if options['dry_run']:
+            for region, day, name in entries:
+                self.stdout.write(f"{region}\t{day}\t{name}")
+            self.stdout.write(self.style.SUCCESS(f"[Dry run] {len(entries)} holidays for {', '.join(options['region'])} {start_year}-{end_year}."))
+            return
+
+        created, updated = upsert_holidays(entries)
+        self.stdout.write(self.style.SUCCESS(
+            f"Generated {len(entries)} holidays for {', '.join(options['region'])} {start_year}-{end_year}: "
+            f"{created} added, {updated} updated in {time.perf_counter() - started:.1f}s."
+        ))
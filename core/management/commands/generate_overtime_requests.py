@@ -0,0 +1,42 @@
+# core/management/commands/generate_overtime_requests.py
+import time
+from datetime import date, datetime, timedelta
+from django.core.management.base import BaseCommand, CommandError
+from core.overtime import OVERTIME_MIN_MINUTES, generate_overtime_requests
+
+class Command(BaseCommand):
+    help = 'Creates pending overtime requests (one per employee-day) from timesheet overtime and emails each manager one approval list.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--start', type=str, help='First day to scan (YYYY-MM-DD). Defaults to yesterday.')
+        parser.add_argument('--end', type=str, help='Last day to scan (YYYY-MM-DD). Defaults to --start.')
+        parser.add_argument('--month', type=str, help='Scan a whole month (YYYY-MM) instead of --start/--end.')
+        parser.add_argument('--min-minutes', type=int, default=OVERTIME_MIN_MINUTES, help=f'Ignore overtime shorter than this (default {OVERTIME_MIN_MINUTES}).')
+        parser.add_argument('--no-email', action='store_true', help='Do not email managers.')
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be created.')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            if options['month']:
+                start = datetime.strptime(options['month'], '%Y-%m').date()
+                end = (start + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+            else:
+                start = datetime.strptime(options['start'], '%Y-%m-%d').date() if options['start'] else date.today() - timedelta(days=1)
+                end = datetime.strptime(options['end'], '%Y-%m-%d').date() if options['end'] else start
+        except ValueError as e:
+            raise CommandError(f"Invalid date: {e}")
+        if end < start:
+            raise CommandError("--end must not be before --start.")
+        # 今天還沒結束，工時表不完整
+        end = min(end, date.today() - timedelta(days=1))
+
+        stats = generate_overtime_requests(
+            start, end, min_minutes=options['min_minutes'],
+            notify=not options['no_email'], dry_run=options['dry_run'],
+        )
+        prefix = "[Dry run] Would create" if options['dry_run'] else "Created"
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix} {stats['created']} overtime requests ({stats['hours']} hours) from {start} to {end}; "
+            f"notified {stats['notified']} managers in {time.perf_counter() - started:.1f}s."
+        ))
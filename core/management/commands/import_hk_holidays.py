@@ -1,58 +1,63 @@
 # core/management/commands/import_hk_holidays.py
+import json
 import requests
-from datetime import datetime
 from django.core.management.base import BaseCommand
 from core.models import PublicHoliday
+from core.public_holidays import parse_holiday_json, parse_ics, upsert_holidays
 
 # 使用您提供的、更穩定的通用 API URL
 API_URL = "https://www.1823.gov.hk/common/ical/en.json"
 
 class Command(BaseCommand):
-    help = 'Imports Hong Kong public holidays from the official data.gov.hk API.'
+    help = 'Imports Hong Kong public holidays from the official data.gov.hk API, or from a local JSON/iCal (.ics) file. For offline generation of any region use generate_holidays.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--file',
+            type=str,
+            help='Read holidays from a local file instead of the network: the 1823.gov.hk JSON format, or an iCalendar (.ics) file.'
+        )
+        parser.add_argument(
+            '--region',
+            type=str,
+            default=PublicHoliday.DEFAULT_REGION,
+            help=f'Region code to store the holidays under. Defaults to {PublicHoliday.DEFAULT_REGION}.'
+        )
 
     def handle(self, *args, **kwargs):
-        self.stdout.write(f"Fetching public holidays from official source...")
-
-        try:
-            response = requests.get(API_URL)
-            response.raise_for_status() # 確保請求成功 (HTTP 狀態碼 200)
-            data = response.json()
-        except requests.RequestException as e:
-            self.stdout.write(self.style.ERROR(f"Error fetching data: {e}"))
+        region = kwargs['region'].upper()
+
+        if kwargs['file']:
+            self.stdout.write(f"Reading public holidays from {kwargs['file']}...")
+            try:
+                with open(kwargs['file'], encoding='utf-8-sig') as f:
+                    content = f.read()
+                if kwargs['file'].lower().endswith('.ics'):
+                    entries, skipped = parse_ics(content, region)
+                else:
+                    entries, skipped = parse_holiday_json(json.loads(content), region)
+            except (OSError, ValueError) as e:
+                self.stdout.write(self.style.ERROR(f"Error reading file: {e}"))
+                return
+        else:
+            self.stdout.write(f"Fetching public holidays from official source...")
+            try:
+                response = requests.get(API_URL, timeout=30)
+                response.raise_for_status() # 確保請求成功 (HTTP 狀態碼 200)
+                entries, skipped = parse_holiday_json(response.json(), region)
+            except (requests.RequestException, ValueError) as e:
+                self.stdout.write(self.style.ERROR(f"Error fetching data: {e}"))
+                return
+
+        for item in skipped:
+            self.stdout.write(self.style.WARNING(f"Could not parse holiday: {item}"))
+
+        if not entries:
+            self.stdout.write(self.style.ERROR("Could not find any holiday data ('vevent') in the source."))
             return
 
-        # JSON 結構是 vcalendar -> vevent
-        holidays_data = data.get('vcalendar', [{}])[0].get('vevent', [])
-
-        if not holidays_data:
-            self.stdout.write(self.style.ERROR("Could not find holiday data ('vevent') in the JSON response."))
-            return
-
-        count_created = 0
-        count_updated = 0
-
-        for holiday in holidays_data:
-            summary = holiday.get('summary')
-            start_date_str = holiday.get('dtstart', [None])[0]
-
-            if summary and start_date_str:
-                try:
-                    # 將 "YYYYMMDD" 格式的字串轉換為 date 物件
-                    holiday_date = datetime.strptime(start_date_str, '%Y%m%d').date()
-
-                    # 使用 update_or_create 來避免重複建立，並能更新假期名稱
-                    obj, created = PublicHoliday.objects.update_or_create(
-                        date=holiday_date,
-                        defaults={'name': summary}
-                    )
-                    if created:
-                        count_created += 1
-                    else:
-                        count_updated += 1
-
-                except ValueError:
-                    self.stdout.write(self.style.WARNING(f"Could not parse date: {start_date_str} for holiday '{summary}'"))
+        count_created, count_updated = upsert_holidays(entries)
 
         self.stdout.write(self.style.SUCCESS(
             f"Successfully processed holidays. New holidays added: {count_created}, Existing holidays updated: {count_updated}."
-        ))
\ No newline at end of file
+        ))
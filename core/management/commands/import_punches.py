@@ -0,0 +1,30 @@
+# core/management/commands/import_punches.py
+from django.core.management.base import BaseCommand, CommandError
+from core.punch_import import import_punches, IMPORT_CHUNK_SIZE
+
+class Command(BaseCommand):
+    help = 'Streams a badge-terminal CSV export (employee, timestamp[, direction]) into attendance records. Safe to re-run on the same file.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_path', type=str, help='Path to the CSV file, sorted by punch time.')
+        parser.add_argument('--chunk-size', type=int, default=IMPORT_CHUNK_SIZE, help='Number of records written per batch.')
+
+    def handle(self, *args, **options):
+        def progress(stats):
+            self.stdout.write(f"  {stats['rows']} rows, {stats['created']} created ({stats['rows_per_second']:.0f} rows/s)")
+
+        try:
+            with open(options['csv_path'], encoding='utf-8-sig', newline='') as lines:
+                stats = import_punches(lines, chunk_size=options['chunk_size'], progress=progress)
+        except OSError as e:
+            raise CommandError(f"Cannot read {options['csv_path']}: {e}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Imported {stats['rows']} rows in {stats['seconds']:.1f}s ({stats['rows_per_second']:.0f} rows/s): "
+            f"{stats['created']} created, {stats['closed']} closed, {stats['skipped']} duplicates skipped."
+        ))
+        if stats['unknown_employee'] or stats['invalid'] or stats['unmatched']:
+            self.stdout.write(self.style.WARNING(
+                f"{stats['unknown_employee']} rows with unknown employee, {stats['invalid']} invalid rows, "
+                f"{stats['unmatched']} clock-outs without a clock-in."
+            ))
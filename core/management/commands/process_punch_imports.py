@@ -0,0 +1,21 @@
+# core/management/commands/process_punch_imports.py
+from django.core.management.base import BaseCommand
+from core.punch_import import process_punch_imports
+
+class Command(BaseCommand):
+    help = 'Imports the badge-terminal CSV files queued from the admin (PunchImport rows that are still pending).'
+
+    def handle(self, *args, **options):
+        jobs = process_punch_imports()
+        if not jobs:
+            self.stdout.write("No pending punch imports.")
+            return
+        for job in jobs:
+            stats = job.stats
+            if job.status == 'Done':
+                self.stdout.write(self.style.SUCCESS(
+                    f"{job.csv_file.name}: {stats['rows']} rows in {stats['seconds']:.1f}s, "
+                    f"{stats['created']} created, {stats['closed']} closed, {stats['skipped']} duplicates skipped."
+                ))
+            else:
+                self.stdout.write(self.style.ERROR(f"{job.csv_file.name}: failed: {job.error}"))
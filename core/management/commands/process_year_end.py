@@ -1,80 +1,60 @@
 # core/management/commands/process_year_end.py
-from django.core.management.base import BaseCommand
-from django.db import transaction
-from core.models import Employee, LeaveBalanceAdjustment
+import csv
+import sys
+import time
 from datetime import date, datetime
-from decimal import Decimal
+from django.core.management.base import BaseCommand, CommandError
+from core.models import LeaveType
+from core.year_end import PREVIEW_COLUMNS, process_year_end
 
 class Command(BaseCommand):
-    help = 'Processes year-end leave balance settlement (carry-over/forfeit).'
+    help = 'Processes year-end leave balance settlement (carry-over/forfeit) for every policy whose leave year has just started.'
 
-    # 👇 Add this method to define the --date argument
     def add_arguments(self, parser):
         parser.add_argument(
             '--date',
             type=str,
             help='Run the command for a specific date (YYYY-MM-DD) for testing purposes.'
         )
+        parser.add_argument(
+            '--preview',
+            action='store_true',
+            help='Do not write anything; output the carry-over/forfeit of every employee as CSV.'
+        )
+        parser.add_argument(
+            '--output',
+            type=str,
+            help='Write the preview CSV to this file instead of stdout (with --preview).'
+        )
 
-    @transaction.atomic
-    def handle(self, *args, **kwargs):
-        # Use the provided date, or default to today
-        custom_date_str = kwargs.get('date')
-        if custom_date_str:
-            today = datetime.strptime(custom_date_str, '%Y-%m-%d').date()
-        else:
-            today = date.today()
-
-        self.stdout.write(f"--- Running Year-End Leave Settlement for {today} ---")
-        
-        # ... the rest of your handle method remains the same ...
-
-        policies_to_process = []
-        # Correctly get unique policies
-        policy_ids = Employee.objects.filter(status='Active', leave_policy__isnull=False).values_list('leave_policy_id', flat=True).distinct()
-
-        for policy_id in policy_ids:
-            # We get the policy object from the employee model to avoid another import
-            policy = Employee.objects.filter(leave_policy_id=policy_id).first().leave_policy
-            
-            if policy and today.month == policy.fiscal_year_start_month and today.day == 1:
-                self.stdout.write(f"\nProcessing policy: '{policy.name}'")
-                employees_on_policy = Employee.objects.filter(leave_policy=policy, status='Active')
-
-                for emp in employees_on_policy:
-                    current_balance = emp.annual_leave_balance_hours
-                    
-                    if policy.allow_carry_over:
-                        max_carry_over_hours = policy.max_carry_over_amount
-                        if policy.accrual_unit == 'DAYS':
-                            max_carry_over_hours *= 8
-                        
-                        carry_over_hours = min(current_balance, max_carry_over_hours)
-                        forfeited_hours = current_balance - carry_over_hours
-                        
-                        emp.annual_leave_balance_hours = carry_over_hours
-                        emp.save()
-
-                        LeaveBalanceAdjustment.objects.create(
-                            employee=emp,
-                            hours_changed=-forfeited_hours,
-                            reason=f"Year-end settlement for {today.year - 1}: Forfeited"
-                        )
-                        self.stdout.write(self.style.SUCCESS(
-                            f"  - {emp.user.username}: Carried over {carry_over_hours:.2f} hours, Forfeited {forfeited_hours:.2f} hours."
-                        ))
-                    else:
-                        forfeited_hours = current_balance
-                        emp.annual_leave_balance_hours = 0
-                        emp.save()
-                        
-                        LeaveBalanceAdjustment.objects.create(
-                            employee=emp,
-                            hours_changed=-forfeited_hours,
-                            reason=f"Year-end settlement for {today.year - 1}: All leave forfeited."
-                        )
-                        self.stdout.write(self.style.WARNING(
-                            f"  - {emp.user.username}: Forfeited all {forfeited_hours:.2f} hours (carry-over disabled)."
-                        ))
-
-        self.stdout.write("\n--- Year-End Settlement Finished ---")
\ No newline at end of file
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        try:
+            today = datetime.strptime(options['date'], '%Y-%m-%d').date() if options['date'] else date.today()
+        except ValueError as e:
+            raise CommandError(f"Invalid date: {e}")
+
+        try:
+            rows = process_year_end(today, preview=options['preview'])
+        except LeaveType.DoesNotExist:
+            self.stdout.write(self.style.ERROR("FATAL: 'Annual Leave' type not found. Please create it first."))
+            return
+
+        carried = sum(row['carried_over_hours'] for row in rows)
+        forfeited = sum(row['forfeited_hours'] for row in rows)
+        summary = f"{len(rows)} employees: carried over {carried} hours, forfeited {forfeited} hours"
+
+        if options['preview']:
+            output = open(options['output'], 'w', newline='', encoding='utf-8-sig') if options['output'] else self.stdout
+            try:
+                writer = csv.DictWriter(output, fieldnames=PREVIEW_COLUMNS, extrasaction='ignore')
+                writer.writeheader()
+                writer.writerows(rows)
+            finally:
+                if options['output']:
+                    output.close()
+            # 摘要寫到 stderr，stdout 保持為純 CSV
+            sys.stderr.write(f"[Preview] Year-end settlement for {today}: {summary} ({time.perf_counter() - started:.1f}s).\n")
+            return
+
+        self.stdout.write(self.style.SUCCESS(f"--- Year-End Settlement for {today} finished: {summary} in {time.perf_counter() - started:.1f}s ---"))
@@ -0,0 +1,20 @@
+# core/management/commands/reconcile_attendance.py
+import time
+from django.core.management.base import BaseCommand
+from core.attendance_reconcile import reconcile_open_attendance
+
+class Command(BaseCommand):
+    help = 'Closes attendance records left open past the scheduled shift end, flags the rest for review and emails each manager once.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be closed or flagged.')
+        parser.add_argument('--no-email', action='store_true', help='Do not notify managers.')
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        stats = reconcile_open_attendance(notify=not options['no_email'], dry_run=options['dry_run'])
+        prefix = "[Dry run] " if options['dry_run'] else ""
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}Auto-closed {stats['closed']} records, flagged {stats['flagged']} for review, "
+            f"sent {stats['notified']} manager emails in {time.perf_counter() - started:.1f}s."
+        ))
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.5 on 2026-10-19 13:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0022_role_is_manager'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='workschedule',
+            name='max_consecutive_work_days',
+            field=models.PositiveIntegerField(default=6, help_text='自動排班時，員工連續上班不會超過此天數。每週上班天數則不會超過此班表的規則數。', verbose_name='最多連續上班天數'),
+        ),
+        migrations.CreateModel(
+            name='StaffingRequirement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day_of_week', models.IntegerField(choices=[(0, '星期一'), (1, '星期二'), (2, '星期三'), (3, '星期四'), (4, '星期五'), (5, '星期六'), (6, '星期日')], verbose_name='星期幾')),
+                ('start_time', models.TimeField(verbose_name='上班時間')),
+                ('end_time', models.TimeField(verbose_name='下班時間')),
+                ('required_headcount', models.PositiveIntegerField(default=1, verbose_name='最低在班人數')),
+                ('department', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='staffing_requirements', to='core.department', verbose_name='部門')),
+            ],
+            options={
+                'verbose_name': '人力需求',
+                'verbose_name_plural': '人力需求',
+                'ordering': ['department', 'day_of_week'],
+                'unique_together': {('department', 'day_of_week')},
+            },
+        ),
+    ]
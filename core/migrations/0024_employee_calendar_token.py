@@ -0,0 +1,33 @@
+# Generated by Django 5.2.5 on 2026-10-19 13:40
+
+import uuid
+from django.db import migrations, models
+
+
+def gen_calendar_tokens(apps, schema_editor):
+    Employee = apps.get_model("core", "Employee")
+    employees = list(Employee.objects.only("id"))
+    for employee in employees:
+        employee.calendar_token = uuid.uuid4()
+    Employee.objects.bulk_update(employees, ["calendar_token"])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("core", "0023_workschedule_max_consecutive_work_days_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="employee",
+            name="calendar_token",
+            field=models.UUIDField(default=uuid.uuid4, editable=False, null=True),
+        ),
+        migrations.RunPython(gen_calendar_tokens, reverse_code=migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name="employee",
+            name="calendar_token",
+            field=models.UUIDField(default=uuid.uuid4, editable=False, unique=True),
+        ),
+    ]
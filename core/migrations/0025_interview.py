@@ -0,0 +1,31 @@
+# Generated by Django 5.2.5 on 2026-10-19 13:28
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0024_employee_calendar_token'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Interview',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start_datetime', models.DateTimeField(verbose_name='開始時間')),
+                ('end_datetime', models.DateTimeField(verbose_name='結束時間')),
+                ('location', models.CharField(blank=True, max_length=255, verbose_name='地點 / 會議連結')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('application', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='interviews', to='core.application', verbose_name='應徵記錄')),
+                ('interviewers', models.ManyToManyField(related_name='interviews', to='core.employee', verbose_name='面試官')),
+            ],
+            options={
+                'verbose_name': '面試',
+                'verbose_name_plural': '面試',
+                'ordering': ['start_datetime'],
+            },
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.5 on 2026-10-19 13:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0025_interview'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='attendancerecord',
+            index=models.Index(fields=['employee', 'clock_out'], name='attendance_open_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.5 on 2026-10-19 13:32
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0026_attendancerecord_open_idx'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='siteconfiguration',
+            name='allowed_ip_addresses',
+            field=models.TextField(blank=True, help_text='請輸入公司允許打卡的 IP 位址或 CIDR 網段，多個位址請用逗號分隔 (例如: 192.168.1.100, 203.0.113.0/24)。更細的分店/部門設定請使用「打卡網路策略」。', verbose_name='公司允許的 IP 位址'),
+        ),
+        migrations.CreateModel(
+            name='AttendanceNetworkPolicy',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(help_text='例如：總公司、九龍分店', max_length=100, verbose_name='名稱')),
+                ('networks', models.TextField(help_text='每行或以逗號分隔一個 IP 或 CIDR 網段，例如: 192.168.1.0/24, 203.0.113.5, 2001:db8::/32', verbose_name='允許的網段')),
+                ('is_active', models.BooleanField(default=True, verbose_name='啟用')),
+                ('department', models.ForeignKey(blank=True, help_text='留空代表適用全公司', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='network_policies', to='core.department', verbose_name='適用部門')),
+            ],
+            options={
+                'verbose_name': '打卡網路策略',
+                'verbose_name_plural': '打卡網路策略',
+            },
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.5 on 2026-10-19 13:34
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0028_attendancerecord_source_hash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyTimesheet',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='日期')),
+                ('day_type', models.CharField(choices=[('work', '上班日'), ('rest', '休息日'), ('leave', '休假'), ('holiday', '公眾假期')], max_length=10, verbose_name='日期類型')),
+                ('scheduled_start', models.DateTimeField(blank=True, null=True, verbose_name='排定上班時間')),
+                ('scheduled_end', models.DateTimeField(blank=True, null=True, verbose_name='排定下班時間')),
+                ('first_clock_in', models.DateTimeField(blank=True, null=True, verbose_name='首次上班打卡')),
+                ('last_clock_out', models.DateTimeField(blank=True, null=True, verbose_name='最後下班打卡')),
+                ('scheduled_minutes', models.PositiveIntegerField(default=0, verbose_name='排定工時 (分鐘)')),
+                ('worked_minutes', models.PositiveIntegerField(default=0, verbose_name='實際工時 (分鐘)')),
+                ('late_minutes', models.PositiveIntegerField(default=0, verbose_name='遲到 (分鐘)')),
+                ('early_leave_minutes', models.PositiveIntegerField(default=0, verbose_name='早退 (分鐘)')),
+                ('overtime_minutes', models.PositiveIntegerField(default=0, verbose_name='未申請加班 (分鐘)')),
+                ('is_absent', models.BooleanField(default=False, verbose_name='缺勤')),
+                ('is_stale', models.BooleanField(db_index=True, default=False, verbose_name='需要重新計算')),
+                ('computed_at', models.DateTimeField(auto_now=True, verbose_name='計算時間')),
+                ('employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timesheets', to='core.employee', verbose_name='員工')),
+            ],
+            options={
+                'verbose_name': '每日工時表',
+                'verbose_name_plural': '每日工時表',
+                'ordering': ['-date', 'employee'],
+                'unique_together': {('employee', 'date')},
+            },
+        ),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 5.2.5 on 2026-10-19 13:35
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0029_dailytimesheet'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedAttendanceRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('original_id', models.BigIntegerField(unique=True, verbose_name='原記錄 ID')),
+                ('clock_in', models.DateTimeField(verbose_name='上班打卡時間')),
+                ('clock_out', models.DateTimeField(blank=True, null=True, verbose_name='下班打卡時間')),
+                ('ip_address', models.GenericIPAddressField(blank=True, null=True, verbose_name='打卡 IP 位址')),
+                ('is_manual_entry', models.BooleanField(default=False, verbose_name='是否為手動補登')),
+                ('notes', models.CharField(blank=True, max_length=255, verbose_name='備註 (手動補登)')),
+                ('source_hash', models.CharField(blank=True, editable=False, max_length=64, null=True, unique=True, verbose_name='匯入來源雜湊')),
+                ('archived_at', models.DateTimeField(auto_now_add=True, verbose_name='封存時間')),
+            ],
+            options={
+                'verbose_name': '已封存出勤記錄',
+                'verbose_name_plural': '已封存出勤記錄',
+                'ordering': ['-clock_in'],
+            },
+        ),
+        migrations.CreateModel(
+            name='MonthlyAttendanceSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.IntegerField(verbose_name='年份')),
+                ('month', models.IntegerField(verbose_name='月份')),
+                ('scheduled_days', models.PositiveIntegerField(default=0, verbose_name='排班天數')),
+                ('present_days', models.PositiveIntegerField(default=0, verbose_name='出勤天數')),
+                ('absent_days', models.PositiveIntegerField(default=0, verbose_name='缺勤天數')),
+                ('leave_days', models.PositiveIntegerField(default=0, verbose_name='休假天數')),
+                ('late_days', models.PositiveIntegerField(default=0, verbose_name='遲到天數')),
+                ('scheduled_minutes', models.PositiveIntegerField(default=0, verbose_name='排定工時 (分鐘)')),
+                ('worked_minutes', models.PositiveIntegerField(default=0, verbose_name='實際工時 (分鐘)')),
+                ('late_minutes', models.PositiveIntegerField(default=0, verbose_name='遲到 (分鐘)')),
+                ('early_leave_minutes', models.PositiveIntegerField(default=0, verbose_name='早退 (分鐘)')),
+                ('overtime_minutes', models.PositiveIntegerField(default=0, verbose_name='未申請加班 (分鐘)')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新時間')),
+            ],
+            options={
+                'verbose_name': '每月出勤彙總',
+                'verbose_name_plural': '每月出勤彙總',
+                'ordering': ['-year', '-month'],
+            },
+        ),
+        migrations.AddIndex(
+            model_name='attendancerecord',
+            index=models.Index(fields=['employee', 'clock_in'], name='attendance_emp_clock_in_idx'),
+        ),
+        migrations.AddField(
+            model_name='archivedattendancerecord',
+            name='employee',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_attendance_records', to='core.employee', verbose_name='員工'),
+        ),
+        migrations.AddField(
+            model_name='monthlyattendancesummary',
+            name='employee',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='monthly_attendance', to='core.employee', verbose_name='員工'),
+        ),
+        migrations.AddIndex(
+            model_name='archivedattendancerecord',
+            index=models.Index(fields=['employee', 'clock_in'], name='archived_emp_clock_in_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='monthlyattendancesummary',
+            unique_together={('employee', 'year', 'month')},
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.5 on 2026-10-19 13:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0030_attendance_archive_and_monthly_summary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='attendancerecord',
+            name='is_auto_closed',
+            field=models.BooleanField(default=False, help_text='忘記打下班卡，系統依排定班次的下班時間自動補上', verbose_name='系統自動下班'),
+        ),
+        migrations.AddField(
+            model_name='attendancerecord',
+            name='needs_review',
+            field=models.BooleanField(default=False, help_text='忘記打下班卡且無法對應班次，需要主管補登', verbose_name='待主管確認'),
+        ),
+        migrations.AddIndex(
+            model_name='attendancerecord',
+            index=models.Index(fields=['clock_out', 'clock_in'], name='attendance_open_scan_idx'),
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.5 on 2026-10-19 13:39
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0031_attendance_reconcile'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='employee',
+            name='badge_id',
+            field=models.CharField(blank=True, max_length=50, null=True, unique=True, verbose_name='員工卡號'),
+        ),
+        migrations.AddField(
+            model_name='employee',
+            name='kiosk_pin_hash',
+            field=models.CharField(blank=True, editable=False, max_length=64, verbose_name='打卡 PIN (雜湊)'),
+        ),
+        migrations.CreateModel(
+            name='KioskDevice',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100, verbose_name='裝置名稱')),
+                ('token', models.UUIDField(default=uuid.uuid4, editable=False, unique=True)),
+                ('is_active', models.BooleanField(default=True, verbose_name='啟用')),
+                ('last_synced_at', models.DateTimeField(blank=True, null=True, verbose_name='最後同步時間')),
+                ('department', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='kiosk_devices', to='core.department', verbose_name='所在部門')),
+            ],
+            options={
+                'verbose_name': '打卡平板 (Kiosk)',
+                'verbose_name_plural': '打卡平板 (Kiosk)',
+            },
+        ),
+        migrations.CreateModel(
+            name='KioskPunch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('punch_id', models.CharField(max_length=64, unique=True, verbose_name='打卡 ID')),
+                ('timestamp', models.DateTimeField(verbose_name='打卡時間')),
+                ('direction', models.CharField(blank=True, choices=[('IN', '上班'), ('OUT', '下班')], max_length=3, verbose_name='方向')),
+                ('received_at', models.DateTimeField(auto_now_add=True, verbose_name='接收時間')),
+                ('device', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='punches', to='core.kioskdevice', verbose_name='裝置')),
+                ('employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='kiosk_punches', to='core.employee', verbose_name='員工')),
+            ],
+            options={
+                'verbose_name': 'Kiosk 打卡',
+                'verbose_name_plural': 'Kiosk 打卡',
+                'ordering': ['-timestamp'],
+            },
+        ),
+    ]
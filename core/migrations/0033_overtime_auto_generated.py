@@ -0,0 +1,22 @@
+# Generated by Django 5.2.5 on 2026-10-19 13:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0032_kiosk'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='overtimerequest',
+            name='is_auto_generated',
+            field=models.BooleanField(default=False, verbose_name='系統依工時表產生'),
+        ),
+        migrations.AddIndex(
+            model_name='overtimerequest',
+            index=models.Index(fields=['employee', 'date'], name='overtime_emp_date_idx'),
+        ),
+    ]
@@ -0,0 +1,38 @@
+# Generated by Django 5.2.5 on 2026-10-19 13:44
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0033_overtime_auto_generated'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AttendanceCorrection',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='出勤日期')),
+                ('action', models.CharField(choices=[('create', '新增'), ('update', '修改'), ('delete', '刪除')], max_length=10, verbose_name='動作')),
+                ('old_clock_in', models.DateTimeField(blank=True, null=True, verbose_name='原上班時間')),
+                ('old_clock_out', models.DateTimeField(blank=True, null=True, verbose_name='原下班時間')),
+                ('new_clock_in', models.DateTimeField(blank=True, null=True, verbose_name='新上班時間')),
+                ('new_clock_out', models.DateTimeField(blank=True, null=True, verbose_name='新下班時間')),
+                ('reason', models.CharField(blank=True, max_length=255, verbose_name='修正原因')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='修正時間')),
+                ('corrected_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='attendance_corrections', to=settings.AUTH_USER_MODEL, verbose_name='修正人')),
+                ('employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attendance_corrections', to='core.employee', verbose_name='員工')),
+                ('record', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='corrections', to='core.attendancerecord', verbose_name='出勤記錄')),
+            ],
+            options={
+                'verbose_name': '出勤修正記錄',
+                'verbose_name_plural': '出勤修正記錄',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,84 @@
+# Generated by Django 5.2.5 on 2026-10-19 13:46
+
+from datetime import date, timedelta
+from decimal import Decimal
+
+import django.db.models.deletion
+from dateutil.relativedelta import relativedelta
+from django.db import migrations, models
+
+
+def seed_credited_anniversaries(apps, schema_editor):
+    """
+    舊版 accrue_leave 只在到職週年日為年度策略的員工入帳 (以每天 8 小時換算)。
+    為每位員工寫入最近一次已入帳的週年日作為帳本起點，新引擎從之後的期間開始，不會重複入帳。
+    只寫帳本，不更動已入帳的餘額。
+    """
+    LeaveType = apps.get_model("core", "LeaveType")
+    Employee = apps.get_model("core", "Employee")
+    LeaveAccrual = apps.get_model("core", "LeaveAccrual")
+
+    leave_type = LeaveType.objects.filter(name__iexact="Annual Leave").first()
+    if leave_type is None:
+        return # 舊版指令在沒有年假假別時不會入帳
+    today = date.today()
+    accruals = []
+    employees = (
+        Employee.objects.filter(status="Active", leave_policy__accrual_frequency="YEARLY")
+        .select_related("leave_policy").prefetch_related("leave_policy__rules")
+    )
+    for emp in employees:
+        policy = emp.leave_policy
+        years = relativedelta(today, emp.hire_date).years
+        if years < 1:
+            continue
+        anniversary = emp.hire_date + relativedelta(years=years)
+        if policy.waiting_period_unit == "MONTHS":
+            waiting_end = emp.hire_date + relativedelta(months=policy.waiting_period_amount)
+        else:
+            waiting_end = emp.hire_date + relativedelta(days=policy.waiting_period_amount)
+        if anniversary < waiting_end:
+            continue
+        amount = policy.accrual_amount
+        rules = sorted((rule for rule in policy.rules.all() if rule.years_of_service <= years), key=lambda rule: rule.years_of_service)
+        if rules:
+            rule = rules[-1]
+            amount = rule.adjustment_amount if rule.rule_type == "SET" else amount + rule.adjustment_amount
+        hours = amount * 8 if policy.accrual_unit == "DAYS" else amount
+        accruals.append(LeaveAccrual(
+            employee=emp, policy=policy, leave_type=leave_type, period_start=anniversary,
+            period_end=emp.hire_date + relativedelta(years=years + 1) - timedelta(days=1),
+            amount=amount, hours=Decimal(hours).quantize(Decimal("0.01")),
+        ))
+    LeaveAccrual.objects.bulk_create(accruals, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0034_attendance_correction'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LeaveAccrual',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period_start', models.DateField(verbose_name='期間起始日')),
+                ('period_end', models.DateField(verbose_name='期間結束日')),
+                ('amount', models.DecimalField(decimal_places=2, max_digits=5, verbose_name='增加數量 (策略單位)')),
+                ('hours', models.DecimalField(decimal_places=2, max_digits=7, verbose_name='增加時數')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='入帳時間')),
+                ('employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='leave_accruals', to='core.employee', verbose_name='員工')),
+                ('leave_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.leavetype', verbose_name='假別')),
+                ('policy', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='accruals', to='core.leavepolicy', verbose_name='假期策略')),
+            ],
+            options={
+                'verbose_name': '假期累計記錄',
+                'verbose_name_plural': '假期累計記錄',
+                'ordering': ['-period_start'],
+                'constraints': [models.UniqueConstraint(fields=('employee', 'policy', 'period_start'), name='unique_leave_accrual_period')],
+            },
+        ),
+        migrations.RunPython(seed_credited_anniversaries, reverse_code=migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.5 on 2026-10-19 13:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0035_leave_accrual'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='employee',
+            name='next_accrual_date',
+            field=models.DateField(blank=True, db_index=True, editable=False, null=True, verbose_name='下次假期入帳日'),
+        ),
+        migrations.AddField(
+            model_name='employee',
+            name='next_anniversary_date',
+            field=models.DateField(blank=True, db_index=True, editable=False, null=True, verbose_name='下次到職週年日'),
+        ),
+        migrations.AddField(
+            model_name='employee',
+            name='waiting_period_end_date',
+            field=models.DateField(blank=True, db_index=True, editable=False, null=True, verbose_name='假期等待期結束日'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.5 on 2026-10-19 13:50
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0036_employee_next_due'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='YearEndSettlement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fiscal_year', models.PositiveIntegerField(help_text='假期年度開始的西元年', verbose_name='結算的假期年度')),
+                ('last_employee_id', models.PositiveIntegerField(default=0, verbose_name='最後處理的員工 ID')),
+                ('employees', models.PositiveIntegerField(default=0, verbose_name='處理人數')),
+                ('carried_over_hours', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='結轉時數')),
+                ('forfeited_hours', models.DecimalField(decimal_places=2, default=0, max_digits=12, verbose_name='作廢時數')),
+                ('started_at', models.DateTimeField(auto_now_add=True, verbose_name='開始時間')),
+                ('completed_at', models.DateTimeField(blank=True, null=True, verbose_name='完成時間')),
+                ('policy', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='year_end_settlements', to='core.leavepolicy', verbose_name='假期策略')),
+            ],
+            options={
+                'verbose_name': '年終結算',
+                'verbose_name_plural': '年終結算',
+                'ordering': ['-fiscal_year', 'policy'],
+                'constraints': [models.UniqueConstraint(fields=('policy', 'fiscal_year'), name='unique_year_end_settlement')],
+            },
+        ),
+    ]
@@ -0,0 +1,61 @@
+# Generated by Django 5.2.5 on 2026-10-19 13:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def import_legacy_compensations(apps, schema_editor):
+    """把以 "Holiday Compensation: {name} on {date}" 調整記錄表示的既有補償轉成 HolidayCompensation。"""
+    LeaveBalanceAdjustment = apps.get_model("core", "LeaveBalanceAdjustment")
+    PublicHoliday = apps.get_model("core", "PublicHoliday")
+    HolidayCompensation = apps.get_model("core", "HolidayCompensation")
+
+    holidays = {str(day): holiday_id for holiday_id, day in PublicHoliday.objects.values_list("id", "date")}
+    compensations = {}
+    legacy = LeaveBalanceAdjustment.objects.filter(reason__startswith="Holiday Compensation:")
+    for employee_id, leave_type_id, reason, hours in legacy.values_list("employee_id", "leave_type_id", "reason", "hours_changed"):
+        holiday_id = holidays.get(reason.rsplit(" on ", 1)[-1])
+        if holiday_id is not None:
+            compensations[(employee_id, holiday_id, leave_type_id)] = hours
+    HolidayCompensation.objects.bulk_create([
+        HolidayCompensation(employee_id=employee_id, holiday_id=holiday_id, leave_type_id=leave_type_id, hours=hours)
+        for (employee_id, holiday_id, leave_type_id), hours in compensations.items()
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0037_year_end_settlement'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='employee',
+            name='holiday_compensation_signature',
+            field=models.CharField(blank=True, editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='publicholiday',
+            name='compensated_at',
+            field=models.DateTimeField(blank=True, editable=False, null=True, verbose_name='補償處理時間'),
+        ),
+        migrations.CreateModel(
+            name='HolidayCompensation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hours', models.DecimalField(decimal_places=2, max_digits=5, verbose_name='補償時數')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='建立時間')),
+                ('employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='holiday_compensations', to='core.employee', verbose_name='員工')),
+                ('holiday', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='compensations', to='core.publicholiday', verbose_name='公眾假期')),
+                ('leave_type', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='core.leavetype', verbose_name='假別')),
+            ],
+            options={
+                'verbose_name': '假期補償',
+                'verbose_name_plural': '假期補償',
+                'ordering': ['-holiday__date'],
+                'constraints': [models.UniqueConstraint(fields=('employee', 'holiday', 'leave_type'), name='unique_holiday_compensation')],
+            },
+        ),
+        migrations.RunPython(import_legacy_compensations, reverse_code=migrations.RunPython.noop),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 5.2.5 on 2026-10-19 13:58
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0038_holiday_compensation'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='publicholiday',
+            options={'ordering': ['date', 'region']},
+        ),
+        migrations.AddField(
+            model_name='publicholiday',
+            name='region',
+            field=models.CharField(default='HK', help_text='ISO 國家代碼，可加上行政區，例如 HK、MY、MY-14', max_length=10, verbose_name='地區'),
+        ),
+        migrations.AlterField(
+            model_name='publicholiday',
+            name='date',
+            field=models.DateField(db_index=True, verbose_name='日期'),
+        ),
+        migrations.AddConstraint(
+            model_name='publicholiday',
+            constraint=models.UniqueConstraint(fields=('region', 'date'), name='unique_public_holiday_region_date'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.5 on 2026-10-19 13:59
+
+import django.core.validators
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0039_public_holiday_region'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='department',
+            name='holiday_region',
+            field=models.CharField(blank=True, help_text='部門員工適用的公眾假期地區，例如 HK、MY、MY-14；留空則使用預設地區', max_length=10, validators=[django.core.validators.RegexValidator('^[A-Z]{2}(-[A-Z0-9]{1,5})?$', '請輸入大寫的地區代碼，例如 HK、MY 或 MY-14。')], verbose_name='假期地區'),
+        ),
+        migrations.AddField(
+            model_name='employee',
+            name='holiday_region',
+            field=models.CharField(blank=True, help_text='留空則使用部門的假期地區', max_length=10, validators=[django.core.validators.RegexValidator('^[A-Z]{2}(-[A-Z0-9]{1,5})?$', '請輸入大寫的地區代碼，例如 HK、MY 或 MY-14。')], verbose_name='假期地區'),
+        ),
+        migrations.AlterField(
+            model_name='publicholiday',
+            name='region',
+            field=models.CharField(default='HK', help_text='ISO 國家代碼，可加上行政區，例如 HK、MY、MY-14', max_length=10, validators=[django.core.validators.RegexValidator('^[A-Z]{2}(-[A-Z0-9]{1,5})?$', '請輸入大寫的地區代碼，例如 HK、MY 或 MY-14。')], verbose_name='地區'),
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.2.5 on 2026-10-19 14:07
+
+from datetime import date
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def open_legacy_lots(apps, schema_editor):
+    """既有的補休餘額沒有取得日：每位員工的剩餘 (餘額 - 已核准的補休) 建立一個不會到期的期初批次。"""
+    LeaveBalance = apps.get_model("core", "LeaveBalance")
+    LeaveRequest = apps.get_model("core", "LeaveRequest")
+    CompensatoryLeaveLot = apps.get_model("core", "CompensatoryLeaveLot")
+
+    balances = LeaveBalance.objects.filter(leave_type__name="Compensatory")
+    used = dict(
+        LeaveRequest.objects.filter(leave_type__name="Compensatory", status="Approved")
+        .values("employee_id").annotate(total=models.Sum("duration_hours")).values_list("employee_id", "total")
+    )
+    today = date.today()
+    lots = []
+    for employee_id, balance_hours in balances.values_list("employee_id", "balance_hours"):
+        remaining = balance_hours - (used.get(employee_id) or 0)
+        if remaining > 0:
+            lots.append(CompensatoryLeaveLot(employee_id=employee_id, earned_on=today, hours=remaining, remaining_hours=remaining))
+    CompensatoryLeaveLot.objects.bulk_create(lots, batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0040_holiday_regions'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='leavepolicy',
+            name='comp_leave_expiry_months',
+            field=models.PositiveIntegerField(default=0, help_text='加班轉換的補休在取得後幾個月到期；0 表示不會到期。', verbose_name='補休有效期 (月)'),
+        ),
+        migrations.CreateModel(
+            name='CompensatoryLeaveLot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('earned_on', models.DateField(verbose_name='取得日期')),
+                ('expiry_date', models.DateField(blank=True, db_index=True, help_text='空白表示不會到期', null=True, verbose_name='到期日')),
+                ('hours', models.DecimalField(decimal_places=2, max_digits=7, verbose_name='取得時數')),
+                ('remaining_hours', models.DecimalField(decimal_places=2, max_digits=7, verbose_name='剩餘時數')),
+                ('expired_hours', models.DecimalField(decimal_places=2, default=0, max_digits=7, verbose_name='到期作廢時數')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='建立時間')),
+                ('employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='comp_leave_lots', to='core.employee', verbose_name='員工')),
+                ('overtime', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='comp_leave_lot', to='core.overtimerequest', verbose_name='加班申請')),
+            ],
+            options={
+                'verbose_name': '補休批次',
+                'verbose_name_plural': '補休批次',
+                'ordering': ['employee', 'earned_on', 'id'],
+                'indexes': [models.Index(fields=['employee', 'earned_on'], name='comp_lot_emp_earned_idx')],
+            },
+        ),
+        migrations.RunPython(open_legacy_lots, reverse_code=migrations.RunPython.noop),
+    ]
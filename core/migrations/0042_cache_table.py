@@ -0,0 +1,18 @@
+from django.core.management import call_command
+from django.db import migrations
+
+
+def create_cache_table(apps, schema_editor):
+    """建立 settings.CACHES 的資料庫快取資料表 (已存在或未使用資料庫快取時不做任何事)。"""
+    call_command('createcachetable', database=schema_editor.connection.alias, verbosity=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0041_comp_leave_lots'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_cache_table, reverse_code=migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.5 on 2026-10-19 14:26
+
+from django.db import migrations, models
+
+
+def unmark_duplicate_auto_requests(apps, schema_editor):
+    """同一員工同一天有多筆系統產生的申請時，只保留最早的一筆為系統產生，其餘改為一般申請 (不刪除)。"""
+    OvertimeRequest = apps.get_model("core", "OvertimeRequest")
+    seen = set()
+    duplicates = []
+    for pk, employee_id, day in (
+        OvertimeRequest.objects.filter(is_auto_generated=True).order_by("employee_id", "date", "id")
+        .values_list("id", "employee_id", "date")
+    ):
+        if (employee_id, day) in seen:
+            duplicates.append(pk)
+        seen.add((employee_id, day))
+    OvertimeRequest.objects.filter(id__in=duplicates).update(is_auto_generated=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0042_cache_table'),
+    ]
+
+    operations = [
+        migrations.RunPython(unmark_duplicate_auto_requests, reverse_code=migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='overtimerequest',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_auto_generated', True)), fields=('employee', 'date'), name='unique_auto_overtime_per_day'),
+        ),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 5.2.5 on 2026-10-19 14:27
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0043_auto_overtime_unique'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='employee',
+            name='next_anniversary_date',
+        ),
+        migrations.RemoveField(
+            model_name='employee',
+            name='waiting_period_end_date',
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.2.5 on 2026-10-19 14:30
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0044_drop_unused_accrual_dates'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PunchImport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('csv_file', models.FileField(upload_to='punch_imports/', verbose_name='CSV 檔')),
+                ('status', models.CharField(choices=[('Pending', '等待中'), ('Running', '匯入中'), ('Done', '完成'), ('Failed', '失敗')], db_index=True, default='Pending', max_length=10, verbose_name='狀態')),
+                ('stats', models.JSONField(blank=True, default=dict, verbose_name='統計')),
+                ('error', models.TextField(blank=True, verbose_name='錯誤訊息')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='上傳時間')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='開始時間')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='完成時間')),
+                ('uploaded_by', models.ForeignKey(null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='punch_imports', to=settings.AUTH_USER_MODEL, verbose_name='上傳者')),
+            ],
+            options={
+                'verbose_name': '打卡匯入',
+                'verbose_name_plural': '打卡匯入',
+                'ordering': ['-created_at'],
+            },
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.5 on 2026-10-19 14:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0045_punch_import_queue'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedattendancerecord',
+            name='is_auto_closed',
+            field=models.BooleanField(default=False, verbose_name='系統自動下班'),
+        ),
+        migrations.AddField(
+            model_name='archivedattendancerecord',
+            name='needs_review',
+            field=models.BooleanField(default=False, verbose_name='待主管確認'),
+        ),
+    ]
@@ -0,0 +1,45 @@
+# Generated by Django 5.2.5 on 2026-10-19 14:43
+
+from django.db import migrations, models
+
+
+def fill_auto_date(apps, schema_editor):
+    """
+    MySQL 沒有建立 0043 的部分唯一約束，期間可能又產生了重複的系統申請：
+    同一員工同一天只保留最早的一筆為系統產生 (其餘改為一般申請，不刪除)，再為系統申請填入 auto_date。
+    """
+    OvertimeRequest = apps.get_model("core", "OvertimeRequest")
+    seen = set()
+    duplicates = []
+    for pk, employee_id, day in (
+        OvertimeRequest.objects.filter(is_auto_generated=True).order_by("employee_id", "date", "id")
+        .values_list("id", "employee_id", "date")
+    ):
+        if (employee_id, day) in seen:
+            duplicates.append(pk)
+        seen.add((employee_id, day))
+    OvertimeRequest.objects.filter(id__in=duplicates).update(is_auto_generated=False)
+    OvertimeRequest.objects.filter(is_auto_generated=True).update(auto_date=models.F("date"))
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0046_archived_attendance_flags'),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name='overtimerequest',
+            name='unique_auto_overtime_per_day',
+        ),
+        migrations.AddField(
+            model_name='overtimerequest',
+            name='auto_date',
+            field=models.DateField(blank=True, editable=False, null=True, verbose_name='系統產生日期'),
+        ),
+        migrations.RunPython(fill_auto_date, reverse_code=migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='overtimerequest',
+            constraint=models.UniqueConstraint(fields=('employee', 'auto_date'), name='unique_auto_overtime_date'),
+        ),
+    ]
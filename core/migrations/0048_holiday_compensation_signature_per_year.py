@@ -0,0 +1,49 @@
+# Generated by Django 5.2.5 on 2026-10-19 14:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# 舊的單一摘要不知道是哪個年度算出來的：已處理過的年度先記為一個不會與任何摘要相同的值，
+# 下次執行各年度時會重新檢查尚未到來的假期，之後就依年度記錄
+MIGRATED_SIGNATURE = 'migrated'
+
+
+def split_signatures_by_year(apps, schema_editor):
+    Employee = apps.get_model("core", "Employee")
+    PublicHoliday = apps.get_model("core", "PublicHoliday")
+    HolidayCompensationSignature = apps.get_model("core", "HolidayCompensationSignature")
+    years = sorted({day.year for day in PublicHoliday.objects.filter(compensated_at__isnull=False).values_list("date", flat=True)})
+    employee_ids = list(Employee.objects.exclude(holiday_compensation_signature="").values_list("id", flat=True))
+    HolidayCompensationSignature.objects.bulk_create([
+        HolidayCompensationSignature(employee_id=employee_id, year=year, signature=MIGRATED_SIGNATURE)
+        for employee_id in employee_ids for year in years
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0047_overtime_auto_date'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='HolidayCompensationSignature',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('year', models.IntegerField(verbose_name='年度')),
+                ('signature', models.CharField(blank=True, max_length=100, verbose_name='班表摘要')),
+                ('employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='holiday_compensation_signatures', to='core.employee', verbose_name='員工')),
+            ],
+            options={
+                'verbose_name': '假期補償班表摘要',
+                'verbose_name_plural': '假期補償班表摘要',
+                'unique_together': {('employee', 'year')},
+            },
+        ),
+        migrations.RunPython(split_signatures_by_year, reverse_code=migrations.RunPython.noop),
+        migrations.RemoveField(
+            model_name='employee',
+            name='holiday_compensation_signature',
+        ),
+    ]
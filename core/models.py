@@ -12,6 +12,11 @@ from django.db import models
 from django.contrib.auth.models import User
 import holidays
 import uuid
+import ipaddress
+import hashlib
+import hmac
+from django.core.exceptions import ValidationError
+from django.core.validators import RegexValidator
 
 class Role(models.Model):
     name = models.CharField(max_length=100, unique=True, verbose_name='角色名稱')
@@ -25,10 +30,14 @@ class Role(models.Model):
         return self.name
 
 
+# 公眾假期地區代碼：ISO 國家代碼，可加上行政區，例如 "HK"、"MY"、"MY-14"
+holiday_region_validator = RegexValidator(r'^[A-Z]{2}(-[A-Z0-9]{1,5})?$', "請輸入大寫的地區代碼，例如 HK、MY 或 MY-14。")
+
 class Department(models.Model):
     name = models.CharField(max_length=255, unique=True, verbose_name="部門名稱")
     description = models.TextField(blank=True, null=True, verbose_name="部門描述")
     color = models.CharField(max_length=7, default="#888888", verbose_name="部門顏色", help_text="請輸入十六進位顏色碼，例如 #FF5733")
+    holiday_region = models.CharField(max_length=10, blank=True, validators=[holiday_region_validator], verbose_name="假期地區", help_text="部門員工適用的公眾假期地區，例如 HK、MY、MY-14；留空則使用預設地區")
 
     def __str__(self):
         return self.name
@@ -81,6 +90,8 @@ class LeavePolicy(models.Model):
     )
     # 結轉的單位與權責發生的單位 (accrual_unit) 保持一致
 
+    comp_leave_expiry_months = models.PositiveIntegerField(default=0, verbose_name="補休有效期 (月)", help_text="加班轉換的補休在取得後幾個月到期；0 表示不會到期。")
+
     waiting_period_amount = models.PositiveIntegerField(default=0, verbose_name="等待期數量")
     waiting_period_unit = models.CharField(max_length=10, choices=WAITING_PERIOD_UNIT_CHOICES, default='DAYS', verbose_name="等待期單位")
 
@@ -119,6 +130,11 @@ class PolicyRule(models.Model):
 class WorkSchedule(models.Model):
     name = models.CharField(max_length=255, unique=True, verbose_name="班表名稱")
     description = models.TextField(blank=True, verbose_name="描述")
+    max_consecutive_work_days = models.PositiveIntegerField(
+        default=6,
+        verbose_name="最多連續上班天數",
+        help_text="自動排班時，員工連續上班不會超過此天數。每週上班天數則不會超過此班表的規則數。"
+    )
 
     def __str__(self):
         return self.name
@@ -172,12 +188,39 @@ class Employee(models.Model):
     employment_type = models.CharField(max_length=20, choices=[('Full-time', '全職'), ('Part-time', '兼職'), ('Contract', '合約')], default='Full-time', verbose_name=("僱傭類型"))
     work_schedule = models.ForeignKey('WorkSchedule', on_delete=models.SET_NULL, null=True, blank=True)
     leave_policy = models.ForeignKey('LeavePolicy', on_delete=models.SET_NULL, null=True, blank=True)
+    holiday_region = models.CharField(max_length=10, blank=True, validators=[holiday_region_validator], verbose_name="假期地區", help_text="留空則使用部門的假期地區")
 
+    # 假期累計的下一個到期日 (由 core.accruals 維護)：排程只需處理 next_accrual_date <= 今天 的員工
+    next_accrual_date = models.DateField(null=True, blank=True, db_index=True, editable=False, verbose_name="下次假期入帳日")
+
+    # 用於行事曆訂閱連結 (iCalendar)，不需登入即可讀取，因此必須難以猜測
+    calendar_token = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)
+
+    # 打卡機 / 共用平板 (Kiosk) 識別用
+    badge_id = models.CharField(max_length=50, unique=True, null=True, blank=True, verbose_name="員工卡號")
+    kiosk_pin_hash = models.CharField(max_length=64, blank=True, editable=False, verbose_name="打卡 PIN (雜湊)")
 
-    
     def __str__(self):
         return f"{self.user.first_name} {self.user.last_name} ({self.employee_number})"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        # 保留從資料庫讀出的值，signals 不需再查詢一次就能判斷哪些欄位被修改
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = dict(zip(field_names, values))
+        return instance
+
+    def _kiosk_pin_digest(self, pin):
+        # PIN 只有幾位數，用加鹽的 HMAC 即可；Kiosk 批次同步時需要快速驗證數百筆打卡
+        key = settings.SECRET_KEY.encode()
+        return hmac.new(key, f"{self.employee_number}:{pin}".encode(), hashlib.sha256).hexdigest()
+
+    def set_kiosk_pin(self, pin):
+        self.kiosk_pin_hash = self._kiosk_pin_digest(pin) if pin else ''
+
+    def check_kiosk_pin(self, pin):
+        return bool(self.kiosk_pin_hash and pin) and hmac.compare_digest(self.kiosk_pin_hash, self._kiosk_pin_digest(pin))
+
     def get_current_salary(self):
         """
         獲取該員工最新的、已生效的薪資記錄。
@@ -268,14 +311,16 @@ class LeaveRequest(models.Model):
         """
         if not self.employee.work_schedule:
             time_difference = self.end_datetime - self.start_datetime
-            return round(time_difference.total_seconds() / 3600, 2)
+            # 與有班表時一樣回傳 Decimal，補休批次與餘額預測以 Decimal 計算
+            return round(Decimal(time_difference.total_seconds()) / 3600, 2)
 
         total_hours = Decimal(0)
         
+        from .holiday_calendars import employee_region, holidays_between # 避免循環匯入
+
         schedule_rules = {rule.day_of_week: rule for rule in self.employee.work_schedule.rules.all()}
-        public_holidays = set(PublicHoliday.objects.filter(
-            date__range=[self.start_datetime.date(), self.end_datetime.date()]
-        ).values_list('date', flat=True))
+        # 依員工 (或部門) 的假期地區，經由快取取得，不需要額外查詢
+        public_holidays = holidays_between(employee_region(self.employee), self.start_datetime.date(), self.end_datetime.date())
 
         current_day = self.start_datetime.date()
         while current_day <= self.end_datetime.date():
@@ -412,7 +457,7 @@ class SiteConfiguration(models.Model):
     allowed_ip_addresses = models.TextField(
         blank=True, 
         verbose_name="公司允許的 IP 位址",
-        help_text="請輸入公司允許打卡的 IP 位址，多個位址請用逗號分隔 (例如: 192.168.1.100, 203.0.113.5)"
+        help_text="請輸入公司允許打卡的 IP 位址或 CIDR 網段，多個位址請用逗號分隔 (例如: 192.168.1.100, 203.0.113.0/24)。更細的分店/部門設定請使用「打卡網路策略」。"
     )
 
     employer_file_number = models.CharField(max_length=50, blank=True, verbose_name="僱主檔案號碼 (Employer's File No.)")
@@ -435,6 +480,41 @@ class SiteConfiguration(models.Model):
         obj, created = cls.objects.get_or_create(pk=1)
         return obj
 
+class AttendanceNetworkPolicy(models.Model):
+    """
+    允許打卡的網段 (CIDR)。沒有指定部門的策略適用全公司；
+    員工只要符合全公司或自己部門任一策略即可打卡。
+    """
+    name = models.CharField(max_length=100, verbose_name="名稱", help_text="例如：總公司、九龍分店")
+    department = models.ForeignKey(
+        Department, on_delete=models.CASCADE, null=True, blank=True,
+        related_name='network_policies', verbose_name="適用部門",
+        help_text="留空代表適用全公司"
+    )
+    networks = models.TextField(
+        verbose_name="允許的網段",
+        help_text="每行或以逗號分隔一個 IP 或 CIDR 網段，例如: 192.168.1.0/24, 203.0.113.5, 2001:db8::/32"
+    )
+    is_active = models.BooleanField(default=True, verbose_name="啟用")
+
+    class Meta:
+        verbose_name = "打卡網路策略"
+        verbose_name_plural = "打卡網路策略"
+
+    def __str__(self):
+        return self.name
+
+    def network_list(self):
+        """回傳解析後的 ipaddress 網段；格式錯誤時拋出 ValueError。"""
+        entries = self.networks.replace(',', '\n').split()
+        return [ipaddress.ip_network(entry, strict=False) for entry in entries]
+
+    def clean(self):
+        try:
+            self.network_list()
+        except ValueError as e:
+            raise ValidationError({'networks': f"網段格式錯誤：{e}"})
+
 # core/models.py
 
 class DutyShift(models.Model):
@@ -449,6 +529,22 @@ class DutyShift(models.Model):
     def __str__(self):
         return f"{self.employee} on {self.date}: {self.start_time}-{self.end_time}"
 
+class StaffingRequirement(models.Model):
+    department = models.ForeignKey(Department, on_delete=models.CASCADE, related_name='staffing_requirements', verbose_name="部門")
+    day_of_week = models.IntegerField(choices=ScheduleRule.WEEKDAY_CHOICES, verbose_name="星期幾")
+    start_time = models.TimeField(verbose_name="上班時間")
+    end_time = models.TimeField(verbose_name="下班時間")
+    required_headcount = models.PositiveIntegerField(default=1, verbose_name="最低在班人數")
+
+    class Meta:
+        unique_together = ('department', 'day_of_week') # 每個部門每個星期幾只有一筆需求
+        ordering = ['department', 'day_of_week']
+        verbose_name = "人力需求"
+        verbose_name_plural = "人力需求"
+
+    def __str__(self):
+        return f"{self.department.name}: {self.get_day_of_week_display()} 需 {self.required_headcount} 人 ({self.start_time}-{self.end_time})"
+
 # core/models.py
 class OvertimeRequest(models.Model):
     STATUS_CHOICES = (('Pending', '待審核'), ('Approved', '已批准'), ('Rejected', '已拒絕'))
@@ -458,20 +554,46 @@ class OvertimeRequest(models.Model):
     hours = models.DecimalField(max_digits=4, decimal_places=2, verbose_name="加班時數")
     reason = models.TextField(verbose_name="加班事由")
     status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='Pending')
+    is_auto_generated = models.BooleanField(default=False, verbose_name="系統依工時表產生")
+    # 系統產生的申請為 date，其他為 NULL；MySQL 不支援部分唯一索引，以 (employee, auto_date) 唯一鍵
+    # 保證每位員工每天只有一筆系統產生的申請 (NULL 不會互相衝突)
+    auto_date = models.DateField(null=True, blank=True, editable=False, verbose_name="系統產生日期")
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # 批次產生時一次查出哪些員工日期已經有申請
+            models.Index(fields=['employee', 'date'], name='overtime_emp_date_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['employee', 'auto_date'], name='unique_auto_overtime_date'),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.auto_date = self.date if self.is_auto_generated else None
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"{self.employee} - {self.date} ({self.hours} hours)"
 
 class PublicHoliday(models.Model):
+    # 員工與部門都沒有設定假期地區時使用
+    DEFAULT_REGION = 'HK'
+
+    region = models.CharField(max_length=10, default=DEFAULT_REGION, validators=[holiday_region_validator], verbose_name="地區", help_text="ISO 國家代碼，可加上行政區，例如 HK、MY、MY-14")
     name = models.CharField(max_length=255, verbose_name="假期名稱")
-    date = models.DateField(unique=True, verbose_name="日期")
+    date = models.DateField(db_index=True, verbose_name="日期")
+    # 假期補償已處理的時間 (由 core.holiday_compensation 維護)；新增或改日期的假期為空，下次執行時處理
+    compensated_at = models.DateTimeField(null=True, blank=True, editable=False, verbose_name="補償處理時間")
 
     class Meta:
-        ordering = ['date']
+        ordering = ['date', 'region']
+        constraints = [
+            models.UniqueConstraint(fields=['region', 'date'], name='unique_public_holiday_region_date'),
+        ]
 
     def __str__(self):
-        return f"{self.date}: {self.name}"
+        return f"{self.date}: {self.name} ({self.region})"
 
 # core/models.py
 
@@ -558,6 +680,22 @@ class Application(models.Model):
     def __str__(self):
         return f"{self.candidate} for {self.job}"
 
+class Interview(models.Model):
+    application = models.ForeignKey(Application, on_delete=models.CASCADE, related_name='interviews', verbose_name="應徵記錄")
+    interviewers = models.ManyToManyField(Employee, related_name='interviews', verbose_name="面試官")
+    start_datetime = models.DateTimeField(verbose_name="開始時間")
+    end_datetime = models.DateTimeField(verbose_name="結束時間")
+    location = models.CharField(max_length=255, blank=True, verbose_name="地點 / 會議連結")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        ordering = ['start_datetime']
+        verbose_name = "面試"
+        verbose_name_plural = "面試"
+
+    def __str__(self):
+        return f"{self.application.candidate} 面試 ({self.start_datetime:%Y-%m-%d %H:%M})"
+
 class AttendanceRecord(models.Model):
     employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='attendance_records', verbose_name="員工")
     clock_in = models.DateTimeField(verbose_name="上班打卡時間")
@@ -565,13 +703,199 @@ class AttendanceRecord(models.Model):
     ip_address = models.GenericIPAddressField(null=True, blank=True, verbose_name="打卡 IP 位址")
     is_manual_entry = models.BooleanField(default=False, verbose_name="是否為手動補登")
     notes = models.CharField(max_length=255, blank=True, verbose_name="備註 (手動補登)")
+    source_hash = models.CharField(max_length=64, unique=True, null=True, blank=True, editable=False, verbose_name="匯入來源雜湊")
+    is_auto_closed = models.BooleanField(default=False, verbose_name="系統自動下班", help_text="忘記打下班卡，系統依排定班次的下班時間自動補上")
+    needs_review = models.BooleanField(default=False, verbose_name="待主管確認", help_text="忘記打下班卡且無法對應班次，需要主管補登")
+
+    class Meta:
+        ordering = ['-clock_in']
+        indexes = [
+            # 打卡時查詢「尚未下班」的記錄 (clock_out IS NULL)；MySQL 不支援部分索引，因此使用複合索引
+            models.Index(fields=['employee', 'clock_out'], name='attendance_open_idx'),
+            models.Index(fields=['employee', 'clock_in'], name='attendance_emp_clock_in_idx'),
+            # 每晚全公司掃描「上班時間早於某時刻仍未下班」的記錄
+            models.Index(fields=['clock_out', 'clock_in'], name='attendance_open_scan_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.employee} on {self.clock_in.date()}"
+
+class AttendanceCorrection(models.Model):
+    """主管在出勤修正表格中的每一筆變更 (新增 / 修改 / 刪除打卡記錄) 的稽核記錄。"""
+    ACTION_CHOICES = (
+        ('create', '新增'),
+        ('update', '修改'),
+        ('delete', '刪除'),
+    )
+    employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='attendance_corrections', verbose_name="員工")
+    record = models.ForeignKey(AttendanceRecord, on_delete=models.SET_NULL, null=True, blank=True, related_name='corrections', verbose_name="出勤記錄")
+    date = models.DateField(verbose_name="出勤日期")
+    action = models.CharField(max_length=10, choices=ACTION_CHOICES, verbose_name="動作")
+    old_clock_in = models.DateTimeField(null=True, blank=True, verbose_name="原上班時間")
+    old_clock_out = models.DateTimeField(null=True, blank=True, verbose_name="原下班時間")
+    new_clock_in = models.DateTimeField(null=True, blank=True, verbose_name="新上班時間")
+    new_clock_out = models.DateTimeField(null=True, blank=True, verbose_name="新下班時間")
+    reason = models.CharField(max_length=255, blank=True, verbose_name="修正原因")
+    corrected_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='attendance_corrections', verbose_name="修正人")
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name="修正時間")
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = "出勤修正記錄"
+        verbose_name_plural = "出勤修正記錄"
+
+    def __str__(self):
+        return f"{self.employee} {self.date} ({self.get_action_display()})"
+
+class PunchImport(models.Model):
+    """後台上傳的打卡機 CSV。上傳後只排入佇列，由 process_punch_imports 排程在背景匯入並記錄結果。"""
+    STATUS_CHOICES = (
+        ('Pending', '等待中'),
+        ('Running', '匯入中'),
+        ('Done', '完成'),
+        ('Failed', '失敗'),
+    )
+    csv_file = models.FileField(upload_to='punch_imports/', verbose_name="CSV 檔")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='Pending', db_index=True, verbose_name="狀態")
+    # import_punches 的統計 (匯入中會依批次更新)
+    stats = models.JSONField(default=dict, blank=True, verbose_name="統計")
+    error = models.TextField(blank=True, verbose_name="錯誤訊息")
+    uploaded_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, related_name='punch_imports', verbose_name="上傳者")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="上傳時間")
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name="開始時間")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="完成時間")
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = "打卡匯入"
+        verbose_name_plural = "打卡匯入"
+
+    def __str__(self):
+        return f"{self.csv_file.name} ({self.get_status_display()})"
+
+class KioskDevice(models.Model):
+    """倉庫等地點的共用打卡平板。token 會放在 Kiosk 網址中，作為裝置的憑證。"""
+    name = models.CharField(max_length=100, verbose_name="裝置名稱")
+    department = models.ForeignKey(Department, on_delete=models.SET_NULL, null=True, blank=True, related_name='kiosk_devices', verbose_name="所在部門")
+    token = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)
+    is_active = models.BooleanField(default=True, verbose_name="啟用")
+    last_synced_at = models.DateTimeField(null=True, blank=True, verbose_name="最後同步時間")
+
+    class Meta:
+        verbose_name = "打卡平板 (Kiosk)"
+        verbose_name_plural = "打卡平板 (Kiosk)"
+
+    def __str__(self):
+        return self.name
+
+class KioskPunch(models.Model):
+    """Kiosk 上傳的每一筆原始打卡；punch_id 由裝置產生，重複上傳同一筆不會重複記錄。"""
+    punch_id = models.CharField(max_length=64, unique=True, verbose_name="打卡 ID")
+    device = models.ForeignKey(KioskDevice, on_delete=models.CASCADE, related_name='punches', verbose_name="裝置")
+    employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='kiosk_punches', verbose_name="員工")
+    timestamp = models.DateTimeField(verbose_name="打卡時間")
+    direction = models.CharField(max_length=3, blank=True, choices=(('IN', '上班'), ('OUT', '下班')), verbose_name="方向")
+    received_at = models.DateTimeField(auto_now_add=True, verbose_name="接收時間")
+
+    class Meta:
+        ordering = ['-timestamp']
+        verbose_name = "Kiosk 打卡"
+        verbose_name_plural = "Kiosk 打卡"
+
+    def __str__(self):
+        return f"{self.employee} @ {self.timestamp}"
+
+class ArchivedAttendanceRecord(models.Model):
+    """
+    已封存的出勤記錄：超過保留月數的 AttendanceRecord 會搬到這裡，
+    讓打卡等熱門查詢只需掃描近幾個月的資料。歷史報表改讀 MonthlyAttendanceSummary。
+    """
+    original_id = models.BigIntegerField(unique=True, verbose_name="原記錄 ID")
+    employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='archived_attendance_records', verbose_name="員工")
+    clock_in = models.DateTimeField(verbose_name="上班打卡時間")
+    clock_out = models.DateTimeField(null=True, blank=True, verbose_name="下班打卡時間")
+    ip_address = models.GenericIPAddressField(null=True, blank=True, verbose_name="打卡 IP 位址")
+    is_manual_entry = models.BooleanField(default=False, verbose_name="是否為手動補登")
+    notes = models.CharField(max_length=255, blank=True, verbose_name="備註 (手動補登)")
+    source_hash = models.CharField(max_length=64, unique=True, null=True, blank=True, editable=False, verbose_name="匯入來源雜湊")
+    is_auto_closed = models.BooleanField(default=False, verbose_name="系統自動下班")
+    needs_review = models.BooleanField(default=False, verbose_name="待主管確認")
+    archived_at = models.DateTimeField(auto_now_add=True, verbose_name="封存時間")
 
     class Meta:
         ordering = ['-clock_in']
+        indexes = [
+            models.Index(fields=['employee', 'clock_in'], name='archived_emp_clock_in_idx'),
+        ]
+        verbose_name = "已封存出勤記錄"
+        verbose_name_plural = "已封存出勤記錄"
 
     def __str__(self):
         return f"{self.employee} on {self.clock_in.date()}"
 
+class MonthlyAttendanceSummary(models.Model):
+    """每位員工每月的出勤彙總，由每日工時表 (DailyTimesheet) 彙總而來，供歷史與報表頁面讀取。"""
+    employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='monthly_attendance', verbose_name="員工")
+    year = models.IntegerField(verbose_name="年份")
+    month = models.IntegerField(verbose_name="月份")
+    scheduled_days = models.PositiveIntegerField(default=0, verbose_name="排班天數")
+    present_days = models.PositiveIntegerField(default=0, verbose_name="出勤天數")
+    absent_days = models.PositiveIntegerField(default=0, verbose_name="缺勤天數")
+    leave_days = models.PositiveIntegerField(default=0, verbose_name="休假天數")
+    late_days = models.PositiveIntegerField(default=0, verbose_name="遲到天數")
+    scheduled_minutes = models.PositiveIntegerField(default=0, verbose_name="排定工時 (分鐘)")
+    worked_minutes = models.PositiveIntegerField(default=0, verbose_name="實際工時 (分鐘)")
+    late_minutes = models.PositiveIntegerField(default=0, verbose_name="遲到 (分鐘)")
+    early_leave_minutes = models.PositiveIntegerField(default=0, verbose_name="早退 (分鐘)")
+    overtime_minutes = models.PositiveIntegerField(default=0, verbose_name="未申請加班 (分鐘)")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="更新時間")
+
+    class Meta:
+        unique_together = ('employee', 'year', 'month')
+        ordering = ['-year', '-month']
+        verbose_name = "每月出勤彙總"
+        verbose_name_plural = "每月出勤彙總"
+
+    def __str__(self):
+        return f"{self.employee} - {self.year}/{self.month}"
+
+    @property
+    def worked_hours(self):
+        return round(self.worked_minutes / 60, 1)
+
+class DailyTimesheet(models.Model):
+    """每位員工每天的工時計算結果：比對實際打卡與排定班次，由 core.timesheets 批次產生。"""
+    DAY_TYPE_CHOICES = (
+        ('work', '上班日'),
+        ('rest', '休息日'),
+        ('leave', '休假'),
+        ('holiday', '公眾假期'),
+    )
+    employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='timesheets', verbose_name="員工")
+    date = models.DateField(verbose_name="日期")
+    day_type = models.CharField(max_length=10, choices=DAY_TYPE_CHOICES, verbose_name="日期類型")
+    scheduled_start = models.DateTimeField(null=True, blank=True, verbose_name="排定上班時間")
+    scheduled_end = models.DateTimeField(null=True, blank=True, verbose_name="排定下班時間")
+    first_clock_in = models.DateTimeField(null=True, blank=True, verbose_name="首次上班打卡")
+    last_clock_out = models.DateTimeField(null=True, blank=True, verbose_name="最後下班打卡")
+    scheduled_minutes = models.PositiveIntegerField(default=0, verbose_name="排定工時 (分鐘)")
+    worked_minutes = models.PositiveIntegerField(default=0, verbose_name="實際工時 (分鐘)")
+    late_minutes = models.PositiveIntegerField(default=0, verbose_name="遲到 (分鐘)")
+    early_leave_minutes = models.PositiveIntegerField(default=0, verbose_name="早退 (分鐘)")
+    overtime_minutes = models.PositiveIntegerField(default=0, verbose_name="未申請加班 (分鐘)")
+    is_absent = models.BooleanField(default=False, verbose_name="缺勤")
+    is_stale = models.BooleanField(default=False, db_index=True, verbose_name="需要重新計算")
+    computed_at = models.DateTimeField(auto_now=True, verbose_name="計算時間")
+
+    class Meta:
+        unique_together = ('employee', 'date')
+        ordering = ['-date', 'employee']
+        verbose_name = "每日工時表"
+        verbose_name_plural = "每日工時表"
+
+    def __str__(self):
+        return f"{self.employee} - {self.date}"
+
 class PayrollRun(models.Model):
     STATUS_CHOICES = (
         ('Draft', '草稿'),
@@ -664,6 +988,121 @@ class LeaveBalance(models.Model):
     def __str__(self):
         return f"{self.employee.user.username} - {self.leave_type.name}: {self.balance_hours} hours"
 
+class LeaveAccrual(models.Model):
+    """
+    每一期假期增加的記錄 (假期帳本)。以 (員工, 假期策略, 期間起始日) 為唯一鍵，
+    重新執行累計或補跑停機期間時不會重複入帳。
+    """
+    employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='leave_accruals', verbose_name="員工")
+    policy = models.ForeignKey(LeavePolicy, on_delete=models.CASCADE, related_name='accruals', verbose_name="假期策略")
+    leave_type = models.ForeignKey(LeaveType, on_delete=models.CASCADE, verbose_name="假別")
+    period_start = models.DateField(verbose_name="期間起始日")
+    period_end = models.DateField(verbose_name="期間結束日")
+    amount = models.DecimalField(max_digits=5, decimal_places=2, verbose_name="增加數量 (策略單位)")
+    hours = models.DecimalField(max_digits=7, decimal_places=2, verbose_name="增加時數")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="入帳時間")
+
+    class Meta:
+        ordering = ['-period_start']
+        constraints = [
+            models.UniqueConstraint(fields=['employee', 'policy', 'period_start'], name='unique_leave_accrual_period'),
+        ]
+        verbose_name = "假期累計記錄"
+        verbose_name_plural = "假期累計記錄"
+
+    def __str__(self):
+        return f"{self.employee} {self.period_start}~{self.period_end}: +{self.hours} 小時"
+
+class YearEndSettlement(models.Model):
+    """
+    每個假期策略每個假期年度的年終結算 (結轉 / 作廢) 只執行一次。
+    分批處理時記錄最後處理的員工 ID，中斷後重新執行會從下一位員工繼續。
+    """
+    policy = models.ForeignKey(LeavePolicy, on_delete=models.CASCADE, related_name='year_end_settlements', verbose_name="假期策略")
+    fiscal_year = models.PositiveIntegerField(verbose_name="結算的假期年度", help_text="假期年度開始的西元年")
+    last_employee_id = models.PositiveIntegerField(default=0, verbose_name="最後處理的員工 ID")
+    employees = models.PositiveIntegerField(default=0, verbose_name="處理人數")
+    carried_over_hours = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name="結轉時數")
+    forfeited_hours = models.DecimalField(max_digits=12, decimal_places=2, default=0, verbose_name="作廢時數")
+    started_at = models.DateTimeField(auto_now_add=True, verbose_name="開始時間")
+    completed_at = models.DateTimeField(null=True, blank=True, verbose_name="完成時間")
+
+    class Meta:
+        ordering = ['-fiscal_year', 'policy']
+        constraints = [
+            models.UniqueConstraint(fields=['policy', 'fiscal_year'], name='unique_year_end_settlement'),
+        ]
+        verbose_name = "年終結算"
+        verbose_name_plural = "年終結算"
+
+    def __str__(self):
+        return f"{self.policy} {self.fiscal_year} 年度結算"
+
+class HolidayCompensation(models.Model):
+    """
+    公眾假期落在員工休息日時補償的假期時數。以 (員工, 假期, 假別) 為唯一鍵，
+    重新執行補償不會重複入帳；餘額的變動另記錄於 LeaveBalanceAdjustment。
+    """
+    employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='holiday_compensations', verbose_name="員工")
+    holiday = models.ForeignKey(PublicHoliday, on_delete=models.CASCADE, related_name='compensations', verbose_name="公眾假期")
+    leave_type = models.ForeignKey(LeaveType, on_delete=models.CASCADE, verbose_name="假別")
+    hours = models.DecimalField(max_digits=5, decimal_places=2, verbose_name="補償時數")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="建立時間")
+
+    class Meta:
+        ordering = ['-holiday__date']
+        constraints = [
+            models.UniqueConstraint(fields=['employee', 'holiday', 'leave_type'], name='unique_holiday_compensation'),
+        ]
+        verbose_name = "假期補償"
+        verbose_name_plural = "假期補償"
+
+    def __str__(self):
+        return f"{self.employee} {self.holiday}: +{self.hours} 小時"
+
+class HolidayCompensationSignature(models.Model):
+    """
+    每位員工每個年度上次計算假期補償時的班表 / 資格摘要 (由 core.holiday_compensation 維護)。
+    補償以年度為單位執行，因此摘要也依年度記錄：某個年度的摘要不同時，代表該年度需要重新計算。
+    """
+    employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='holiday_compensation_signatures', verbose_name="員工")
+    year = models.IntegerField(verbose_name="年度")
+    signature = models.CharField(max_length=100, blank=True, verbose_name="班表摘要")
+
+    class Meta:
+        unique_together = ('employee', 'year')
+        verbose_name = "假期補償班表摘要"
+        verbose_name_plural = "假期補償班表摘要"
+
+    def __str__(self):
+        return f"{self.employee} {self.year}"
+
+class CompensatoryLeaveLot(models.Model):
+    """
+    一筆加班換得的補休時數 (批次)。休假依取得日由舊到新扣減 remaining_hours，
+    到期排程以 expiry_date 的索引只處理已到期且仍有剩餘的批次；餘額總數仍維護在 LeaveBalance。
+    """
+    employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='comp_leave_lots', verbose_name="員工")
+    overtime = models.OneToOneField(OvertimeRequest, on_delete=models.SET_NULL, null=True, blank=True, related_name='comp_leave_lot', verbose_name="加班申請")
+    earned_on = models.DateField(verbose_name="取得日期")
+    expiry_date = models.DateField(null=True, blank=True, db_index=True, verbose_name="到期日", help_text="空白表示不會到期")
+    hours = models.DecimalField(max_digits=7, decimal_places=2, verbose_name="取得時數")
+    remaining_hours = models.DecimalField(max_digits=7, decimal_places=2, verbose_name="剩餘時數")
+    expired_hours = models.DecimalField(max_digits=7, decimal_places=2, default=0, verbose_name="到期作廢時數")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="建立時間")
+
+    class Meta:
+        ordering = ['employee', 'earned_on', 'id']
+        indexes = [
+            # 依取得日由舊到新扣減
+            models.Index(fields=['employee', 'earned_on'], name='comp_lot_emp_earned_idx'),
+        ]
+        verbose_name = "補休批次"
+        verbose_name_plural = "補休批次"
+
+    def __str__(self):
+        return f"{self.employee} {self.earned_on}: {self.remaining_hours}/{self.hours} 小時"
+
 class EmailTemplate(models.Model):
     name = models.CharField(max_length=100, verbose_name="樣板名稱")
     subject = models.CharField(max_length=255, verbose_name="郵件主旨")
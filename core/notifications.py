@@ -0,0 +1,38 @@
+# core/notifications.py
+"""
+系統通知郵件：使用系統組態 (SiteConfiguration) 中的 SMTP 設定，
+批次通知時共用同一個連線，而不是每封信重新連線一次。
+"""
+from django.core.mail import EmailMessage, get_connection
+
+from .models import SiteConfiguration
+
+
+def site_mail_connection():
+    """回傳 (連線, 寄件人)；系統尚未設定寄件帳號時回傳 (None, None)。"""
+    config = SiteConfiguration.load()
+    if not (config.email_host_user and config.email_host_password):
+        return None, None
+    connection = get_connection(
+        host=config.email_host, port=config.email_port,
+        username=config.email_host_user, password=config.email_host_password,
+        use_tls=config.email_use_tls
+    )
+    return connection, config.email_host_user
+
+
+def send_batch(messages):
+    """
+    以單一 SMTP 連線寄出多封郵件。messages 為 (主旨, 內容, 收件人 email) 的清單。
+    回傳實際寄出的數量；未設定郵件時回傳 0。
+    """
+    messages = [(subject, body, to) for subject, body, to in messages if to]
+    if not messages:
+        return 0
+    connection, from_email = site_mail_connection()
+    if connection is None:
+        return 0
+    return connection.send_messages([
+        EmailMessage(subject, body, from_email, [to], connection=connection)
+        for subject, body, to in messages
+    ])
@@ -0,0 +1,161 @@
+# core/overtime.py
+"""
+依每日工時表批次產生加班申請，以及批准加班 (轉為補休) 的共用邏輯。
+
+工時表 (DailyTimesheet) 已經把實際打卡與排定班次 (班表規則 / 手動排班) 對齊，
+因此只需一次查詢就能找出整個期間所有超出班次的工時，排除已經有申請的員工日期，
+再以 bulk_create 建立待審核的申請；最後依主管分組，每位主管收到一份審核清單。
+"""
+from collections import defaultdict
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Exists, OuterRef
+from django.template.loader import render_to_string
+
+from .comp_leave import COMPENSATORY_LEAVE_TYPE, create_lots
+from .models import DailyTimesheet, Employee, LeaveBalance, LeaveType, OvertimeRequest
+from .notifications import send_batch
+from .timesheets import recompute_stale_timesheets
+
+# 少於這個分鐘數的超時 (例如晚幾分鐘打下班卡) 不產生申請
+OVERTIME_MIN_MINUTES = 30
+# 加班時數以此單位無條件捨去
+OVERTIME_ROUNDING_MINUTES = 30
+# OvertimeRequest.hours 為 max_digits=4
+OVERTIME_MAX_HOURS = Decimal('99.99')
+
+OVERTIME_BATCH_SIZE = 1000
+
+DAY_TYPE_LABELS = dict(DailyTimesheet.DAY_TYPE_CHOICES)
+
+
+def _overtime_hours(minutes):
+    rounded = minutes // OVERTIME_ROUNDING_MINUTES * OVERTIME_ROUNDING_MINUTES
+    return min(Decimal(rounded) / Decimal(60), OVERTIME_MAX_HOURS).quantize(Decimal('0.01'))
+
+
+def find_unclaimed_overtime(start, end, min_minutes=OVERTIME_MIN_MINUTES):
+    """回傳 start 到 end 之間超時達 min_minutes、且該員工當天還沒有任何加班申請的工時表資料。"""
+    existing = OvertimeRequest.objects.filter(employee_id=OuterRef('employee_id'), date=OuterRef('date'))
+    return list(
+        DailyTimesheet.objects.filter(
+            date__range=[start, end],
+            overtime_minutes__gte=max(min_minutes, OVERTIME_ROUNDING_MINUTES),
+            employee__status='Active',
+        )
+        .exclude(Exists(existing))
+        .values('employee_id', 'date', 'day_type', 'scheduled_minutes', 'worked_minutes', 'overtime_minutes')
+        .order_by('employee_id', 'date')
+    )
+
+
+def _notify_managers(created):
+    """依主管分組，每位主管一封審核清單。"""
+    by_manager = defaultdict(list)
+    for overtime in created:
+        if overtime.employee.manager_id:
+            by_manager[overtime.employee.manager_id].append(overtime)
+    if not by_manager:
+        return 0
+
+    managers = Employee.objects.filter(id__in=by_manager).select_related('user')
+    messages = []
+    for manager in managers:
+        items = sorted(by_manager[manager.id], key=lambda ot: (ot.employee.user.get_full_name() or ot.employee.user.username, ot.date))
+        body = render_to_string('core/emails/notify_manager_overtime_batch.txt', {
+            'manager_name': manager.user.get_full_name(),
+            'items': items,
+            'total_hours': sum(ot.hours for ot in items),
+        })
+        messages.append((f"[加班審核] {len(items)} 筆依打卡記錄產生的加班申請待審核", body, manager.user.email))
+    return send_batch(messages)
+
+
+def generate_overtime_requests(start, end, min_minutes=OVERTIME_MIN_MINUTES, notify=True, dry_run=False):
+    """
+    為 start 到 end (含) 之間的超時工作建立待審核的加班申請，每位員工每天最多一筆。
+    回傳 {'created', 'hours', 'notified'}。
+    """
+    # 先把被補登或修正打卡影響的工時表重算，避免依過時的數字產生申請
+    if not dry_run:
+        recompute_stale_timesheets()
+
+    rows = find_unclaimed_overtime(start, end, min_minutes)
+    requests = [
+        OvertimeRequest(
+            employee_id=row['employee_id'],
+            date=row['date'],
+            hours=_overtime_hours(row['overtime_minutes']),
+            reason=(
+                f"系統依打卡記錄產生：{DAY_TYPE_LABELS.get(row['day_type'], row['day_type'])}"
+                f"實際工作 {row['worked_minutes']} 分鐘，排定 {row['scheduled_minutes']} 分鐘。"
+            ),
+            status='Pending',
+            is_auto_generated=True,
+            auto_date=row['date'],
+        )
+        for row in rows
+    ]
+    if requests and not dry_run:
+        with transaction.atomic():
+            # 鎖定相關員工後重新檢查：同時執行的批次會在此排隊，已由另一個批次建立的員工日期不再建立，
+            # 因此 created 與通知只包含實際寫入的申請 ((employee, auto_date) 唯一鍵為最後防線)
+            employee_ids = sorted({ot.employee_id for ot in requests})
+            list(Employee.objects.select_for_update().filter(id__in=employee_ids).order_by('id').values_list('id', flat=True))
+            claimed = set(
+                OvertimeRequest.objects.filter(employee_id__in=employee_ids, date__range=[start, end])
+                .values_list('employee_id', 'date')
+            )
+            requests = [ot for ot in requests if (ot.employee_id, ot.date) not in claimed]
+            OvertimeRequest.objects.bulk_create(requests, batch_size=OVERTIME_BATCH_SIZE)
+
+    stats = {'created': len(requests), 'hours': sum((ot.hours for ot in requests), Decimal('0')), 'notified': 0}
+    if dry_run or not requests:
+        return stats
+
+    if notify:
+        employees = Employee.objects.select_related('user').in_bulk({ot.employee_id for ot in requests})
+        for overtime in requests:
+            overtime.employee = employees[overtime.employee_id]
+        stats['notified'] = _notify_managers(requests)
+    return stats
+
+
+def approve_overtime_requests(requests):
+    """
+    批准一批加班申請，為每筆加班建立補休批次 (記錄取得日與到期日)，並把時數一次轉入各員工的補休餘額。
+    只處理仍為待審核的申請 (已被處理過的會略過)，回傳實際批准的申請清單。
+    """
+    ids = [ot.id for ot in requests]
+    comp_type, _ = LeaveType.objects.get_or_create(name=COMPENSATORY_LEAVE_TYPE)
+
+    with transaction.atomic():
+        approved = list(
+            OvertimeRequest.objects.select_for_update()
+            .filter(id__in=ids, status='Pending')
+            .select_related('employee__user', 'employee__leave_policy')
+        )
+        if not approved:
+            return []
+        OvertimeRequest.objects.filter(id__in=[ot.id for ot in approved]).update(status='Approved')
+
+        hours_by_employee = defaultdict(Decimal)
+        for overtime in approved:
+            overtime.status = 'Approved'
+            hours_by_employee[overtime.employee_id] += overtime.hours
+        create_lots(approved)
+
+        balances = {
+            balance.employee_id: balance
+            for balance in LeaveBalance.objects.select_for_update().filter(employee_id__in=hours_by_employee, leave_type=comp_type)
+        }
+        for employee_id, hours in hours_by_employee.items():
+            if employee_id in balances:
+                balances[employee_id].balance_hours += hours
+        LeaveBalance.objects.bulk_update(balances.values(), ['balance_hours'])
+        LeaveBalance.objects.bulk_create([
+            LeaveBalance(employee_id=employee_id, leave_type=comp_type, balance_hours=hours)
+            for employee_id, hours in hours_by_employee.items() if employee_id not in balances
+        ])
+    return approved
@@ -0,0 +1,210 @@
+# core/policy_simulator.py
+"""
+假期策略試算 (what-if)：在不寫入任何資料的情況下，比較草稿策略 (權責發生設定與年資規則)
+與目前策略下，每位適用員工的年度權益時數。
+
+員工的年資、班表每日工時與部門一次載入成 numpy 陣列，
+以 searchsorted 對年資規則分級，10,000 位員工也能在一秒內完成。
+"""
+from datetime import date
+from decimal import Decimal, InvalidOperation
+
+import numpy as np
+
+from .accruals import schedule_daily_hours
+from .models import Department, Employee, LeavePolicy, PolicyRule, WorkSchedule
+
+# 依頻率換算成一年的期數，讓不同頻率的草稿可以直接比較年度權益
+PERIODS_PER_YEAR = {'DAILY': 365, 'WEEKLY': 52, 'MONTHLY': 12, 'YEARLY': 1}
+
+MAX_SIMULATION_RULES = 50
+# 超過的年資門檻不會有員工達到，也會讓 numpy 的 int64 溢位
+MAX_YEARS_OF_SERVICE = 100
+# 與 LeavePolicy.accrual_amount / PolicyRule.adjustment_amount (max_digits=5, decimal_places=2) 一致
+MAX_AMOUNT = Decimal('999.99')
+
+
+def _amount(value):
+    amount = Decimal(str(value))
+    if not amount.is_finite():
+        raise InvalidOperation
+    if abs(amount) > MAX_AMOUNT:
+        raise ValueError(f"accrual_amount、adjustment_amount 不可超過 {MAX_AMOUNT}。")
+    return amount
+
+
+def _tier_values(accrual_amount, rules):
+    """
+    回傳 (年資門檻陣列, 每一級的每期數量陣列)；第 0 級為未達任何門檻時的 accrual_amount。
+    與 entitlement_for_service 相同，只採用年資門檻最高的一條規則。
+    """
+    thresholds = np.array([rule['years_of_service'] for rule in rules], dtype=np.int64)
+    values = [float(accrual_amount)]
+    for rule in rules:
+        amount = float(rule['adjustment_amount'])
+        values.append(amount if rule['rule_type'] == 'SET' else float(accrual_amount) + amount)
+    return thresholds, np.array(values, dtype=np.float64)
+
+
+def _annual_hours(settings, years, daily_hours):
+    """向量化計算每位員工在 settings 下的年度權益時數，回傳 (時數陣列, 級別陣列)。"""
+    thresholds, values = _tier_values(settings['accrual_amount'], settings['rules'])
+    tiers = np.searchsorted(thresholds, years, side='right')
+    units = values[tiers] * PERIODS_PER_YEAR[settings['accrual_frequency']]
+    hours = units * daily_hours if settings['accrual_unit'] == 'DAYS' else units
+    return hours, tiers
+
+
+def current_settings(policy):
+    """目前儲存的策略設定，格式與 draft_from_data 的回傳值相同。"""
+    return {
+        'accrual_frequency': policy.accrual_frequency,
+        'accrual_amount': policy.accrual_amount,
+        'accrual_unit': policy.accrual_unit,
+        'rules': [
+            {'years_of_service': rule.years_of_service, 'rule_type': rule.rule_type, 'adjustment_amount': rule.adjustment_amount}
+            for rule in policy.rules.order_by('years_of_service', 'id')
+        ],
+    }
+
+
+def draft_from_data(policy, data):
+    """
+    把草稿參數 (dict，來自 JSON 或後台表單) 驗證成策略設定；未提供的欄位沿用目前策略。
+    rules 未提供時沿用目前的規則，提供空清單則代表刪除所有規則。格式錯誤時拋出 ValueError。
+    """
+    draft = current_settings(policy)
+    frequencies = dict(LeavePolicy.ACCRUAL_FREQUENCY_CHOICES)
+    units = dict(LeavePolicy.UNIT_CHOICES)
+    rule_types = dict(PolicyRule.RULE_TYPE_CHOICES)
+
+    try:
+        if data.get('accrual_frequency'):
+            if data['accrual_frequency'] not in frequencies:
+                raise ValueError(f"accrual_frequency 必須是 {', '.join(frequencies)} 之一。")
+            draft['accrual_frequency'] = data['accrual_frequency']
+        if data.get('accrual_unit'):
+            if data['accrual_unit'] not in units:
+                raise ValueError(f"accrual_unit 必須是 {', '.join(units)} 之一。")
+            draft['accrual_unit'] = data['accrual_unit']
+        if data.get('accrual_amount') not in (None, ''):
+            draft['accrual_amount'] = _amount(data['accrual_amount'])
+
+        if data.get('rules') is not None:
+            if len(data['rules']) > MAX_SIMULATION_RULES:
+                raise ValueError(f"年資規則最多 {MAX_SIMULATION_RULES} 條。")
+            rules = []
+            for rule in data['rules']:
+                rule_type = rule.get('rule_type') or 'ADD'
+                if rule_type not in rule_types:
+                    raise ValueError(f"rule_type 必須是 {', '.join(rule_types)} 之一。")
+                if not str(rule['years_of_service']).isdigit():
+                    raise ValueError("years_of_service 應為不小於 0 的整數。")
+                years = int(rule['years_of_service'])
+                if years > MAX_YEARS_OF_SERVICE:
+                    raise ValueError(f"years_of_service 不可超過 {MAX_YEARS_OF_SERVICE}。")
+                rules.append({
+                    'years_of_service': years,
+                    'rule_type': rule_type,
+                    'adjustment_amount': _amount(rule['adjustment_amount']),
+                })
+            # 同一年資有多條規則時以後面的為準，與 PolicyRule 的排序 (年資, id) 一致
+            draft['rules'] = sorted(rules, key=lambda rule: rule['years_of_service'])
+    except (AttributeError, KeyError, TypeError, InvalidOperation):
+        raise ValueError("參數格式錯誤：accrual_amount、adjustment_amount 應為數字，years_of_service 應為整數。")
+    return draft
+
+
+def simulate_policy(policy, draft, as_of=None):
+    """
+    試算 policy 的所有在職員工在目前設定與草稿設定 (draft) 下的年度權益時數 (以 as_of 的年資計算)。
+
+    回傳：
+      - totals:      員工數、目前 / 草稿總時數、差額、權益改變的員工數
+      - departments: 每個部門的同樣數字，另含草稿下每人平均 / 最少 / 最多時數
+      - tiers:       草稿每一級年資規則涵蓋的員工數與時數
+    """
+    as_of = as_of or date.today()
+    employee_rows = list(
+        Employee.objects.filter(status='Active', leave_policy=policy)
+        .values_list('department_id', 'work_schedule_id', 'hire_date')
+    )
+
+    schedule_hours = {None: float(schedule_daily_hours(None))}
+    schedule_ids = {schedule_id for _, schedule_id, _ in employee_rows if schedule_id}
+    for schedule in WorkSchedule.objects.filter(id__in=schedule_ids).prefetch_related('rules'):
+        schedule_hours[schedule.id] = float(schedule_daily_hours(schedule))
+
+    n = len(employee_rows)
+    hire_years = np.fromiter((hire.year for _, _, hire in employee_rows), dtype=np.int64, count=n)
+    hire_days = np.fromiter((hire.month * 100 + hire.day for _, _, hire in employee_rows), dtype=np.int64, count=n)
+    daily_hours = np.fromiter((schedule_hours[schedule_id] for _, schedule_id, _ in employee_rows), dtype=np.float64, count=n)
+    # 與 relativedelta(as_of, hire_date).years 相同：今年的到職紀念日還沒到就少算一年
+    years = as_of.year - hire_years - (as_of.month * 100 + as_of.day < hire_days)
+    years = np.maximum(years, 0)
+
+    current, _ = _annual_hours(current_settings(policy), years, daily_hours)
+    proposed, tiers = _annual_hours(draft, years, daily_hours)
+    delta = proposed - current
+    changed = ~np.isclose(delta, 0)
+
+    dept_ids = sorted({dept_id for dept_id, _, _ in employee_rows}, key=lambda d: (d is None, d or 0))
+    dept_index = {dept_id: i for i, dept_id in enumerate(dept_ids)}
+    row_dept = np.fromiter((dept_index[dept_id] for dept_id, _, _ in employee_rows), dtype=np.intp, count=n)
+    names = dict(Department.objects.filter(id__in=[d for d in dept_ids if d is not None]).values_list('id', 'name'))
+
+    def by_department(values):
+        return np.bincount(row_dept, weights=values, minlength=len(dept_ids))
+
+    headcounts = np.bincount(row_dept, minlength=len(dept_ids))
+    current_totals, proposed_totals, changed_counts = by_department(current), by_department(proposed), by_department(changed)
+
+    departments = []
+    for i, dept_id in enumerate(dept_ids):
+        members = proposed[row_dept == i]
+        departments.append({
+            'id': dept_id,
+            'name': names.get(dept_id, '其他'),
+            'employees': int(headcounts[i]),
+            'affected': int(changed_counts[i]),
+            'current_hours': round(float(current_totals[i]), 2),
+            'proposed_hours': round(float(proposed_totals[i]), 2),
+            'delta_hours': round(float(proposed_totals[i] - current_totals[i]), 2),
+            'proposed_avg_hours': round(float(members.mean()), 2),
+            'proposed_min_hours': round(float(members.min()), 2),
+            'proposed_max_hours': round(float(members.max()), 2),
+        })
+
+    tier_counts = np.bincount(tiers, minlength=len(draft['rules']) + 1)
+    tier_hours = np.bincount(tiers, weights=proposed, minlength=len(draft['rules']) + 1)
+    tier_labels = ['未達任何年資規則'] + [
+        f"滿 {rule['years_of_service']} 年 ({'設定為' if rule['rule_type'] == 'SET' else '增加'} {rule['adjustment_amount']})"
+        for rule in draft['rules']
+    ]
+
+    return {
+        'policy': {'id': policy.id, 'name': policy.name},
+        'as_of': as_of,
+        'draft': draft,
+        'totals': {
+            'employees': n,
+            'affected': int(changed.sum()),
+            'current_hours': round(float(current.sum()), 2),
+            'proposed_hours': round(float(proposed.sum()), 2),
+            'delta_hours': round(float(delta.sum()), 2),
+        },
+        'departments': departments,
+        'tiers': [
+            {'label': label, 'employees': int(tier_counts[i]), 'proposed_hours': round(float(tier_hours[i]), 2)}
+            for i, label in enumerate(tier_labels)
+        ],
+    }
+
+
+def simulate_from_data(policy, data):
+    """從草稿參數 (含可選的 as_of=YYYY-MM-DD) 試算，供 API 與後台頁面共用。"""
+    try:
+        as_of = date.fromisoformat(data['as_of']) if data.get('as_of') else date.today()
+    except (TypeError, ValueError):
+        raise ValueError("參數格式錯誤：as_of 應為 YYYY-MM-DD。")
+    return simulate_policy(policy, draft_from_data(policy, data), as_of)
@@ -0,0 +1,95 @@
+# core/presence.py
+"""
+「誰在上班」即時看板：在快取中維護每位員工的在班狀態與每個部門的在班人數，
+由打卡事件 (AttendanceRecord 的 signal) 增量更新。
+
+讀取看板只需對團隊成員做一次 cache.get_many，成本與團隊人數成正比，
+不必掃描 AttendanceRecord。快取被清空或超過 PRESENCE_REBUILD_SECONDS
+時，會以「未下班記錄」索引查詢重建一次，修正任何累積的誤差。
+"""
+from django.core.cache import cache
+from django.db.models import Min
+
+from .models import AttendanceRecord, Employee
+
+PRESENCE_EMPLOYEE_KEY = 'presence:emp:{}'
+PRESENCE_DEPARTMENT_KEY = 'presence:dept:{}'
+PRESENCE_WARM_KEY = 'presence:warm'
+
+PRESENCE_REBUILD_SECONDS = 60 * 60
+
+
+def _department_key(department_id):
+    return PRESENCE_DEPARTMENT_KEY.format(department_id or 'none')
+
+
+def rebuild_presence():
+    """由尚未下班的記錄重建所有在班狀態與部門人數。"""
+    open_records = (
+        AttendanceRecord.objects.filter(clock_out__isnull=True, needs_review=False)
+        .values('employee_id', 'employee__department_id')
+        .annotate(since=Min('clock_in'))
+    )
+    values = {}
+    counts = {}
+    for row in open_records:
+        department_id = row['employee__department_id']
+        values[PRESENCE_EMPLOYEE_KEY.format(row['employee_id'])] = {'since': row['since'], 'department_id': department_id}
+        counts[department_id] = counts.get(department_id, 0) + 1
+
+    # 先清掉舊的在班狀態，再寫入新的
+    stale_keys = [PRESENCE_EMPLOYEE_KEY.format(emp_id) for emp_id in Employee.objects.values_list('id', flat=True)]
+    cache.delete_many([key for key in stale_keys if key not in values])
+    department_ids = set(Employee.objects.values_list('department_id', flat=True).distinct())
+    values.update({_department_key(dept_id): counts.get(dept_id, 0) for dept_id in department_ids | set(counts)})
+    cache.set_many(values, timeout=None)
+    cache.set(PRESENCE_WARM_KEY, True, timeout=PRESENCE_REBUILD_SECONDS)
+
+
+def ensure_presence():
+    if cache.get(PRESENCE_WARM_KEY) is None:
+        rebuild_presence()
+
+
+def invalidate_presence():
+    """批次匯入等不觸發 signal 的寫入之後呼叫，下次讀取時會重建。"""
+    cache.delete(PRESENCE_WARM_KEY)
+
+
+def _adjust_department(department_id, delta):
+    key = _department_key(department_id)
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        # 計數器不存在 (例如快取被清空)，交給下次讀取時重建
+        invalidate_presence()
+
+
+def mark_clocked_in(employee_id, department_id, since):
+    key = PRESENCE_EMPLOYEE_KEY.format(employee_id)
+    if cache.get(key) is None:
+        cache.set(key, {'since': since, 'department_id': department_id}, timeout=None)
+        _adjust_department(department_id, 1)
+
+
+def mark_clocked_out(employee_id):
+    key = PRESENCE_EMPLOYEE_KEY.format(employee_id)
+    state = cache.get(key)
+    if state is not None:
+        cache.delete(key)
+        _adjust_department(state['department_id'], -1)
+
+
+def team_presence(employees):
+    """回傳 {員工ID: 上班打卡時間 或 None}。"""
+    ensure_presence()
+    keys = {emp.id: PRESENCE_EMPLOYEE_KEY.format(emp.id) for emp in employees}
+    states = cache.get_many(keys.values())
+    return {emp_id: states[key]['since'] if key in states else None for emp_id, key in keys.items()}
+
+
+def department_presence(department_ids):
+    """回傳 {部門ID: 在班人數}。"""
+    ensure_presence()
+    counts = cache.get_many([_department_key(dept_id) for dept_id in department_ids])
+    return {dept_id: max(counts.get(_department_key(dept_id), 0), 0) for dept_id in department_ids}
@@ -0,0 +1,106 @@
+# core/public_holidays.py
+"""
+公眾假期資料來源與批次寫入。
+
+- generate_holidays：以 holidays 套件離線產生任意地區 (例如 HK、MY、MY-14) 與年份範圍的假期，不需要網路。
+- parse_holiday_json / parse_ics：讀取 1823.gov.hk 的 JSON 或一般 iCalendar (.ics) 內容，作為可選的來源。
+- upsert_holidays：以 (地區, 日期) 為鍵批次新增或更新 PublicHoliday，取代逐筆 update_or_create。
+"""
+from datetime import datetime
+
+import holidays
+
+from .holiday_calendars import invalidate_holiday_calendars
+from .models import PublicHoliday
+from .roster import touch_roster
+
+
+def split_region(region):
+    """"MY-14" -> ("MY", "14")，"HK" -> ("HK", None)。"""
+    country, _, subdivision = region.upper().partition('-')
+    return country, subdivision or None
+
+
+def generate_holidays(regions, years, language=None):
+    """
+    以 holidays 套件產生 regions 在 years 內的假期，回傳 [(地區, 日期, 名稱)]。
+    不支援的地區代碼拋出 ValueError。
+    """
+    entries = []
+    for region in regions:
+        country, subdivision = split_region(region)
+        try:
+            calendar = holidays.country_holidays(country, subdiv=subdivision, years=years, language=language)
+        except NotImplementedError:
+            raise ValueError(f"holidays 套件不支援地區代碼 '{region}'。")
+        entries.extend((region.upper(), day, name) for day, name in sorted(calendar.items()))
+    return entries
+
+
+def parse_holiday_json(data, region=PublicHoliday.DEFAULT_REGION):
+    """解析 1823.gov.hk 的 JSON (vcalendar -> vevent，dtstart 為 YYYYMMDD)，回傳 ([(地區, 日期, 名稱)], 無法解析的項目)。"""
+    entries, skipped = [], []
+    if not isinstance(data, dict):
+        return entries, skipped
+    for event in data.get('vcalendar', [{}])[0].get('vevent', []):
+        summary = event.get('summary')
+        start = (event.get('dtstart') or [None])[0]
+        try:
+            entries.append((region, datetime.strptime(start, '%Y%m%d').date(), summary))
+        except (TypeError, ValueError):
+            skipped.append(f"{summary}: {start}")
+    return entries, skipped
+
+
+def parse_ics(text, region=PublicHoliday.DEFAULT_REGION):
+    """解析 iCalendar (.ics) 中的全天事件 (DTSTART;VALUE=DATE)，回傳 ([(地區, 日期, 名稱)], 無法解析的項目)。"""
+    # 展開折行 (RFC 5545：以空白開頭的行接續上一行)
+    lines = text.replace('\r\n', '\n').replace('\n ', '').replace('\n\t', '').split('\n')
+    entries, skipped = [], []
+    summary = start = None
+    for line in lines:
+        key, _, value = line.partition(':')
+        name = key.split(';', 1)[0].upper()
+        if name == 'BEGIN' and value.strip().upper() == 'VEVENT':
+            summary = start = None
+        elif name == 'SUMMARY':
+            summary = value.strip().replace('\\,', ',').replace('\\;', ';')
+        elif name == 'DTSTART':
+            start = value.strip()
+        elif name == 'END' and value.strip().upper() == 'VEVENT':
+            try:
+                entries.append((region, datetime.strptime(start[:8], '%Y%m%d').date(), summary))
+            except (TypeError, ValueError):
+                skipped.append(f"{summary}: {start}")
+    return entries, skipped
+
+
+def upsert_holidays(entries):
+    """
+    批次新增或更新 PublicHoliday：(地區, 日期) 已存在時只在名稱不同時更新。
+    回傳 (新增數, 更新數)。批次操作不會觸發 signals，因此最後手動讓班表與假期行事曆快取失效。
+    """
+    latest = {(region, day): name for region, day, name in entries if name}
+    if not latest:
+        return 0, 0
+    days = [day for _, day in latest]
+    existing = {
+        (holiday.region, holiday.date): holiday
+        for holiday in PublicHoliday.objects.filter(region__in={region for region, _ in latest}, date__range=[min(days), max(days)])
+    }
+
+    created, updated = [], []
+    for (region, day), name in latest.items():
+        holiday = existing.get((region, day))
+        if holiday is None:
+            created.append(PublicHoliday(region=region, date=day, name=name[:255]))
+        elif holiday.name != name[:255]:
+            holiday.name = name[:255]
+            updated.append(holiday)
+
+    PublicHoliday.objects.bulk_create(created, batch_size=1000)
+    PublicHoliday.objects.bulk_update(updated, ['name'], batch_size=1000)
+    if created or updated:
+        invalidate_holiday_calendars()
+        touch_roster()
+    return len(created), len(updated)
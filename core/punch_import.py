@@ -0,0 +1,209 @@
+# core/punch_import.py
+"""
+打卡機 (badge terminal) 匯出的 CSV 打卡資料匯入。
+
+以串流方式逐行讀取，只為「尚未配對下班的上班打卡」保留狀態，
+因此記憶體用量與員工人數成正比，與檔案行數無關；數百萬行也可以匯入。
+每筆記錄以內容雜湊 (source_hash) 去重，重複匯入同一個檔案是安全的。
+
+CSV 欄位 (第一行為標題)：
+  employee   員工編號 (Employee.employee_number)
+  timestamp  打卡時間，ISO 格式，例如 2025-03-01 08:59:12
+  direction  (可選) IN / OUT；沒有此欄位時依序交替視為上班、下班
+"""
+import csv
+import hashlib
+import io
+import time
+from datetime import datetime, timedelta
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import AttendanceRecord, ArchivedAttendanceRecord, DailyTimesheet, Employee, PunchImport
+from .presence import invalidate_presence
+
+IMPORT_CHUNK_SIZE = 5000
+
+# 上班打卡後超過這段時間仍未有下班打卡，視為漏打下班卡，不再與之後的打卡配對
+MAX_SHIFT_HOURS = 16
+
+IMPORT_NOTE = "Imported from badge terminal"
+
+
+def punch_hash(employee_id, clock_in):
+    """同一位員工、同一個上班打卡時間只會產生一筆記錄。"""
+    return hashlib.sha256(f"{employee_id}|{clock_in.isoformat()}".encode()).hexdigest()
+
+
+def parse_timestamp(value):
+    value = datetime.fromisoformat(value.strip())
+    if timezone.is_naive(value):
+        value = timezone.make_aware(value)
+    return value
+
+
+def pair_punches(punches, stats, max_shift=timedelta(hours=MAX_SHIFT_HOURS), unmatched=None):
+    """
+    把打卡串流配對成上下班記錄。
+
+    punches 為依時間排序的 (員工ID, 打卡時間, 方向) 串流，方向為 'IN'、'OUT' 或 None (交替)。
+    產生 (員工ID, 上班時間, 下班時間 或 None)；沒有對應上班打卡的下班打卡會被略過並計入 stats['unmatched']，
+    unmatched 為清單時也會把這些打卡 (員工ID, 打卡時間) 加入其中。
+    """
+    open_punches = {}
+    for employee_id, stamp, direction in punches:
+        open_in = open_punches.get(employee_id)
+        if open_in is not None and stamp - open_in > max_shift:
+            # 漏打下班卡：保留一筆未下班的記錄，交給主管補登
+            yield employee_id, open_punches.pop(employee_id), None
+            open_in = None
+
+        if direction == 'IN' or (direction is None and open_in is None):
+            if open_in is not None:
+                yield employee_id, open_in, None
+            open_punches[employee_id] = stamp
+        elif open_in is not None:
+            del open_punches[employee_id]
+            yield employee_id, open_in, stamp
+        else:
+            stats['unmatched'] += 1
+            if unmatched is not None:
+                unmatched.append((employee_id, stamp))
+
+    for employee_id, open_in in open_punches.items():
+        yield employee_id, open_in, None
+
+
+def _read_punches(rows, employee_ids, stats):
+    for row in rows:
+        stats['rows'] += 1
+        employee_id = employee_ids.get((row.get('employee') or '').strip())
+        if employee_id is None:
+            stats['unknown_employee'] += 1
+            continue
+        try:
+            stamp = parse_timestamp(row['timestamp'])
+        except (KeyError, TypeError, ValueError):
+            stats['invalid'] += 1
+            continue
+        direction = (row.get('direction') or '').strip().upper() or None
+        if direction not in (None, 'IN', 'OUT'):
+            stats['invalid'] += 1
+            continue
+        yield employee_id, stamp, direction
+
+
+def save_pairs(pairs, note=IMPORT_NOTE):
+    """
+    寫入一批配對好的記錄，回傳 (新增數, 補上下班時間數)。
+
+    已存在的記錄 (相同 source_hash) 會被略過；如果舊記錄還沒有下班時間，
+    而這次匯入有，則補上下班時間 (例如前一次匯入時檔案在下班打卡前就截斷了)。
+    """
+    records = [
+        AttendanceRecord(
+            employee_id=employee_id, clock_in=clock_in, clock_out=clock_out,
+            notes=note, source_hash=punch_hash(employee_id, clock_in),
+        )
+        for employee_id, clock_in, clock_out in pairs
+    ]
+    if not records:
+        return 0, 0
+
+    by_hash = {record.source_hash: record for record in records}
+    with transaction.atomic():
+        existing = set(AttendanceRecord.objects.filter(source_hash__in=by_hash).values_list('source_hash', flat=True))
+        archived = set(ArchivedAttendanceRecord.objects.filter(source_hash__in=by_hash).values_list('source_hash', flat=True))
+        AttendanceRecord.objects.bulk_create(
+            [record for source_hash, record in by_hash.items() if source_hash not in existing and source_hash not in archived],
+            ignore_conflicts=True,
+        )
+
+        closable = [
+            record for record in AttendanceRecord.objects.filter(source_hash__in=existing, clock_out__isnull=True).only('id', 'source_hash')
+            if by_hash[record.source_hash].clock_out is not None
+        ]
+        for record in closable:
+            record.clock_out = by_hash[record.source_hash].clock_out
+        AttendanceRecord.objects.bulk_update(closable, ['clock_out'])
+
+        # bulk_create 不會觸發 signal，因此自行標記受影響的工時表
+        spans = {}
+        for record in by_hash.values():
+            day = timezone.localtime(record.clock_in).date()
+            first, last = spans.get(record.employee_id, (day, day))
+            spans[record.employee_id] = (min(first, day), max(last, day))
+        affected = Q()
+        for employee_id, span in spans.items():
+            affected |= Q(employee_id=employee_id, date__range=span)
+        DailyTimesheet.objects.filter(affected, is_stale=False).update(is_stale=True)
+        invalidate_presence()
+
+    return len(by_hash) - len(existing | archived), len(closable)
+
+
+def import_punches(lines, chunk_size=IMPORT_CHUNK_SIZE, progress=None):
+    """
+    從文字行 (檔案物件或任何可迭代的字串) 匯入打卡資料。
+    progress(stats) 會在每個批次寫入後被呼叫，可用來顯示進度。
+    回傳統計資料 dict。
+    """
+    stats = {'rows': 0, 'created': 0, 'closed': 0, 'skipped': 0, 'unknown_employee': 0, 'invalid': 0, 'unmatched': 0}
+    started = time.perf_counter()
+
+    employee_ids = dict(Employee.objects.exclude(employee_number__isnull=True).values_list('employee_number', 'id'))
+    pairs = pair_punches(_read_punches(csv.DictReader(lines), employee_ids, stats), stats)
+
+    chunk = []
+
+    def flush():
+        created, closed = save_pairs(chunk)
+        stats['created'] += created
+        stats['closed'] += closed
+        stats['skipped'] += len(chunk) - created - closed
+        chunk.clear()
+        stats['seconds'] = time.perf_counter() - started
+        stats['rows_per_second'] = stats['rows'] / stats['seconds'] if stats['seconds'] else 0
+        if progress:
+            progress(stats)
+
+    for pair in pairs:
+        chunk.append(pair)
+        if len(chunk) >= chunk_size:
+            flush()
+    flush()
+    return stats
+
+
+def run_punch_import(job):
+    """匯入一筆已認領 (狀態為 Running) 的 PunchImport，匯入中依批次更新統計，結束時記錄結果。"""
+    def progress(stats):
+        PunchImport.objects.filter(id=job.id).update(stats=dict(stats))
+
+    try:
+        with job.csv_file.open('rb') as raw:
+            lines = io.TextIOWrapper(raw, encoding='utf-8-sig', newline='')
+            job.stats = import_punches(lines, progress=progress)
+        job.status = 'Done'
+    except Exception as e:
+        # 已寫入的批次不會回滾；重新上傳同一個檔案是安全的 (依 source_hash 去重)
+        job.status = 'Failed'
+        job.error = str(e)
+    job.finished_at = timezone.now()
+    job.save(update_fields=['status', 'stats', 'error', 'finished_at'])
+    return job
+
+
+def process_punch_imports():
+    """
+    依上傳順序處理等待中的打卡匯入，回傳處理過的 PunchImport 清單。
+    以條件更新認領每一筆，多個程序同時執行也不會重複匯入同一個檔案。
+    """
+    processed = []
+    for job_id in PunchImport.objects.filter(status='Pending').order_by('id').values_list('id', flat=True):
+        if not PunchImport.objects.filter(id=job_id, status='Pending').update(status='Running', started_at=timezone.now()):
+            continue
+        processed.append(run_punch_import(PunchImport.objects.get(id=job_id)))
+    return processed
@@ -0,0 +1,171 @@
+# core/roster.py
+"""
+班表解析工具：一次性批次抓取班表規則、手動排班、休假與國定假日，
+讓排班、值日表、行事曆等功能不必逐一員工、逐日查詢資料庫。
+"""
+import time
+from datetime import timedelta
+
+from django.core.cache import cache
+
+from .holiday_calendars import employee_holiday_maps, holidays_between
+from .models import DutyShift, LeaveRequest, PublicHoliday
+
+# 班表變動時間戳：讓行事曆、值日表等可以用 ETag / 快取，而不必每次重算
+ROSTER_STAMP_KEY = 'roster:stamp:{}'
+
+
+def date_range(start, end):
+    """回傳 start 到 end (含) 之間的每一天。"""
+    return [start + timedelta(days=i) for i in range((end - start).days + 1)]
+
+
+def weekly_rules_map(employees):
+    """
+    {員工ID: {星期幾: (上班時間, 下班時間)}}
+    employees 應已 prefetch_related('work_schedule__rules')，否則每位員工會多一次查詢。
+    """
+    rules_map = {}
+    for emp in employees:
+        if emp.work_schedule:
+            rules_map[emp.id] = {
+                rule.day_of_week: (rule.start_time, rule.end_time)
+                for rule in emp.work_schedule.rules.all()
+            }
+        else:
+            rules_map[emp.id] = {}
+    return rules_map
+
+
+def shift_map(employee_ids, start, end):
+    """{(員工ID, 日期): (上班時間, 下班時間)}，來源為手動排班 DutyShift。"""
+    shifts = DutyShift.objects.filter(
+        employee_id__in=employee_ids, date__range=[start, end]
+    ).values_list('employee_id', 'date', 'start_time', 'end_time')
+    return {(emp_id, day): (start_time, end_time) for emp_id, day, start_time, end_time in shifts}
+
+
+def leave_days_map(employee_ids, start, end, statuses=('Approved',)):
+    """{員工ID: {休假日期}}，只包含落在 start 到 end 之間的日期。"""
+    leaves = LeaveRequest.objects.filter(
+        employee_id__in=employee_ids,
+        status__in=statuses,
+        start_datetime__date__lte=end,
+        end_datetime__date__gte=start,
+    ).values_list('employee_id', 'start_datetime', 'end_datetime')
+
+    leave_map = {}
+    for emp_id, start_dt, end_dt in leaves:
+        current_date = max(start_dt.date(), start)
+        last_date = min(end_dt.date(), end)
+        while current_date <= last_date:
+            leave_map.setdefault(emp_id, set()).add(current_date)
+            current_date += timedelta(days=1)
+    return leave_map
+
+
+def holiday_map(start, end, region=PublicHoliday.DEFAULT_REGION):
+    """{日期: 假期名稱}：某個地區的公眾假期 (經由快取)。"""
+    return holidays_between(region, start, end)
+
+
+def employee_holidays_map(employees, start, end):
+    """{員工ID: {日期: 假期名稱}}：依每位員工 (或其部門) 的假期地區。"""
+    return employee_holiday_maps(employees, start, end)
+
+
+def resolve_shifts(employees, start, end):
+    """
+    計算每位員工在日期範圍內實際要上班的班次：
+    {(員工ID, 日期): (上班時間, 下班時間)}
+
+    優先順序與值日表相同：休假 > 手動排班 > 國定假日 > 預設班表。
+    (手動排班代表經理明確要求當天上班，因此可以覆蓋國定假日。)
+    """
+    employees = list(employees)
+    employee_ids = [emp.id for emp in employees]
+    rules_map = weekly_rules_map(employees)
+    overrides = shift_map(employee_ids, start, end)
+    leave_map = leave_days_map(employee_ids, start, end)
+    holidays_map = employee_holidays_map(employees, start, end)
+
+    resolved = {}
+    for day in date_range(start, end):
+        weekday = day.weekday()
+        for emp in employees:
+            if day in leave_map.get(emp.id, ()):
+                continue
+            shift = overrides.get((emp.id, day))
+            if shift is None and day not in holidays_map[emp.id]:
+                shift = rules_map[emp.id].get(weekday)
+            if shift:
+                resolved[(emp.id, day)] = shift
+    return resolved
+
+
+def touch_roster(employee_ids=None):
+    """
+    記錄班表資料已變動。
+    employee_ids 為 None 代表影響所有人的變動 (例如國定假日、班表規則)。
+    """
+    now = time.time()
+    names = ['all']
+    if employee_ids is None:
+        names.append('global')
+    else:
+        names.extend(f'emp:{emp_id}' for emp_id in employee_ids)
+    cache.set_many({ROSTER_STAMP_KEY.format(name): now for name in names}, timeout=None)
+
+
+def roster_stamp(employee_ids=None):
+    """
+    回傳相關班表資料最後變動的時間戳 (秒)。
+    employee_ids 為 None 時回傳任何班表變動的時間。
+    """
+    if employee_ids is None:
+        names = ['all']
+    else:
+        names = ['global'] + [f'emp:{emp_id}' for emp_id in employee_ids]
+    keys = [ROSTER_STAMP_KEY.format(name) for name in names]
+
+    stamps = cache.get_many(keys)
+    missing = [key for key in keys if key not in stamps]
+    if missing:
+        # 快取被清空 (例如重新啟動) 時視為剛剛變動，客戶端只會多下載一次
+        now = time.time()
+        cache.set_many({key: now for key in missing}, timeout=None)
+        stamps.update({key: now for key in missing})
+    return max(stamps.values())
+
+
+def day_statuses(employees, start, end):
+    """
+    值日表用的每日狀態：{員工ID: [{'type': ..., 'label': ...}, ...]}
+    type 為 'leave'、'shift'、'holiday' 或 'rest'，優先順序與 resolve_shifts 相同。
+    """
+    employees = list(employees)
+    employee_ids = [emp.id for emp in employees]
+    rules_map = weekly_rules_map(employees)
+    overrides = shift_map(employee_ids, start, end)
+    leave_map = leave_days_map(employee_ids, start, end)
+    holidays_map = employee_holidays_map(employees, start, end)
+    days = date_range(start, end)
+
+    statuses = {}
+    for emp in employees:
+        public_holidays = holidays_map[emp.id]
+        row = []
+        for day in days:
+            shift = overrides.get((emp.id, day))
+            if day in leave_map.get(emp.id, ()):
+                row.append({'type': 'leave', 'label': 'On Leave'})
+            elif shift is None and day in public_holidays:
+                row.append({'type': 'holiday', 'label': public_holidays[day]})
+            else:
+                shift = shift or rules_map[emp.id].get(day.weekday())
+                if shift:
+                    row.append({'type': 'shift', 'label': f"{shift[0].strftime('%H:%M')}-{shift[1].strftime('%H:%M')}"})
+                else:
+                    row.append({'type': 'rest', 'label': 'Rest Day'})
+        statuses[emp.id] = row
+    return statuses
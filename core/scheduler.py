@@ -34,6 +34,66 @@ def process_year_end_job():
     except Exception as e:
         print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] Error running process_year_end_job: {e}")
 
+def reconcile_attendance_job():
+    """
+    Executes the reconcile_attendance management command.
+    """
+    try:
+        call_command('reconcile_attendance')
+        print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] Successfully ran reconcile_attendance_job.")
+    except Exception as e:
+        print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] Error running reconcile_attendance_job: {e}")
+
+def compute_timesheets_job():
+    """
+    Executes the compute_timesheets management command for yesterday and any stale days.
+    """
+    try:
+        call_command('compute_timesheets')
+        print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] Successfully ran compute_timesheets_job.")
+    except Exception as e:
+        print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] Error running compute_timesheets_job: {e}")
+
+def archive_attendance_job():
+    """
+    Executes the archive_attendance management command.
+    """
+    try:
+        call_command('archive_attendance')
+        print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] Successfully ran archive_attendance_job.")
+    except Exception as e:
+        print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] Error running archive_attendance_job: {e}")
+
+def generate_overtime_requests_job():
+    """
+    Executes the generate_overtime_requests management command for yesterday.
+    """
+    try:
+        call_command('generate_overtime_requests')
+        print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] Successfully ran generate_overtime_requests_job.")
+    except Exception as e:
+        print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] Error running generate_overtime_requests_job: {e}")
+
+def expire_comp_leave_job():
+    """
+    Executes the expire_comp_leave management command.
+    """
+    try:
+        call_command('expire_comp_leave')
+        print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] Successfully ran expire_comp_leave_job.")
+    except Exception as e:
+        print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] Error running expire_comp_leave_job: {e}")
+
+def process_punch_imports_job():
+    """
+    Executes the process_punch_imports management command.
+    """
+    try:
+        call_command('process_punch_imports')
+        print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] Successfully ran process_punch_imports_job.")
+    except Exception as e:
+        print(f"[{time.strftime('%Y-%m-%d %H:%M:%S')}] Error running process_punch_imports_job: {e}")
+
 def start_scheduler():
     """
     Starts the scheduler and adds all jobs.
@@ -41,11 +101,12 @@ def start_scheduler():
     scheduler = BackgroundScheduler()
     scheduler.add_jobstore(DjangoJobStore(), "default")
     
-    # Job 1: Accrue Leave
+    # Job 1: Accrue Leave (after the year-end settlement, so a new period's credit is never forfeited)
     scheduler.add_job(
         accrue_leave_job,
-        trigger='interval',
-        seconds=60, # For testing
+        trigger='cron',
+        hour='0',
+        minute='15', # Daily at 12:15 AM
         id='accrue_leave_daily_job',
         replace_existing=True,
     )
@@ -67,6 +128,64 @@ def start_scheduler():
         id='process_year_end_daily_job',
         replace_existing=True,
     )
+
+    # Job 4: Forgotten Clock-outs (before the timesheets are computed)
+    scheduler.add_job(
+        reconcile_attendance_job,
+        trigger='cron',
+        hour='1',
+        minute='30', # Daily at 1:30 AM
+        id='reconcile_attendance_daily_job',
+        replace_existing=True,
+    )
+
+    # Job 5: Daily Timesheets
+    scheduler.add_job(
+        compute_timesheets_job,
+        trigger='cron',
+        hour='2', # Daily at 2 AM
+        id='compute_timesheets_daily_job',
+        replace_existing=True,
+    )
+
+    # Job 6: Overtime Requests from Timesheets (after the timesheets)
+    scheduler.add_job(
+        generate_overtime_requests_job,
+        trigger='cron',
+        hour='2',
+        minute='30', # Daily at 2:30 AM
+        id='generate_overtime_requests_daily_job',
+        replace_existing=True,
+    )
+
+    # Job 7: Monthly Attendance Summaries & Archive (after the timesheets)
+    scheduler.add_job(
+        archive_attendance_job,
+        trigger='cron',
+        hour='3', # Daily at 3 AM
+        id='archive_attendance_daily_job',
+        replace_existing=True,
+    )
+
+    # Job 8: Expire Compensatory Leave Lots
+    scheduler.add_job(
+        expire_comp_leave_job,
+        trigger='cron',
+        hour='0',
+        minute='30', # Daily at 12:30 AM
+        id='expire_comp_leave_daily_job',
+        replace_existing=True,
+    )
+
+    # Job 9: Punch CSV Imports Queued from the Admin
+    scheduler.add_job(
+        process_punch_imports_job,
+        trigger='interval',
+        minutes=1,
+        id='process_punch_imports_job',
+        replace_existing=True,
+        max_instances=1, # 大檔案可能超過一分鐘
+    )
     
     try:
         print("Starting scheduler...")
@@ -0,0 +1,149 @@
+# core/signals.py
+from django.db.models.signals import post_save, post_delete, pre_save, pre_delete
+from django.dispatch import receiver
+from django.db import transaction
+from django.utils import timezone
+
+from .models import Employee, Department, DutyShift, LeaveRequest, PublicHoliday, ScheduleRule, SiteConfiguration, AttendanceNetworkPolicy, AttendanceRecord, LeavePolicy
+from .roster import touch_roster
+from .attendance import invalidate_network_policy
+from .timesheets import mark_timesheets_stale
+from .presence import mark_clocked_in, mark_clocked_out
+from .accruals import refresh_next_due
+from .holiday_compensation import revoke_holiday
+from .holiday_calendars import invalidate_holiday_calendars
+from .comp_leave import sync_leave_request
+
+
+# --- 班表變動：更新時間戳，讓行事曆訂閱與值日表的快取失效 ---
+
+@receiver([post_save, post_delete], sender=DutyShift)
+@receiver([post_save, post_delete], sender=LeaveRequest)
+def roster_entry_changed(sender, instance, **kwargs):
+    touch_roster([instance.employee_id])
+
+@receiver([post_save, post_delete], sender=Employee)
+def employee_changed(sender, instance, **kwargs):
+    touch_roster([instance.id])
+
+@receiver([post_save, post_delete], sender=PublicHoliday)
+@receiver([post_save, post_delete], sender=ScheduleRule)
+@receiver([post_save, post_delete], sender=Department)
+def calendar_changed(sender, instance, **kwargs):
+    touch_roster()
+
+
+# --- 公眾假期或部門的假期地區變動：讓快取的 (地區, 年份) 假期與部門地區對照表失效 ---
+
+@receiver([post_save, post_delete], sender=PublicHoliday)
+@receiver([post_save, post_delete], sender=Department)
+def holiday_calendar_changed(sender, instance, **kwargs):
+    invalidate_holiday_calendars()
+
+
+# --- 打卡網路策略變動：重建編譯好的網段比對表 ---
+
+@receiver(post_save, sender=SiteConfiguration)
+@receiver([post_save, post_delete], sender=AttendanceNetworkPolicy)
+def network_policy_changed(sender, instance, **kwargs):
+    invalidate_network_policy()
+
+
+# --- 打卡、排班、休假變動：標記受影響的每日工時表需要重新計算 ---
+
+@receiver([post_save, post_delete], sender=AttendanceRecord)
+def attendance_changed(sender, instance, **kwargs):
+    start = timezone.localtime(instance.clock_in).date()
+    end = timezone.localtime(instance.clock_out).date() if instance.clock_out else start
+    mark_timesheets_stale(instance.employee_id, start, max(start, end))
+
+@receiver([post_save, post_delete], sender=DutyShift)
+def duty_shift_timesheet_changed(sender, instance, **kwargs):
+    mark_timesheets_stale(instance.employee_id, instance.date)
+
+@receiver([post_save, post_delete], sender=LeaveRequest)
+def leave_timesheet_changed(sender, instance, **kwargs):
+    mark_timesheets_stale(
+        instance.employee_id,
+        timezone.localtime(instance.start_datetime).date(),
+        timezone.localtime(instance.end_datetime).date(),
+    )
+
+
+# --- 打卡事件：增量更新「誰在上班」看板 ---
+
+def _refresh_presence(employee_id):
+    open_record = AttendanceRecord.objects.filter(employee_id=employee_id, clock_out__isnull=True, needs_review=False).order_by('clock_in').values_list('clock_in', 'employee__department_id').first()
+    if open_record:
+        mark_clocked_in(employee_id, open_record[1], open_record[0])
+    else:
+        mark_clocked_out(employee_id)
+
+@receiver([post_save, post_delete], sender=AttendanceRecord)
+def presence_changed(sender, instance, **kwargs):
+    transaction.on_commit(lambda: _refresh_presence(instance.employee_id))
+
+
+# --- 到職日、假期策略或在職狀態變動：重新計算員工的下次假期入帳日 ---
+
+ACCRUAL_DATE_FIELDS = ('hire_date', 'leave_policy_id', 'status')
+
+@receiver(pre_save, sender=Employee)
+def employee_accrual_fields_changing(sender, instance, **kwargs):
+    # 與讀取時的值 (Employee.from_db) 比較；新建或不是從資料庫讀出的物件一律重新計算
+    loaded = getattr(instance, '_loaded_values', None)
+    if instance.pk is None or loaded is None:
+        instance._accrual_dates_changed = True
+        return
+    deferred = instance.get_deferred_fields()
+    instance._accrual_dates_changed = any(
+        field not in deferred and (field not in loaded or loaded[field] != getattr(instance, field))
+        for field in ACCRUAL_DATE_FIELDS
+    )
+
+@receiver(post_save, sender=Employee)
+def employee_accrual_dates_changed(sender, instance, **kwargs):
+    loaded = getattr(instance, '_loaded_values', None)
+    if loaded is not None:
+        deferred = instance.get_deferred_fields()
+        loaded.update({field: getattr(instance, field) for field in ACCRUAL_DATE_FIELDS if field not in deferred})
+    if getattr(instance, '_accrual_dates_changed', False):
+        instance._accrual_dates_changed = False
+        refresh_next_due([instance])
+
+@receiver(post_save, sender=LeavePolicy)
+def leave_policy_accrual_dates_changed(sender, instance, created, **kwargs):
+    if not created:
+        refresh_next_due(instance.employee_set.select_related('leave_policy'))
+
+
+# --- 公眾假期改日期：清除補償處理時間，讓下次假期補償重新計算這個假期；刪除時收回補償 ---
+
+@receiver(pre_save, sender=PublicHoliday)
+def public_holiday_date_changing(sender, instance, **kwargs):
+    if instance.pk is None or instance.compensated_at is None:
+        return
+    previous_date = PublicHoliday.objects.filter(pk=instance.pk).values_list('date', flat=True).first()
+    if previous_date != instance.date:
+        instance.compensated_at = None
+
+@receiver(pre_delete, sender=PublicHoliday)
+def public_holiday_deleting(sender, instance, **kwargs):
+    revoke_holiday(instance)
+
+
+# --- 補休的休假被批准、撤銷、修改或刪除：依取得日由舊到新扣減 (或還原) 補休批次 ---
+
+COMP_LEAVE_FIELDS = ('status', 'leave_type_id', 'duration_hours')
+
+@receiver(pre_save, sender=LeaveRequest)
+def leave_request_changing(sender, instance, **kwargs):
+    instance._previous_comp_leave = None if instance.pk is None else LeaveRequest.objects.filter(pk=instance.pk).values(*COMP_LEAVE_FIELDS).first()
+
+@receiver(post_save, sender=LeaveRequest)
+def leave_request_comp_lots_changed(sender, instance, **kwargs):
+    sync_leave_request(instance, getattr(instance, '_previous_comp_leave', None))
+
+@receiver(pre_delete, sender=LeaveRequest)
+def leave_request_deleting(sender, instance, **kwargs):
+    sync_leave_request(instance, LeaveRequest.objects.filter(pk=instance.pk).values(*COMP_LEAVE_FIELDS).first(), deleted=True)
@@ -0,0 +1,148 @@
+# core/staffing.py
+"""
+部門人力預測：把班表、手動排班、國定假日與休假一次載入成
+(員工 x 日期) 的 numpy 陣列，再依部門加總，找出人力不足的日子。
+"""
+from datetime import date, timedelta
+
+import numpy as np
+
+from .holiday_calendars import department_regions, holidays_between
+from .models import Department, Employee, ScheduleRule, DutyShift, LeaveRequest, PublicHoliday, StaffingRequirement
+
+MAX_FORECAST_WEEKS = 26
+
+
+def _leave_matrix(leaves, employee_index, start, n_days):
+    matrix = np.zeros((len(employee_index), n_days), dtype=bool)
+    for emp_id, start_dt, end_dt in leaves:
+        row = employee_index.get(emp_id)
+        if row is None:
+            continue
+        first = max((start_dt.date() - start).days, 0)
+        last = min((end_dt.date() - start).days, n_days - 1)
+        if first <= last:
+            matrix[row, first:last + 1] = True
+    return matrix
+
+
+def forecast_staffing(start, weeks, department_ids=None, threshold=None):
+    """
+    預測 start 起 weeks 週內，每個部門每天的在班人數。
+
+    threshold 為 None 時，使用部門的人力需求 (StaffingRequirement) 作為門檻；
+    否則所有部門、所有日子都使用同一個門檻。
+
+    回傳的每個部門包含三組每日人數：
+      - scheduled:      依班表/手動排班應上班的人數
+      - after_approved: 扣除已批准休假後的人數
+      - after_pending:  再扣除待審核休假後的人數 (最壞情況)
+    """
+    weeks = max(1, min(weeks, MAX_FORECAST_WEEKS))
+    n_days = weeks * 7
+    end = start + timedelta(days=n_days - 1)
+    dates = [start + timedelta(days=i) for i in range(n_days)]
+
+    employees = Employee.objects.filter(status='Active')
+    if department_ids:
+        employees = employees.filter(department_id__in=department_ids)
+    employee_rows = list(employees.values_list('id', 'department_id', 'work_schedule_id', 'holiday_region'))
+    employee_index = {emp_id: row for row, (emp_id, _, _, _) in enumerate(employee_rows)}
+
+    departments = {None: {'name': '其他', 'color': '#A9A9A9'}}
+    departments.update({
+        dept_id: {'name': name, 'color': color}
+        for dept_id, name, color in Department.objects.values_list('id', 'name', 'color')
+    })
+    dept_ids = sorted({dept_id for _, dept_id, _, _ in employee_rows}, key=lambda d: (d is None, d or 0))
+    dept_index = {dept_id: i for i, dept_id in enumerate(dept_ids)}
+
+    # 1. 每週固定班表 -> (員工 x 星期幾) 的布林表，再展開成 (員工 x 日期)
+    schedule_days = {}
+    for schedule_id, day_of_week in ScheduleRule.objects.values_list('schedule_id', 'day_of_week'):
+        schedule_days.setdefault(schedule_id, []).append(day_of_week)
+    weekly_pattern = np.zeros((len(employee_rows), 7), dtype=bool)
+    for row, (_, _, schedule_id, _) in enumerate(employee_rows):
+        weekly_pattern[row, schedule_days.get(schedule_id, [])] = True
+    weekdays = np.array([day.weekday() for day in dates], dtype=np.intp)
+    scheduled = weekly_pattern[:, weekdays]
+
+    # 2. 國定假日 (依員工或部門的假期地區) 不上班，但手動排班可以覆蓋
+    dept_regions = department_regions()
+    rows_by_region = {}
+    for row, (_, dept_id, _, region) in enumerate(employee_rows):
+        region = region or dept_regions.get(dept_id) or PublicHoliday.DEFAULT_REGION
+        rows_by_region.setdefault(region, []).append(row)
+    for region, rows in rows_by_region.items():
+        holiday_cols = [(day - start).days for day in holidays_between(region, start, end)]
+        scheduled[np.ix_(rows, holiday_cols)] = False
+
+    shifts = DutyShift.objects.filter(employee_id__in=employee_index.keys(), date__range=[start, end]).values_list('employee_id', 'date')
+    if shifts:
+        shift_rows, shift_cols = zip(*((employee_index[emp_id], (day - start).days) for emp_id, day in shifts))
+        scheduled[list(shift_rows), list(shift_cols)] = True
+
+    # 3. 休假
+    leaves = LeaveRequest.objects.filter(
+        employee_id__in=employee_index.keys(),
+        start_datetime__date__lte=end,
+        end_datetime__date__gte=start,
+    )
+    approved = _leave_matrix(leaves.filter(status='Approved').values_list('employee_id', 'start_datetime', 'end_datetime'), employee_index, start, n_days)
+    pending = _leave_matrix(leaves.filter(status='Pending').values_list('employee_id', 'start_datetime', 'end_datetime'), employee_index, start, n_days)
+
+    after_approved = scheduled & ~approved
+    after_pending = after_approved & ~pending
+
+    # 4. 依部門加總
+    row_dept = np.array([dept_index[dept_id] for _, dept_id, _, _ in employee_rows], dtype=np.intp)
+
+    def by_department(matrix):
+        totals = np.zeros((len(dept_ids), n_days), dtype=np.int64)
+        np.add.at(totals, row_dept, matrix)
+        return totals
+
+    scheduled_totals = by_department(scheduled)
+    approved_totals = by_department(after_approved)
+    pending_totals = by_department(after_pending)
+
+    # 5. 門檻
+    thresholds = np.zeros((len(dept_ids), n_days), dtype=np.int64)
+    if threshold is not None:
+        thresholds[:] = threshold
+    else:
+        weekly_required = np.zeros((len(dept_ids), 7), dtype=np.int64)
+        requirements = StaffingRequirement.objects.filter(department_id__in=[d for d in dept_ids if d is not None])
+        for dept_id, day_of_week, headcount in requirements.values_list('department_id', 'day_of_week', 'required_headcount'):
+            weekly_required[dept_index[dept_id], day_of_week] = headcount
+        thresholds[:] = weekly_required[:, weekdays]
+
+    below = pending_totals < thresholds
+
+    result = []
+    for i, dept_id in enumerate(dept_ids):
+        result.append({
+            'id': dept_id,
+            'name': departments.get(dept_id, departments[None])['name'],
+            'color': departments.get(dept_id, departments[None])['color'],
+            'scheduled': scheduled_totals[i].tolist(),
+            'after_approved': approved_totals[i].tolist(),
+            'after_pending': pending_totals[i].tolist(),
+            'threshold': thresholds[i].tolist(),
+            'below_threshold': below[i].tolist(),
+            'below_threshold_dates': [dates[col] for col in np.flatnonzero(below[i])],
+        })
+
+    return {'start': start, 'end': end, 'dates': dates, 'departments': result}
+
+
+def forecast_from_params(params):
+    """從 GET 參數 (start, weeks, department, threshold) 產生預測，供 API 與後台頁面共用。"""
+    try:
+        start = date.fromisoformat(params['start']) if params.get('start') else date.today()
+        weeks = int(params.get('weeks') or 4)
+        threshold = int(params['threshold']) if params.get('threshold') not in (None, '') else None
+        department_ids = [int(d) for d in params.getlist('department') if d]
+    except ValueError:
+        raise ValueError("參數格式錯誤：start 應為 YYYY-MM-DD，weeks、threshold、department 應為整數。")
+    return forecast_staffing(start, weeks, department_ids=department_ids, threshold=threshold)
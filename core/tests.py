@@ -1,3 +1,1013 @@
-from django.test import TestCase
+import importlib
+import tempfile
+from io import StringIO
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from dateutil.relativedelta import relativedelta
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import PermissionDenied
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError, connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import overtime
+from .accruals import accrue_leave
+from .annual_leave import DIFF_COLUMNS, update_annual_leave
+from .attendance import is_ip_allowed
+from .attendance_archive import archive_attendance
+from .attendance_corrections import apply_week_corrections, build_week_grid
+from .attendance_reconcile import reconcile_open_attendance
+from .comp_leave import expire_comp_leave
+from .holiday_calendars import employee_holiday_maps
+from .holiday_compensation import compensate_holidays
+from .kiosk import KIOSK_EMPLOYEE_MAX_PIN_FAILURES, LOCKED_OUT_ERROR, UNMATCHED_OUT_ERROR, ingest_punches
+from .models import (
+    ArchivedAttendanceRecord, AttendanceCorrection, AttendanceNetworkPolicy, AttendanceRecord, CompensatoryLeaveLot,
+    DailyTimesheet, Department, DutyShift, Employee, HolidayCompensation, KioskDevice, KioskPunch, LeaveAccrual,
+    LeaveBalance, LeaveBalanceAdjustment, LeavePolicy, LeaveRequest, LeaveType, MonthlyAttendanceSummary,
+    OvertimeRequest, PublicHoliday, PunchImport, ScheduleRule, SiteConfiguration, StaffingRequirement, WorkSchedule,
+    YearEndSettlement,
+)
+from .presence import department_presence, team_presence
+from .public_holidays import generate_holidays, upsert_holidays
+from .punch_import import process_punch_imports
+from .roster import resolve_shifts
+from .shift_solver import solve_shifts
+from .staffing import forecast_staffing
+from .timesheets import compute_timesheets, recompute_stale_timesheets, upsert_target
+from .year_end import process_year_end
+
+# 2031-03-03 為星期一
+MONDAY = date(2031, 3, 3)
+
+
+def make_schedule(name='Office', start=time(9, 0), end=time(18, 0), days=range(5)):
+    schedule = WorkSchedule.objects.create(name=name)
+    for day in days:
+        ScheduleRule.objects.create(schedule=schedule, day_of_week=day, start_time=start, end_time=end)
+    return schedule
+
+
+# 個人資料未完成的員工會被 ProfileCompletionMiddleware 導向編輯頁
+COMPLETE_PROFILE = {
+    'gender': 'Other', 'date_of_birth': date(1990, 1, 1), 'nationality': 'TW', 'id_number': 'A123456789',
+    'marital_status': 'Single', 'phone_number': '0900000000', 'emergency_contact_name': 'Contact',
+    'emergency_contact_phone': '0900000001', 'residential_address': 'Taipei',
+}
+
+
+def make_employee(username, hire_date=date(2020, 1, 1), **kwargs):
+    user = User.objects.create_user(username=username, password='pass', first_name=username)
+    return Employee.objects.create(user=user, employee_number=username[:10], hire_date=hire_date, **COMPLETE_PROFILE, **kwargs)
+
+
+def local(day, hour, minute=0):
+    return timezone.make_aware(datetime.combine(day, time(hour, minute)))
+
+
+class TimesheetTests(TestCase):
+    def setUp(self):
+        self.employee = make_employee('ts1', work_schedule=make_schedule())
+
+    def test_range_without_punches(self):
+        written = compute_timesheets(MONDAY, MONDAY + timedelta(days=6), [self.employee.id])
+        self.assertEqual(written, 7)
+        monday = DailyTimesheet.objects.get(employee=self.employee, date=MONDAY)
+        self.assertTrue(monday.is_absent)
+        self.assertEqual(monday.late_minutes, 0)
+        self.assertEqual(monday.scheduled_minutes, 540)
+        self.assertEqual(DailyTimesheet.objects.get(employee=self.employee, date=MONDAY + timedelta(days=5)).day_type, 'rest')
+
+    def test_recompute_stale_after_punches_deleted(self):
+        record = AttendanceRecord.objects.create(employee=self.employee, clock_in=local(MONDAY, 9, 10), clock_out=local(MONDAY, 18))
+        compute_timesheets(MONDAY, MONDAY, [self.employee.id])
+        self.assertEqual(DailyTimesheet.objects.get(employee=self.employee, date=MONDAY).late_minutes, 10)
+
+        record.delete()
+        self.assertTrue(DailyTimesheet.objects.get(employee=self.employee, date=MONDAY).is_stale)
+        self.assertEqual(recompute_stale_timesheets(), 1)
+        timesheet = DailyTimesheet.objects.get(employee=self.employee, date=MONDAY)
+        self.assertFalse(timesheet.is_stale)
+        self.assertTrue(timesheet.is_absent)
+        self.assertEqual(timesheet.worked_minutes, 0)
+
+    def test_saving_the_same_day_twice_updates_the_row(self):
+        record = AttendanceRecord.objects.create(employee=self.employee, clock_in=local(MONDAY, 9, 10), clock_out=local(MONDAY, 18))
+        compute_timesheets(MONDAY, MONDAY, [self.employee.id])
+        AttendanceRecord.objects.filter(pk=record.pk).update(clock_in=local(MONDAY, 9, 30))
+        compute_timesheets(MONDAY, MONDAY, [self.employee.id])
+        self.assertEqual(DailyTimesheet.objects.filter(employee=self.employee, date=MONDAY).count(), 1)
+        self.assertEqual(DailyTimesheet.objects.get(employee=self.employee, date=MONDAY).late_minutes, 30)
+
+    def test_upsert_has_no_conflict_target_on_mysql(self):
+        self.assertEqual(upsert_target(['employee', 'date']), ['employee', 'date'])
+        with mock.patch.object(connection.features, 'supports_update_conflicts_with_target', False):
+            self.assertIsNone(upsert_target(['employee', 'date']))
+
+
+def grid_post(employees, first_day):
+    """模擬主管載入整週修正表後不做任何修改直接送出的表單資料。"""
+    _, rows = build_week_grid(employees, first_day)
+    data = {}
+    for row in rows:
+        for cell in row['cells']:
+            if cell['editable']:
+                for name in ('in', 'out', 'orig_in', 'orig_out', 'version'):
+                    value = cell['clock_' + name] if name in ('in', 'out') else cell[name]
+                    data[f"{name}_{cell['key']}"] = value
+    return data
+
+
+class WeekCorrectionTests(TestCase):
+    def setUp(self):
+        self.manager_user = User.objects.create_user(username='boss', password='pass')
+        self.employee = make_employee('grid1', work_schedule=make_schedule())
+        self.key = f"{self.employee.id}_{MONDAY.isoformat()}"
+
+    def apply(self, data):
+        return apply_week_corrections(self.manager_user, [self.employee], MONDAY, data)
+
+    def test_untouched_cells_keep_punches_made_after_page_load(self):
+        data = grid_post([self.employee], MONDAY)
+        AttendanceRecord.objects.create(employee=self.employee, clock_in=local(MONDAY, 9), clock_out=local(MONDAY, 18))
+        stats, errors, conflicts = self.apply(data)
+        self.assertEqual((errors, conflicts), ([], set()))
+        self.assertEqual(stats, {'created': 0, 'updated': 0, 'deleted': 0})
+        self.assertEqual(AttendanceRecord.objects.filter(employee=self.employee).count(), 1)
+
+    def test_edit_creates_record_with_audit(self):
+        data = grid_post([self.employee], MONDAY)
+        data[f'in_{self.key}'], data[f'out_{self.key}'] = '08:30', '17:30'
+        stats, errors, _ = self.apply(data)
+        self.assertEqual(errors, [])
+        self.assertEqual(stats['created'], 1)
+        record = AttendanceRecord.objects.get(employee=self.employee)
+        self.assertEqual(record.clock_in, local(MONDAY, 8, 30))
+        self.assertEqual(AttendanceCorrection.objects.get(record_id=record.id).action, 'create')
+
+    def test_edit_of_cell_changed_since_load_is_conflict(self):
+        record = AttendanceRecord.objects.create(employee=self.employee, clock_in=local(MONDAY, 9))
+        data = grid_post([self.employee], MONDAY)
+        record.clock_out = local(MONDAY, 18)
+        record.save()
+        # 主管在舊畫面上清空這一格
+        data[f'in_{self.key}'] = data[f'out_{self.key}'] = ''
+        stats, errors, conflicts = self.apply(data)
+        self.assertEqual(conflicts, {self.key})
+        self.assertEqual(len(errors), 1)
+        self.assertTrue(AttendanceRecord.objects.filter(id=record.id, clock_out=local(MONDAY, 18)).exists())
+        self.assertFalse(AttendanceCorrection.objects.exists())
+
+        # 重新顯示時衝突格子為最新記錄，其他格子保留送出的值
+        tuesday_key = f"{self.employee.id}_{(MONDAY + timedelta(days=1)).isoformat()}"
+        data[f'in_{tuesday_key}'] = '10:00'
+        _, rows = build_week_grid([self.employee], MONDAY, data, conflicts)
+        monday, tuesday = rows[0]['cells'][:2]
+        self.assertEqual((monday['clock_in'], monday['clock_out'], monday['conflict']), ('09:00', '18:00', True))
+        self.assertEqual((tuesday['clock_in'], tuesday['orig_in']), ('10:00', ''))
+
+    def test_view_rerenders_posted_values_on_error(self):
+        self.employee.manager = Employee.objects.create(user=self.manager_user, hire_date=date(2020, 1, 1), **COMPLETE_PROFILE)
+        self.employee.save()
+        data = grid_post([self.employee], MONDAY)
+        wednesday_key = f"{self.employee.id}_{(MONDAY + timedelta(days=2)).isoformat()}"
+        data[f'in_{self.key}'], data[f'out_{wednesday_key}'] = '07:45', '18:00' # 週三只有下班時間
+        data['reason'] = '補登'
+        self.client.force_login(self.manager_user)
+        response = self.client.post(f"{reverse('core:attendance_grid')}?week={MONDAY.isoformat()}", data)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'value="07:45"')
+        self.assertContains(response, 'value="補登"')
+        self.assertFalse(AttendanceRecord.objects.exists())
+
+
+class AccrualTests(TestCase):
+    def setUp(self):
+        self.annual = LeaveType.objects.create(name='Annual Leave')
+        self.yearly = LeavePolicy.objects.create(name='Yearly', accrual_frequency='YEARLY', accrual_amount=14, accrual_unit='DAYS')
+
+    def balance(self, employee):
+        return LeaveBalance.objects.get(employee=employee, leave_type=self.annual).balance_hours
+
+    def test_rerun_does_not_credit_twice(self):
+        monthly = LeavePolicy.objects.create(name='Monthly', accrual_frequency='MONTHLY', accrual_amount=8, accrual_unit='HOURS')
+        employee = make_employee('acc1', leave_policy=monthly)
+        self.assertEqual(accrue_leave(as_of=date(2031, 4, 1))['periods'], 1)
+        self.assertEqual(accrue_leave(as_of=date(2031, 4, 1))['periods'], 0)
+        self.assertEqual(self.balance(employee), Decimal('8.00'))
+        # 停機一個月後補上漏掉的期數
+        self.assertEqual(accrue_leave(as_of=date(2031, 6, 1))['periods'], 2)
+        self.assertEqual(self.balance(employee), Decimal('24.00'))
+
+    def test_policy_switch_does_not_credit_the_same_anniversary_again(self):
+        employee = make_employee('acc2', hire_date=date(2020, 3, 3), leave_policy=self.yearly)
+        accrue_leave(as_of=date(2031, 3, 3))
+        self.assertEqual(self.balance(employee), Decimal('112.00'))
+        employee.leave_policy = LeavePolicy.objects.create(name='Yearly B', accrual_frequency='YEARLY', accrual_amount=15, accrual_unit='DAYS')
+        employee.save()
+        self.assertEqual(accrue_leave(as_of=date(2031, 3, 10))['periods'], 0)
+        self.assertEqual(self.balance(employee), Decimal('112.00'))
+
+    def test_cutover_seeds_anniversaries_credited_by_old_command(self):
+        today = date.today()
+        employee = make_employee('acc3', hire_date=today - relativedelta(years=6, days=10), leave_policy=self.yearly)
+        # 舊版指令已在 10 天前的週年日入帳
+        LeaveBalance.objects.create(employee=employee, leave_type=self.annual, balance_hours=Decimal('112.00'))
+        migration = importlib.import_module('core.migrations.0035_leave_accrual')
+        migration.seed_credited_anniversaries(apps, None)
+        self.assertEqual(LeaveAccrual.objects.get(employee=employee).period_start, today - relativedelta(days=10))
+        self.assertEqual(accrue_leave(as_of=today)['periods'], 0)
+        self.assertEqual(self.balance(employee), Decimal('112.00'))
+
+    def test_next_accrual_date_follows_hire_date_without_extra_queries(self):
+        employee = Employee.objects.get(pk=make_employee('acc4', hire_date=date(2020, 3, 3), leave_policy=self.yearly).pk)
+        self.assertEqual((employee.next_accrual_date.month, employee.next_accrual_date.day), (3, 3))
+        employee.phone_number = '0911111111'
+        with CaptureQueriesContext(connection) as queries:
+            employee.save()
+        self.assertFalse([q for q in queries if q['sql'].startswith('SELECT') and 'FROM "core_employee"' in q['sql']])
+        employee.hire_date = date(2020, 5, 5)
+        employee.save()
+        employee.refresh_from_db()
+        self.assertEqual((employee.next_accrual_date.month, employee.next_accrual_date.day), (5, 5))
+
+
+class KioskTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.device = KioskDevice.objects.create(name='Warehouse')
+        self.employee = make_employee('kiosk1', badge_id='B-1')
+        self.employee.set_kiosk_pin('1234')
+        self.employee.save()
+
+    def punch(self, punch_id, hour, direction='', **identity):
+        return {'punch_id': punch_id, 'timestamp': local(MONDAY, hour).isoformat(), 'direction': direction, **(identity or {'badge': 'B-1'})}
+
+    def test_repeated_punch_id_in_batch_is_ingested_once(self):
+        result = ingest_punches(self.device, [self.punch('p1', 9, 'IN'), self.punch('p1', 9, 'IN'), self.punch('p2', 18, 'OUT')])
+        self.assertEqual(sorted(result['accepted']), ['p1', 'p2'])
+        self.assertEqual(result['rejected'], [])
+        record = AttendanceRecord.objects.get(employee=self.employee)
+        self.assertEqual((record.clock_in, record.clock_out), (local(MONDAY, 9), local(MONDAY, 18)))
+        # 重送整批只回報為重複
+        result = ingest_punches(self.device, [self.punch('p1', 9, 'IN'), self.punch('p2', 18, 'OUT')])
+        self.assertEqual((result['accepted'], result['duplicates']), ([], ['p1', 'p2']))
+
+    def test_out_without_in_is_rejected_and_not_recorded(self):
+        result = ingest_punches(self.device, [self.punch('p3', 18, 'OUT')])
+        self.assertEqual(result['accepted'], [])
+        self.assertEqual(result['rejected'], [{'punch_id': 'p3', 'error': UNMATCHED_OUT_ERROR}])
+        self.assertFalse(KioskPunch.objects.exists())
+        self.assertFalse(AttendanceRecord.objects.exists())
+
+    def test_pin_failures_lock_out_employee(self):
+        wrong = [self.punch(f'w{i}', 9, employee_number='kiosk1', pin='0000') for i in range(KIOSK_EMPLOYEE_MAX_PIN_FAILURES)]
+        ingest_punches(self.device, wrong)
+        result = ingest_punches(self.device, [self.punch('ok', 9, 'IN', employee_number='kiosk1', pin='1234')])
+        self.assertEqual(result['rejected'], [{'punch_id': 'ok', 'error': LOCKED_OUT_ERROR}])
+        # 卡號打卡不受 PIN 鎖定影響
+        self.assertEqual(ingest_punches(self.device, [self.punch('badge', 9, 'IN')])['accepted'], ['badge'])
+
+
+class HolidayRegionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.annual = LeaveType.objects.create(name='Annual Leave')
+        policy = LeavePolicy.objects.create(name='Default')
+        schedule = make_schedule()
+        self.department = Department.objects.create(name='Penang', holiday_region='MY-14')
+        self.hk = make_employee('hk1', leave_policy=policy, work_schedule=schedule)
+        self.my = make_employee('my1', leave_policy=policy, work_schedule=schedule, department=self.department)
+        # 兩個假期都落在休息日
+        self.hk_holiday = PublicHoliday.objects.create(region='HK', name='HK Day', date=MONDAY + timedelta(days=5))
+        self.my_holiday = PublicHoliday.objects.create(region='MY-14', name='Penang Day', date=MONDAY + timedelta(days=6))
+
+    def compensated(self):
+        return set(HolidayCompensation.objects.values_list('employee_id', 'holiday_id'))
+
+    def test_each_employee_uses_their_region_calendar(self):
+        maps = employee_holiday_maps([self.hk, self.my], MONDAY, MONDAY + timedelta(days=6))
+        self.assertEqual(list(maps[self.hk.id].values()), ['HK Day'])
+        self.assertEqual(list(maps[self.my.id].values()), ['Penang Day'])
+
+        compensate_holidays(year=2031, today=date(2031, 1, 1))
+        self.assertEqual(self.compensated(), {(self.hk.id, self.hk_holiday.id), (self.my.id, self.my_holiday.id)})
+        self.assertEqual(LeaveBalance.objects.get(employee=self.my, leave_type=self.annual).balance_hours, Decimal('8.00'))
+
+    def test_region_change_moves_future_compensation(self):
+        compensate_holidays(year=2031, today=date(2031, 1, 1))
+        self.department.holiday_region = ''
+        self.department.save() # signal 讓行事曆快取失效
+        compensate_holidays(year=2031, today=date(2031, 1, 1))
+        self.assertEqual(self.compensated(), {(self.hk.id, self.hk_holiday.id), (self.my.id, self.hk_holiday.id)})
+        self.assertEqual(LeaveBalance.objects.get(employee=self.my, leave_type=self.annual).balance_hours, Decimal('8.00'))
+
+
+class InterviewDurationTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='hr', password='pass', is_staff=True)
+        self.client.force_login(self.user)
+
+    def test_non_positive_duration_is_rejected(self):
+        interviewer = make_employee('iv1')
+        for duration in ('0', '-30'):
+            response = self.client.get(reverse('core:interview_slots_api'), {'interviewers': interviewer.id, 'duration': duration})
+            self.assertEqual(response.status_code, 400)
+
+
+class LegacyAllowlistTests(TestCase):
+    def setUp(self):
+        cache.clear()
+
+    def configure(self, raw):
+        SiteConfiguration(allowed_ip_addresses=raw).save() # signal 讓快取的策略失效
+
+    def test_empty_allowlist_allows_everyone(self):
+        self.configure('')
+        self.assertTrue(is_ip_allowed('198.51.100.7'))
+
+    def test_invalid_entries_are_skipped(self):
+        self.configure('10.0.0.0/8, not-an-ip')
+        with self.assertLogs('core.attendance', 'WARNING'):
+            self.assertTrue(is_ip_allowed('10.1.2.3'))
+        self.assertFalse(is_ip_allowed('198.51.100.7'))
+
+    def test_allowlist_without_valid_entries_fails_closed(self):
+        self.configure('not-an-ip, 999.1.1.1')
+        with self.assertLogs('core.attendance', 'ERROR'):
+            self.assertFalse(is_ip_allowed('10.1.2.3'))
+
+
+class NetworkPolicyTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.department = Department.objects.create(name='Branch')
+
+    def test_malformed_department_policy_denies_that_department(self):
+        AttendanceNetworkPolicy.objects.create(name='Branch', department=self.department, networks='10.0.0.0/8, 10.0.0.300')
+        with self.assertLogs('core.attendance', 'ERROR'):
+            self.assertFalse(is_ip_allowed('10.1.2.3', self.department.id))
+        # 其他部門不受影響 (沒有任何限制)
+        self.assertTrue(is_ip_allowed('10.1.2.3', None))
+
+    def test_malformed_company_policy_keeps_valid_policies(self):
+        AttendanceNetworkPolicy.objects.create(name='HQ', networks='192.0.2.0/24')
+        AttendanceNetworkPolicy.objects.create(name='Typo', networks='198.51.100.0/33')
+        with self.assertLogs('core.attendance', 'ERROR'):
+            self.assertTrue(is_ip_allowed('192.0.2.10'))
+        self.assertFalse(is_ip_allowed('198.51.100.7'))
+        self.assertFalse(is_ip_allowed('203.0.113.1', self.department.id))
+
+
+class OvertimeGenerationTests(TestCase):
+    def setUp(self):
+        self.employee = make_employee('ot1', work_schedule=make_schedule())
+        AttendanceRecord.objects.create(employee=self.employee, clock_in=local(MONDAY, 9), clock_out=local(MONDAY, 21))
+        compute_timesheets(MONDAY, MONDAY, [self.employee.id])
+
+    def test_one_auto_request_per_day_even_when_runs_overlap(self):
+        rows = overtime.find_unclaimed_overtime(MONDAY, MONDAY)
+        self.assertEqual(overtime.generate_overtime_requests(MONDAY, MONDAY, notify=False)['created'], 1)
+        # 模擬另一個批次在這個批次寫入前就查好了同樣的資料
+        with mock.patch.object(overtime, 'find_unclaimed_overtime', return_value=rows):
+            self.assertEqual(overtime.generate_overtime_requests(MONDAY, MONDAY, notify=False)['created'], 0)
+        request = OvertimeRequest.objects.get(employee=self.employee, date=MONDAY)
+        self.assertEqual((request.hours, request.auto_date), (Decimal('3.00'), MONDAY))
+
+    def test_auto_date_is_a_real_unique_key(self):
+        overtime.generate_overtime_requests(MONDAY, MONDAY, notify=False)
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            OvertimeRequest.objects.create(employee=self.employee, date=MONDAY, hours=1, reason='dup', is_auto_generated=True)
+        # 一般申請 (auto_date 為 NULL) 不受限制
+        OvertimeRequest.objects.create(employee=self.employee, date=MONDAY, hours=1, reason='manual')
+        OvertimeRequest.objects.create(employee=self.employee, date=MONDAY, hours=1, reason='manual')
+        self.assertEqual(OvertimeRequest.objects.filter(employee=self.employee, date=MONDAY).count(), 3)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp())
+class PunchImportQueueTests(TestCase):
+    def test_admin_upload_is_queued_and_imported_in_background(self):
+        employee = make_employee('imp1')
+        admin_user = User.objects.create_superuser(username='admin', password='pass')
+        self.client.force_login(admin_user)
+        csv_file = SimpleUploadedFile('punches.csv', (
+            "employee,timestamp,direction\n"
+            f"imp1,{MONDAY} 09:00:00,IN\n"
+            f"imp1,{MONDAY} 18:00:00,OUT\n"
+            f"nobody,{MONDAY} 09:00:00,IN\n"
+        ).encode())
+        response = self.client.post(reverse('admin:core_attendancerecord_import_punches'), {'csv_file': csv_file})
+        self.assertRedirects(response, reverse('admin:core_punchimport_changelist'))
+        job = PunchImport.objects.get()
+        self.assertEqual(job.status, 'Pending')
+        self.assertFalse(AttendanceRecord.objects.exists())
+
+        self.assertEqual([j.id for j in process_punch_imports()], [job.id])
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'Done')
+        self.assertEqual((job.stats['rows'], job.stats['created'], job.stats['unknown_employee']), (3, 1, 1))
+        self.assertTrue(AttendanceRecord.objects.filter(employee=employee, clock_out=local(MONDAY, 18)).exists())
+        self.assertEqual(process_punch_imports(), [])
+
+
+class PolicySimulatorTests(TestCase):
+    def test_huge_years_of_service_is_a_bad_request(self):
+        policy = LeavePolicy.objects.create(name='Sim')
+        self.client.force_login(User.objects.create_user(username='hr2', password='pass', is_staff=True))
+        url = reverse('core:leave_policy_simulate_api', args=[policy.id])
+        for years in ('99999999999999999999', '101'):
+            body = {'rules': [{'years_of_service': years, 'rule_type': 'ADD', 'adjustment_amount': 1}]}
+            response = self.client.post(url, body, content_type='application/json')
+            self.assertEqual(response.status_code, 400)
+        body = {'rules': [{'years_of_service': '100', 'rule_type': 'ADD', 'adjustment_amount': 1}]}
+        self.assertEqual(self.client.post(url, body, content_type='application/json').status_code, 200)
+
+
+class YearEndTests(TestCase):
+    def setUp(self):
+        self.annual = LeaveType.objects.create(name='Annual Leave')
+        self.policy = LeavePolicy.objects.create(
+            name='Carry 16h', accrual_unit='HOURS', fiscal_year_start_month=1, allow_carry_over=True, max_carry_over_amount=16,
+        )
+        self.employee = make_employee('ye1', leave_policy=self.policy)
+        LeaveBalance.objects.create(employee=self.employee, leave_type=self.annual, balance_hours=Decimal('40.00'))
+
+    def test_settles_each_fiscal_year_once(self):
+        rows = process_year_end(today=date(2031, 1, 5))
+        self.assertEqual([(row['carried_over_hours'], row['forfeited_hours']) for row in rows], [(Decimal('16.00'), Decimal('24.00'))])
+        self.assertEqual(LeaveBalance.objects.get(employee=self.employee).balance_hours, Decimal('16.00'))
+        self.assertIsNotNone(YearEndSettlement.objects.get(policy=self.policy, fiscal_year=2030).completed_at)
+
+        # 同一年度再次執行 (例如排程重試) 不會再作廢
+        self.assertEqual(process_year_end(today=date(2031, 1, 6)), [])
+        self.assertEqual(LeaveBalance.objects.get(employee=self.employee).balance_hours, Decimal('16.00'))
+        self.assertEqual(LeaveBalanceAdjustment.objects.filter(employee=self.employee).count(), 1)
+
+    def test_preview_writes_nothing(self):
+        self.assertEqual(len(process_year_end(today=date(2031, 1, 5), preview=True)), 1)
+        self.assertEqual(LeaveBalance.objects.get(employee=self.employee).balance_hours, Decimal('40.00'))
+        self.assertFalse(YearEndSettlement.objects.exists())
+
+
+class CompLeaveTests(TestCase):
+    def setUp(self):
+        policy = LeavePolicy.objects.create(name='Comp 3m', comp_leave_expiry_months=3)
+        self.employee = make_employee('cl1', leave_policy=policy)
+        overtime.approve_overtime_requests([
+            OvertimeRequest.objects.create(employee=self.employee, date=date(2031, 1, 10), hours=4, reason='OT'),
+            OvertimeRequest.objects.create(employee=self.employee, date=date(2031, 2, 10), hours=4, reason='OT'),
+        ])
+        self.comp = LeaveType.objects.get(name='Compensatory')
+
+    def remaining(self):
+        return list(CompensatoryLeaveLot.objects.order_by('earned_on').values_list('remaining_hours', flat=True))
+
+    def take(self, hours, status='Approved'):
+        start = local(date(2031, 3, 3), 9)
+        return LeaveRequest.objects.create(
+            employee=self.employee, leave_type=self.comp, start_datetime=start,
+            end_datetime=start + timedelta(hours=hours), reason='Comp', status=status,
+        )
+
+    def test_lots_are_consumed_oldest_first_and_restored_newest_first(self):
+        self.assertEqual(list(CompensatoryLeaveLot.objects.order_by('earned_on').values_list('expiry_date', flat=True)), [date(2031, 4, 10), date(2031, 5, 10)])
+        leave = self.take(6)
+        self.assertEqual(self.remaining(), [Decimal('0.00'), Decimal('2.00')])
+
+        leave.status = 'Rejected'
+        leave.save()
+        self.assertEqual(self.remaining(), [Decimal('4.00'), Decimal('4.00')])
+
+        pending = self.take(3, status='Pending')
+        self.assertEqual(self.remaining(), [Decimal('4.00'), Decimal('4.00')])
+        pending.status = 'Approved'
+        pending.save()
+        self.assertEqual(self.remaining(), [Decimal('1.00'), Decimal('4.00')])
+        pending.delete()
+        self.assertEqual(self.remaining(), [Decimal('4.00'), Decimal('4.00')])
+
+    def test_expiry_forfeits_only_the_remaining_hours_of_due_lots(self):
+        self.take(3)
+        self.assertEqual(expire_comp_leave(date(2031, 4, 9)), [])
+
+        rows = expire_comp_leave(date(2031, 4, 10))
+        self.assertEqual([row['expired_hours'] for row in rows], [Decimal('1.00')])
+        self.assertEqual(self.remaining(), [Decimal('0.00'), Decimal('4.00')])
+        self.assertEqual(LeaveBalance.objects.get(employee=self.employee, leave_type=self.comp).balance_hours, Decimal('7.00'))
+        self.assertEqual(LeaveBalanceAdjustment.objects.get(employee=self.employee).hours_changed, Decimal('-1.00'))
+        # 再次執行不會重複作廢
+        self.assertEqual(expire_comp_leave(date(2031, 4, 10)), [])
+
+
+class LeaveProjectionTests(TestCase):
+    def setUp(self):
+        self.annual = LeaveType.objects.create(name='Annual Leave')
+        policy = LeavePolicy.objects.create(name='No accrual', accrual_amount=0, accrual_unit='HOURS')
+        self.employee = make_employee('lp1', leave_policy=policy)
+        LeaveBalance.objects.create(employee=self.employee, leave_type=self.annual, balance_hours=Decimal('8.00'))
+        self.client.force_login(self.employee.user)
+
+    def apply(self, hours):
+        start = datetime.combine(date.today() + timedelta(days=7), time(9, 0))
+        return self.client.post(reverse('core:leave_apply'), {
+            'leave_type': self.annual.id, 'start_datetime': start.strftime('%Y-%m-%dT%H:%M'),
+            'end_datetime': (start + timedelta(hours=hours)).strftime('%Y-%m-%dT%H:%M'), 'reason': 'Trip',
+        })
+
+    def test_request_over_projected_balance_is_rejected(self):
+        response = self.apply(12)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('不足 4', response.content.decode())
+        self.assertFalse(LeaveRequest.objects.exists())
+
+    def test_request_within_projected_balance_is_saved(self):
+        self.assertEqual(self.apply(6).status_code, 302)
+        self.assertEqual(LeaveRequest.objects.get().duration_hours, Decimal('6.00'))
+
+
+class AttendanceArchiveTests(TestCase):
+    def setUp(self):
+        self.employee = make_employee('ar1', work_schedule=make_schedule())
+
+    def test_corrected_records_are_summarised_and_archived_with_their_flags(self):
+        record = AttendanceRecord.objects.create(
+            employee=self.employee, clock_in=local(MONDAY, 9, 15), clock_out=local(MONDAY, 18), is_auto_closed=True,
+        )
+        correction = AttendanceCorrection.objects.create(employee=self.employee, record=record, date=MONDAY, action='update')
+        kept = AttendanceRecord.objects.create(employee=self.employee, clock_in=local(MONDAY + timedelta(days=90), 9), clock_out=local(MONDAY + timedelta(days=90), 18))
+
+        results = archive_attendance(today=MONDAY + timedelta(days=90))
+        self.assertEqual(results[(2031, 3)], 1)
+        self.assertEqual(list(AttendanceRecord.objects.values_list('id', flat=True)), [kept.id])
+        archived = ArchivedAttendanceRecord.objects.get(original_id=record.id)
+        self.assertTrue(archived.is_auto_closed)
+        self.assertFalse(archived.needs_review)
+        correction.refresh_from_db()
+        self.assertIsNone(correction.record_id)
+
+        summary = MonthlyAttendanceSummary.objects.get(employee=self.employee, year=2031, month=3)
+        self.assertEqual((summary.present_days, summary.late_days, summary.late_minutes), (1, 1, 15))
+        # 再次執行時已沒有需要封存的記錄
+        self.assertEqual(archive_attendance(today=MONDAY + timedelta(days=90)), {})
+
+
+class ShiftSolverTests(TestCase):
+    def setUp(self):
+        self.department = Department.objects.create(name='Store')
+        self.schedule = make_schedule()
+        self.staff = [make_employee(f'ss{i}', department=self.department, work_schedule=self.schedule) for i in range(3)]
+        self.annual = LeaveType.objects.create(name='Annual Leave')
+
+    def require(self, weekdays, headcount=1):
+        for weekday in weekdays:
+            StaffingRequirement.objects.create(
+                department=self.department, day_of_week=weekday, start_time=time(9), end_time=time(18), required_headcount=headcount,
+            )
+
+    def take_leave(self, employee, day):
+        LeaveRequest.objects.create(
+            employee=employee, leave_type=self.annual, start_datetime=local(day, 9), end_datetime=local(day, 18),
+            reason='Off', status='Approved',
+        )
+
+    def solve(self):
+        return solve_shifts(Employee.objects.filter(department=self.department), MONDAY, MONDAY + timedelta(days=6))
+
+    def test_default_schedule_counts_as_on_duty(self):
+        self.require(range(5), headcount=2)
+        self.assertEqual(self.solve(), ({}, []))
+
+    def test_weekly_limit_includes_default_workdays(self):
+        self.require(range(7))
+        assignments, shortfalls = self.solve()
+        self.assertEqual(assignments, {})
+        self.assertEqual([shortfall['date'] for shortfall in shortfalls], [MONDAY + timedelta(days=5), MONDAY + timedelta(days=6)])
+        for (employee_id, day), shift in assignments.items():
+            DutyShift.objects.create(employee_id=employee_id, date=day, start_time=shift[0], end_time=shift[1])
+        worked = resolve_shifts(self.staff, MONDAY, MONDAY + timedelta(days=6))
+        for employee in self.staff:
+            self.assertLessEqual(sum(1 for employee_id, _ in worked if employee_id == employee.id), 5)
+
+    def test_consecutive_limit_includes_default_workdays(self):
+        self.schedule.max_consecutive_work_days = 4
+        self.schedule.save()
+        first, second, third = self.staff
+        saturday = MONDAY + timedelta(days=5)
+        # 週一休假：週二到週五已連續 4 天，週六不能再排
+        self.take_leave(first, MONDAY)
+        # 週三休假：週四、週五加上週六只有 3 天
+        self.take_leave(second, MONDAY + timedelta(days=2))
+        self.require([5])
+        assignments, shortfalls = self.solve()
+        self.assertEqual(list(assignments), [(second.id, saturday)])
+        self.assertEqual(shortfalls, [])
+        # 週日之後接著下週一到週五的預設班次，對 first 而言會連續 6 天
+        self.require([6])
+        assignments, shortfalls = self.solve()
+        self.assertNotIn((first.id, saturday + timedelta(days=1)), assignments)
+        self.assertNotIn((third.id, saturday), assignments)
+
+
+LOAD_TEST_MODULE = 'core.management.commands.clock_load_test'
+
+
+class SerialExecutor:
+    def __init__(self, max_workers=None):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def map(self, fn, items):
+        return map(fn, items)
+
+
+@override_settings(ALLOWED_HOSTS=['.hrm.example.com'])
+class ClockLoadTestCommandTests(TestCase):
+    def setUp(self):
+        self.employees = [make_employee(f'lt{i}') for i in range(2)]
+
+    def test_in_process_run_uses_an_allowed_host_and_cleans_up(self):
+        out = StringIO()
+        # 測試資料庫在交易中，打卡改在同一個執行緒依序執行
+        with mock.patch(f'{LOAD_TEST_MODULE}.ThreadPoolExecutor', SerialExecutor), mock.patch(f'{LOAD_TEST_MODULE}.connection'):
+            call_command('clock_load_test', employees=2, threads=1, double_tap=True, stdout=out)
+        self.assertIn('Status codes: {200: 4}', out.getvalue())
+        self.assertIn('2 records opened', out.getvalue())
+        self.assertFalse(AttendanceRecord.objects.exists())
+
+    def test_rejected_punches_fail_the_command(self):
+        with mock.patch('core.views.toggle_clock', side_effect=PermissionDenied('blocked')):
+            with self.assertRaisesMessage(CommandError, '2 of 2 punches did not return 200'):
+                call_command('clock_load_test', employees=2, threads=1, stdout=StringIO())
+
+
+class HolidayCompensationTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.annual = LeaveType.objects.create(name='Annual Leave')
+        self.schedule = make_schedule()
+        self.employee = make_employee('hc1', leave_policy=LeavePolicy.objects.create(name='Default'), work_schedule=self.schedule)
+        # 2032-03-06 為星期六
+        self.holiday = PublicHoliday.objects.create(region='HK', name='Next Year Day', date=date(2032, 3, 6))
+        PublicHoliday.objects.create(region='HK', name='This Year Day', date=date(2031, 10, 4))
+
+    def balance(self):
+        return LeaveBalance.objects.get(employee=self.employee, leave_type=self.annual).balance_hours
+
+    def test_rerun_without_changes_writes_nothing(self):
+        self.assertEqual(len(compensate_holidays(year=2031, today=date(2031, 6, 1))), 1)
+        self.assertEqual(compensate_holidays(year=2031, today=date(2031, 6, 1)), [])
+        self.assertEqual(self.balance(), Decimal('8.00'))
+
+    def test_schedule_change_seen_by_another_year_still_updates_this_year(self):
+        compensate_holidays(year=2032, today=date(2031, 6, 1))
+        self.assertTrue(HolidayCompensation.objects.filter(employee=self.employee, holiday=self.holiday).exists())
+
+        # 改為週六上班後，先執行今年的補償 (會記下新的班表摘要)
+        ScheduleRule.objects.create(schedule=self.schedule, day_of_week=5, start_time=time(9), end_time=time(18))
+        compensate_holidays(year=2031, today=date(2031, 6, 1))
+        changes = compensate_holidays(year=2032, today=date(2031, 6, 1))
+        self.assertEqual([(change['holiday'], change['new_hours']) for change in changes], [('Next Year Day', Decimal('0.00'))])
+        self.assertFalse(HolidayCompensation.objects.filter(employee=self.employee, holiday=self.holiday).exists())
+        self.assertEqual(self.balance(), Decimal('0.00'))
+
+
+class CalendarFeedTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.manager = make_employee('cal0', work_schedule=make_schedule())
+        self.employee = make_employee('cal1', work_schedule=self.manager.work_schedule, manager=self.manager)
+        self.url = reverse('core:calendar_feed', args=[self.employee.calendar_token])
+
+    def test_feed_lists_shifts_and_answers_304_until_the_roster_changes(self):
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/calendar; charset=utf-8')
+        body = response.content.decode()
+        self.assertTrue(body.startswith('BEGIN:VCALENDAR\r\n'))
+        self.assertIn(f'UID:shift-{self.employee.id}-', body)
+        etag = response['ETag']
+
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        saturday = timezone.localdate() + timedelta(days=5 - timezone.localdate().weekday() + 7)
+        DutyShift.objects.create(employee=self.employee, date=saturday, start_time=time(10), end_time=time(16))
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertIn(f'UID:shift-{self.employee.id}-{saturday:%Y%m%d}@hrm', response.content.decode())
+
+    def test_team_feed_names_each_report(self):
+        make_employee('cal2', work_schedule=self.manager.work_schedule, manager=self.manager)
+        body = self.client.get(reverse('core:team_calendar_feed', args=[self.manager.calendar_token])).content.decode()
+        self.assertTrue('SUMMARY:cal1 上班' in body and 'SUMMARY:cal2 上班' in body)
+        self.assertFalse(f'UID:shift-{self.manager.id}-' in body)
+
+    def test_unknown_token_is_404(self):
+        self.assertEqual(self.client.get(reverse('core:calendar_feed', args=['00000000-0000-0000-0000-000000000000'])).status_code, 404)
+
+
+class StaffingForecastTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.department = Department.objects.create(name='Front desk')
+        schedule = make_schedule()
+        self.first = make_employee('sf1', department=self.department, work_schedule=schedule)
+        self.second = make_employee('sf2', department=self.department, work_schedule=schedule)
+        StaffingRequirement.objects.create(department=self.department, day_of_week=0, start_time=time(9), end_time=time(18), required_headcount=2)
+        annual = LeaveType.objects.create(name='Annual Leave')
+        LeaveRequest.objects.create(
+            employee=self.first, leave_type=annual, start_datetime=local(MONDAY + timedelta(days=1), 9),
+            end_datetime=local(MONDAY + timedelta(days=1), 18), reason='Off', status='Approved',
+        )
+        LeaveRequest.objects.create(
+            employee=self.second, leave_type=annual, start_datetime=local(MONDAY, 9),
+            end_datetime=local(MONDAY, 18), reason='Off', status='Pending',
+        )
+        # 週三為國定假日，只有手動排班的員工上班
+        PublicHoliday.objects.create(region='HK', name='Midweek', date=MONDAY + timedelta(days=2))
+        DutyShift.objects.create(employee=self.second, date=MONDAY + timedelta(days=2), start_time=time(9), end_time=time(18))
+
+    def test_daily_headcount_and_shortfalls(self):
+        department = forecast_staffing(MONDAY, 1, department_ids=[self.department.id])['departments'][0]
+        self.assertEqual(department['scheduled'], [2, 2, 1, 2, 2, 0, 0])
+        self.assertEqual(department['after_approved'], [2, 1, 1, 2, 2, 0, 0])
+        self.assertEqual(department['after_pending'], [1, 1, 1, 2, 2, 0, 0])
+        self.assertEqual(department['threshold'], [2, 0, 0, 0, 0, 0, 0])
+        self.assertEqual(department['below_threshold_dates'], [MONDAY])
+
+    def test_explicit_threshold_applies_to_every_day(self):
+        department = forecast_staffing(MONDAY, 1, threshold=2)['departments'][0]
+        self.assertEqual(len(department['below_threshold_dates']), 5)
+
+    def test_api_is_staff_only_and_validates_parameters(self):
+        url = reverse('core:staffing_forecast_api')
+        self.client.force_login(self.first.user)
+        self.assertEqual(self.client.get(url).status_code, 403)
+        self.client.force_login(User.objects.create_user(username='hr3', password='pass', is_staff=True))
+        self.assertEqual(self.client.get(url, {'weeks': 'many'}).status_code, 400)
+        response = self.client.get(url, {'start': MONDAY.isoformat(), 'weeks': 1, 'department': self.department.id})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['departments'][0]['after_pending'], [1, 1, 1, 2, 2, 0, 0])
+
+
+class DutyRosterApiTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        schedule = make_schedule()
+        self.staff = [make_employee(f'dr{i}', work_schedule=schedule) for i in range(3)]
+        self.client.force_login(self.staff[0].user)
+        self.url = reverse('core:duty_roster_api')
+
+    def test_pages_with_a_cursor(self):
+        first = self.client.get(self.url, {'week': (MONDAY + timedelta(days=3)).isoformat(), 'limit': 2}).json()
+        self.assertEqual(first['week_start'], MONDAY.isoformat())
+        self.assertEqual([row['id'] for row in first['employees']], [emp.id for emp in self.staff[:2]])
+        self.assertEqual(first['next_cursor'], self.staff[1].id)
+        statuses = first['employees'][0]['weekly_status']
+        self.assertEqual((statuses[0]['label'], statuses[5]['type']), ('09:00-18:00', 'rest'))
+
+        second = self.client.get(self.url, {'week': MONDAY.isoformat(), 'limit': 2, 'cursor': first['next_cursor']}).json()
+        self.assertEqual([row['id'] for row in second['employees']], [self.staff[2].id])
+        self.assertIsNone(second['next_cursor'])
+
+    def test_etag_revalidates_until_the_roster_changes(self):
+        params = {'week': MONDAY.isoformat()}
+        etag = self.client.get(self.url, params)['ETag']
+        self.assertEqual(self.client.get(self.url, params, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        DutyShift.objects.create(employee=self.staff[0], date=MONDAY, start_time=time(12), end_time=time(20))
+        response = self.client.get(self.url, params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['employees'][0]['weekly_status'][0]['label'], '12:00-20:00')
+
+    def test_invalid_parameters_are_rejected(self):
+        self.assertEqual(self.client.get(self.url, {'limit': 'all'}).status_code, 400)
+
+
+class ClockApiTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.employee = make_employee('ck1')
+        self.url = reverse('core:clock_api')
+
+    def test_requires_login_and_post(self):
+        self.assertEqual(self.client.post(self.url).status_code, 401)
+        self.client.force_login(self.employee.user)
+        self.assertEqual(self.client.get(self.url).status_code, 405)
+
+    def test_double_tap_does_not_open_a_second_record(self):
+        self.client.force_login(self.employee.user)
+        first = self.client.post(self.url).json()
+        second = self.client.post(self.url).json()
+        self.assertEqual((first['status'], first['duplicate']), ('clocked_in', False))
+        self.assertEqual((second['status'], second['duplicate'], second['id']), ('clocked_in', True, first['id']))
+        self.assertEqual(AttendanceRecord.objects.filter(employee=self.employee).count(), 1)
+
+        AttendanceRecord.objects.filter(pk=first['id']).update(clock_in=timezone.now() - timedelta(hours=8))
+        out = self.client.post(self.url).json()
+        self.assertEqual((out['status'], out['duplicate'], out['id']), ('clocked_out', False, first['id']))
+        self.assertEqual(self.client.post(self.url).json()['duplicate'], True)
+
+    def test_forgotten_clock_out_is_flagged_and_a_new_shift_opened(self):
+        stale = AttendanceRecord.objects.create(employee=self.employee, clock_in=timezone.now() - timedelta(hours=30))
+        self.client.force_login(self.employee.user)
+        response = self.client.post(self.url).json()
+        self.assertEqual(response['status'], 'clocked_in')
+        self.assertNotEqual(response['id'], stale.id)
+        stale.refresh_from_db()
+        self.assertTrue(stale.needs_review)
+        self.assertIsNone(stale.clock_out)
+
+    def test_ip_outside_the_network_policy_is_forbidden(self):
+        AttendanceNetworkPolicy.objects.create(name='HQ', networks='192.0.2.0/24')
+        self.client.force_login(self.employee.user)
+        self.assertEqual(self.client.post(self.url, REMOTE_ADDR='198.51.100.7').status_code, 403)
+        self.assertEqual(self.client.post(self.url, REMOTE_ADDR='192.0.2.10').status_code, 200)
+
+
+class PresenceTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.department = Department.objects.create(name='Ops')
+        self.manager = make_employee('pm1', department=self.department)
+        self.first = make_employee('pr1', department=self.department, manager=self.manager)
+        self.second = make_employee('pr2', department=self.department, manager=self.manager)
+        self.url = reverse('core:presence_api')
+
+    def clock_in(self, employee, hours_ago=1):
+        with self.captureOnCommitCallbacks(execute=True):
+            return AttendanceRecord.objects.create(employee=employee, clock_in=timezone.now() - timedelta(hours=hours_ago))
+
+    def test_clock_events_update_the_counts_incrementally(self):
+        record = self.clock_in(self.first)
+        self.assertEqual(department_presence([self.department.id]), {self.department.id: 1})
+
+        self.clock_in(self.second)
+        presence = team_presence([self.first, self.second])
+        self.assertEqual(presence[self.first.id], record.clock_in)
+        self.assertEqual(department_presence([self.department.id]), {self.department.id: 2})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            record.clock_out = timezone.now()
+            record.save()
+        self.assertIsNone(team_presence([self.first])[self.first.id])
+        self.assertEqual(department_presence([self.department.id]), {self.department.id: 1})
+
+    def test_rebuild_after_cache_loss_skips_records_needing_review(self):
+        self.clock_in(self.first)
+        stale = self.clock_in(self.second, hours_ago=30)
+        AttendanceRecord.objects.filter(pk=stale.pk).update(needs_review=True)
+
+        cache.clear()
+        presence = team_presence([self.first, self.second])
+        self.assertIsNotNone(presence[self.first.id])
+        self.assertIsNone(presence[self.second.id])
+        self.assertEqual(department_presence([self.department.id]), {self.department.id: 1})
+
+    def test_api_shows_the_managers_team(self):
+        self.clock_in(self.first)
+        self.client.force_login(self.manager.user)
+        board = self.client.get(self.url).json()
+        self.assertEqual(board['present'], 1)
+        self.assertEqual({member['id']: member['clocked_in'] for member in board['team']}, {self.first.id: True, self.second.id: False})
+
+        self.client.force_login(self.first.user)
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+
+class AttendanceReconcileTests(TestCase):
+    def setUp(self):
+        self.manager = make_employee('rm1')
+        self.manager.user.email = 'rm1@example.com'
+        self.manager.user.save()
+        self.scheduled = make_employee('rc1', work_schedule=make_schedule(), manager=self.manager)
+        self.unscheduled = make_employee('rc2', work_schedule=make_schedule('Tue-Fri', days=range(1, 5)), manager=self.manager)
+        self.closable = AttendanceRecord.objects.create(employee=self.scheduled, clock_in=local(MONDAY, 9))
+        self.flaggable = AttendanceRecord.objects.create(employee=self.unscheduled, clock_in=local(MONDAY, 9))
+        self.now = local(MONDAY + timedelta(days=1), 9)
+
+    def test_dry_run_changes_nothing(self):
+        stats = reconcile_open_attendance(now=self.now, dry_run=True)
+        self.assertEqual(stats, {'closed': 1, 'flagged': 1, 'notified': 0})
+        self.assertFalse(AttendanceRecord.objects.filter(clock_out__isnull=False).exists())
+        self.assertFalse(AttendanceRecord.objects.filter(needs_review=True).exists())
+
+    def test_closes_at_shift_end_flags_the_rest_and_emails_each_manager_once(self):
+        timesheet = DailyTimesheet.objects.create(employee=self.scheduled, date=MONDAY, day_type='work')
+        DailyTimesheet.objects.filter(pk=timesheet.pk).update(is_stale=False)
+        # 班次尚未結束的記錄不處理
+        ongoing = AttendanceRecord.objects.create(employee=self.scheduled, clock_in=local(MONDAY + timedelta(days=1), 8))
+
+        with mock.patch('core.attendance_reconcile.send_batch', return_value=1) as send:
+            stats = reconcile_open_attendance(now=self.now)
+        self.assertEqual(stats, {'closed': 1, 'flagged': 1, 'notified': 1})
+
+        self.closable.refresh_from_db()
+        self.assertEqual(self.closable.clock_out, local(MONDAY, 18))
+        self.assertTrue(self.closable.is_auto_closed)
+        self.flaggable.refresh_from_db()
+        self.assertTrue(self.flaggable.needs_review)
+        self.assertIsNone(self.flaggable.clock_out)
+        ongoing.refresh_from_db()
+        self.assertIsNone(ongoing.clock_out)
+        timesheet.refresh_from_db()
+        self.assertTrue(timesheet.is_stale)
+
+        (messages,), _ = send.call_args
+        self.assertEqual(len(messages), 1)
+        self.assertEqual(messages[0][2], 'rm1@example.com')
+
+        # 再跑一次不會重複處理
+        self.assertEqual(reconcile_open_attendance(now=self.now, notify=False), {'closed': 0, 'flagged': 0, 'notified': 0})
+
+
+class AnnualLeaveUpdateTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.annual = LeaveType.objects.create(name='Annual Leave')
+        policy = LeavePolicy.objects.create(name='14 days', accrual_amount=14, accrual_unit='DAYS')
+        self.employee = make_employee('al1', leave_policy=policy, work_schedule=make_schedule())
+        LeaveBalance.objects.create(employee=self.employee, leave_type=self.annual, balance_hours=Decimal('50.00'))
+        # 2031-10-04 為星期六：補償一天 8 小時
+        PublicHoliday.objects.create(region='HK', name='Saturday Holiday', date=date(2031, 10, 4))
+
+    def test_dry_run_reports_the_diff_without_writing(self):
+        rows = update_annual_leave(2031, today=date(2031, 6, 1), dry_run=True)
+        self.assertEqual(len(rows), 1)
+        row = rows[0]
+        self.assertEqual(row['entitlement_hours'], Decimal('112.00'))
+        self.assertEqual(row['holiday_compensation_hours'], Decimal('8.00'))
+        self.assertEqual(row['new_holiday_compensations'], 1)
+        self.assertEqual((row['current_balance'], row['target_balance'], row['difference']), (Decimal('50.00'), Decimal('120.00'), Decimal('70.00')))
+
+        self.assertEqual(LeaveBalance.objects.get(employee=self.employee).balance_hours, Decimal('50.00'))
+        self.assertFalse(HolidayCompensation.objects.exists())
+        self.assertFalse(LeaveBalanceAdjustment.objects.exists())
+
+    def test_dry_run_command_writes_csv(self):
+        stdout = StringIO()
+        with mock.patch('sys.stderr', StringIO()):
+            call_command('update_annual_leave', year=2031, dry_run=True, stdout=stdout)
+        lines = stdout.getvalue().splitlines()
+        self.assertEqual(lines[0], ','.join(DIFF_COLUMNS))
+        self.assertIn('al1', lines[1])
+        self.assertFalse(LeaveBalanceAdjustment.objects.exists())
+
+    def test_apply_writes_the_difference_once(self):
+        update_annual_leave(2031, today=date(2031, 6, 1))
+        self.assertEqual(LeaveBalance.objects.get(employee=self.employee).balance_hours, Decimal('120.00'))
+        # 假期補償與年資權益各寫一筆帳本記錄，合計等於差額
+        adjustments = list(LeaveBalanceAdjustment.objects.order_by('id').values_list('hours_changed', flat=True))
+        self.assertEqual(adjustments, [Decimal('8.00'), Decimal('62.00')])
+
+        rows = update_annual_leave(2031, today=date(2031, 6, 1))
+        self.assertEqual(rows[0]['difference'], Decimal('0.00'))
+        self.assertEqual(LeaveBalanceAdjustment.objects.count(), 2)
+
+
+class PublicHolidayGenerationTests(TestCase):
+    def test_generates_each_region_offline(self):
+        entries = generate_holidays(['HK', 'my-14'], range(2031, 2033))
+        self.assertIn(('HK', date(2031, 1, 1)), [(region, day) for region, day, _ in entries])
+        self.assertEqual({region for region, _, _ in entries}, {'HK', 'MY-14'})
+        self.assertEqual({day.year for _, day, _ in entries}, {2031, 2032})
+        self.assertEqual(generate_holidays(['HK'], [2031], language='en_US')[0], ('HK', date(2031, 1, 1), "New Year's Day"))
+        with self.assertRaises(ValueError):
+            generate_holidays(['XX'], [2031])
+
+    def test_upsert_adds_then_only_updates_renamed_days(self):
+        PublicHoliday.objects.create(region='MY', name='Other region', date=date(2031, 1, 1))
+        entries = [('HK', date(2031, 1, 1), 'New Year'), ('HK', date(2031, 12, 25), 'Christmas')]
+        with mock.patch('core.public_holidays.touch_roster') as touch:
+            self.assertEqual(upsert_holidays(entries), (2, 0))
+            self.assertEqual(upsert_holidays(entries), (0, 0))
+            self.assertEqual(touch.call_count, 1)
+            self.assertEqual(upsert_holidays([('HK', date(2031, 12, 25), 'Christmas Day')]), (0, 1))
+        self.assertEqual(PublicHoliday.objects.get(region='HK', date=date(2031, 12, 25)).name, 'Christmas Day')
+        self.assertEqual(PublicHoliday.objects.get(region='MY', date=date(2031, 1, 1)).name, 'Other region')
+
+    def test_command_dry_run_and_errors(self):
+        stdout = StringIO()
+        call_command('generate_holidays', region=['HK'], start_year=2031, dry_run=True, stdout=stdout)
+        self.assertIn('HK\t2031-01-01', stdout.getvalue())
+        self.assertFalse(PublicHoliday.objects.exists())
+
+        call_command('generate_holidays', region=['HK'], start_year=2031, stdout=StringIO())
+        self.assertTrue(PublicHoliday.objects.filter(region='HK', date=date(2031, 1, 1)).exists())
+        with self.assertRaises(CommandError):
+            call_command('generate_holidays', region=['XX'], start_year=2031, stdout=StringIO())
+        with self.assertRaises(CommandError):
+            call_command('generate_holidays', start_year=2032, end_year=2031, stdout=StringIO())
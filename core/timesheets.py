@@ -0,0 +1,198 @@
+# core/timesheets.py
+"""
+每日工時表引擎：把實際打卡 (AttendanceRecord) 與排定班次 (班表規則 / 手動排班)、
+已批准休假及公眾假期對齊，計算每位員工每天的實際工時、遲到、早退與未申請加班。
+
+班次由 roster.resolve_shifts 一次解析，打卡記錄一次查詢後以 pandas 分組彙總，
+所有分鐘數都以整欄向量運算完成，再以 upsert 批次寫入 DailyTimesheet。
+"""
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+from django.db import connection, transaction
+from django.utils import timezone
+
+from .models import AttendanceRecord, ArchivedAttendanceRecord, DailyTimesheet, Employee
+from .roster import date_range, resolve_shifts, leave_days_map, employee_holidays_map
+
+TIMESHEET_BATCH_SIZE = 2000
+
+TIMESHEET_FIELDS = [
+    'day_type', 'scheduled_start', 'scheduled_end', 'first_clock_in', 'last_clock_out',
+    'scheduled_minutes', 'worked_minutes', 'late_minutes', 'early_leave_minutes',
+    'overtime_minutes', 'is_absent', 'is_stale', 'computed_at',
+]
+
+
+def _local_midnight(day):
+    return timezone.make_aware(datetime.combine(day, datetime.min.time()))
+
+
+def _minutes(delta):
+    """timedelta 欄位 -> 非負整數分鐘 (缺值視為 0)。"""
+    return (delta.dt.total_seconds() // 60).fillna(0).clip(lower=0).astype(np.int64)
+
+
+def _schedule_frame(employees, start, end):
+    """(員工 x 日期) 的完整表格，包含日期類型與排定上下班時間。"""
+    employee_ids = [emp.id for emp in employees]
+    shifts = resolve_shifts(employees, start, end)
+    leave_map = leave_days_map(employee_ids, start, end)
+    holidays_map = employee_holidays_map(employees, start, end)
+    days = date_range(start, end)
+
+    rows = []
+    for emp_id in employee_ids:
+        leave_days = leave_map.get(emp_id, ())
+        holidays = holidays_map[emp_id]
+        for day in days:
+            shift = shifts.get((emp_id, day))
+            if shift:
+                shift_start = datetime.combine(day, shift[0])
+                shift_end = datetime.combine(day, shift[1])
+                if shift_end <= shift_start:
+                    shift_end += timedelta(days=1) # 跨夜班
+                rows.append((emp_id, day, 'work', shift_start, shift_end))
+            elif day in leave_days:
+                rows.append((emp_id, day, 'leave', None, None))
+            elif day in holidays:
+                rows.append((emp_id, day, 'holiday', None, None))
+            else:
+                rows.append((emp_id, day, 'rest', None, None))
+
+    frame = pd.DataFrame(rows, columns=['employee_id', 'date', 'day_type', 'scheduled_start', 'scheduled_end'])
+    tz = timezone.get_current_timezone()
+    for column in ('scheduled_start', 'scheduled_end'):
+        frame[column] = pd.to_datetime(frame[column]).dt.tz_localize(tz, ambiguous='NaT', nonexistent='shift_forward')
+    return frame
+
+
+def _attendance_frame(employee_ids, start, end):
+    """依上班打卡的當地日期彙總：首次上班、最後下班、實際工時。"""
+    records = []
+    # 已封存的月份也要能重新計算，因此同時讀取主表與封存表
+    for model in (AttendanceRecord, ArchivedAttendanceRecord):
+        records.extend(model.objects.filter(
+            employee_id__in=employee_ids,
+            clock_in__gte=_local_midnight(start),
+            clock_in__lt=_local_midnight(end + timedelta(days=1)),
+        ).values_list('employee_id', 'clock_in', 'clock_out'))
+
+    tz = timezone.get_current_timezone()
+    frame = pd.DataFrame(records, columns=['employee_id', 'clock_in', 'clock_out'])
+    if frame.empty:
+        # 沒有打卡時也要保留欄位型別，否則合併後的時間欄為 object，後續相減會失敗
+        return pd.DataFrame({
+            'employee_id': pd.Series(dtype=np.int64),
+            'date': pd.Series(dtype=object),
+            'first_clock_in': pd.Series(dtype=pd.DatetimeTZDtype(tz=tz)),
+            'last_clock_out': pd.Series(dtype=pd.DatetimeTZDtype(tz=tz)),
+            'worked_minutes': pd.Series(dtype=np.int64),
+        })
+
+    frame['clock_in'] = pd.to_datetime(frame['clock_in'], utc=True).dt.tz_convert(tz)
+    frame['clock_out'] = pd.to_datetime(frame['clock_out'], utc=True).dt.tz_convert(tz)
+    frame['date'] = frame['clock_in'].dt.date
+    frame['worked'] = (frame['clock_out'] - frame['clock_in']).dt.total_seconds().fillna(0).clip(lower=0)
+
+    grouped = frame.groupby(['employee_id', 'date'], sort=False).agg(
+        first_clock_in=('clock_in', 'min'),
+        last_clock_out=('clock_out', 'max'),
+        worked_seconds=('worked', 'sum'),
+    ).reset_index()
+    grouped['worked_minutes'] = (grouped.pop('worked_seconds') // 60).astype(np.int64)
+    return grouped
+
+
+def build_timesheets(employees, start, end):
+    """計算 employees 在 start 到 end (含) 之間每天的工時表，回傳 DataFrame (不寫入資料庫)。"""
+    employees = list(employees)
+    frame = _schedule_frame(employees, start, end)
+    attendance = _attendance_frame([emp.id for emp in employees], start, end)
+    frame = frame.merge(attendance, on=['employee_id', 'date'], how='left')
+
+    frame['scheduled_minutes'] = _minutes(frame['scheduled_end'] - frame['scheduled_start'])
+    frame['worked_minutes'] = frame['worked_minutes'].fillna(0).astype(np.int64)
+    frame['late_minutes'] = _minutes(frame['first_clock_in'] - frame['scheduled_start'])
+    frame['early_leave_minutes'] = _minutes(frame['scheduled_end'] - frame['last_clock_out'])
+    frame['overtime_minutes'] = (frame['worked_minutes'] - frame['scheduled_minutes']).clip(lower=0)
+    frame['is_absent'] = (frame['day_type'] == 'work') & frame['first_clock_in'].isna()
+    return frame
+
+
+def upsert_target(fields):
+    """
+    bulk_create(update_conflicts=True) 的 unique_fields：MySQL 不支援指定衝突欄位
+    (以 ON DUPLICATE KEY UPDATE 依任一唯一鍵更新)，傳入欄位會引發 NotSupportedError，因此回傳 None。
+    """
+    return fields if connection.features.supports_update_conflicts_with_target else None
+
+
+def _to_python(value):
+    if value is None or value is pd.NaT or (isinstance(value, float) and np.isnan(value)):
+        return None
+    if isinstance(value, pd.Timestamp):
+        return value.to_pydatetime()
+    return value
+
+
+def save_timesheets(frame):
+    """把 build_timesheets 的結果 upsert 到 DailyTimesheet，回傳寫入筆數。"""
+    now = timezone.now()
+    columns = ['employee_id', 'date', 'day_type', 'scheduled_start', 'scheduled_end', 'first_clock_in',
+               'last_clock_out', 'scheduled_minutes', 'worked_minutes', 'late_minutes',
+               'early_leave_minutes', 'overtime_minutes', 'is_absent']
+    frame = frame[columns].astype(object).where(frame[columns].notna(), None)
+
+    objects = [
+        DailyTimesheet(**{column: _to_python(value) for column, value in zip(columns, row)}, is_stale=False, computed_at=now)
+        for row in frame.itertuples(index=False, name=None)
+    ]
+    with transaction.atomic():
+        DailyTimesheet.objects.bulk_create(
+            objects,
+            batch_size=TIMESHEET_BATCH_SIZE,
+            update_conflicts=True,
+            unique_fields=upsert_target(['employee', 'date']),
+            update_fields=TIMESHEET_FIELDS,
+        )
+    return len(objects)
+
+
+def _employees(employee_ids=None):
+    employees = Employee.objects.select_related('work_schedule').prefetch_related('work_schedule__rules')
+    if employee_ids is None:
+        return employees.filter(status='Active')
+    return employees.filter(id__in=employee_ids)
+
+
+def compute_timesheets(start, end, employee_ids=None):
+    """計算並儲存 start 到 end 的工時表；employee_ids 為 None 時計算所有在職員工。"""
+    return save_timesheets(build_timesheets(_employees(employee_ids), start, end))
+
+
+def recompute_stale_timesheets():
+    """只重新計算被標記為 is_stale 的員工日期 (例如補登或修正打卡之後)，回傳寫入筆數。"""
+    stale = DailyTimesheet.objects.filter(is_stale=True).values_list('employee_id', 'date')
+    spans = {}
+    for emp_id, day in stale:
+        first, last = spans.get(emp_id, (day, day))
+        spans[emp_id] = (min(first, day), max(last, day))
+
+    # 相同日期範圍的員工一起計算，減少查詢次數
+    by_span = {}
+    for emp_id, span in spans.items():
+        by_span.setdefault(span, []).append(emp_id)
+
+    written = 0
+    for (start, end), employee_ids in by_span.items():
+        written += compute_timesheets(start, end, employee_ids)
+    return written
+
+
+def mark_timesheets_stale(employee_id, start, end=None):
+    """打卡、排班或休假變動後，標記受影響的工時表需要重新計算。"""
+    DailyTimesheet.objects.filter(
+        employee_id=employee_id, date__range=[start, end or start], is_stale=False
+    ).update(is_stale=True)
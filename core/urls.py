@@ -18,6 +18,7 @@ urlpatterns = [
     path('profile/edit/', views.profile_edit_view, name='profile_edit'),
     # Leave Management
     path('leave/apply/', views.leave_apply_view, name='leave_apply'),
+    path('leave/projection/', views.leave_projection_api_view, name='leave_projection_api'),
     
     # Performance Reviews
     path('reviews/', views.my_reviews_view, name='my_reviews'),
@@ -25,7 +26,14 @@ urlpatterns = [
 
     path('attendance/', views.attendance_view, name='attendance'),
     path('attendance/clock-in-out/', views.clock_in_out_view, name='clock_in_out'),
+    path('attendance/clock/', views.clock_api_view, name='clock_api'),
+    path('attendance/history/', views.attendance_history_view, name='attendance_history'),
+    path('attendance/presence/', views.presence_board_view, name='presence_board'),
+    path('attendance/presence/api/', views.presence_api_view, name='presence_api'),
+    path('kiosk/<uuid:token>/', views.kiosk_view, name='kiosk'),
+    path('kiosk/<uuid:token>/punches/', views.kiosk_punches_api_view, name='kiosk_punches'),
     path('manager/manual-attendance/', views.manual_attendance_view, name='manual_attendance'),
+    path('manager/attendance-grid/', views.attendance_grid_view, name='attendance_grid'),
     path('apply/candidate-data/<uuid:token>/', views.candidate_data_form_view, name='candidate_data_form'),
 
 
@@ -37,6 +45,8 @@ urlpatterns = [
     path('manager/edit-schedule/', views.edit_team_schedule_view, name='edit_team_schedule'),
     path('internal/jobs/<int:job_id>/pipeline/', views.recruitment_pipeline_view, name='recruitment_pipeline'),
     path('internal/application/<int:app_id>/update-status/', views.update_application_status_view, name='update_application_status'),
+    path('internal/application/<int:app_id>/schedule-interview/', views.schedule_interview_view, name='schedule_interview'),
+    path('internal/interviews/slots/', views.interview_slots_api_view, name='interview_slots_api'),
     path('reports/tax/', views.tax_report_view, name='tax_report'),
 
 
@@ -44,13 +54,19 @@ urlpatterns = [
     path('analytics/', views.analytics_view, name='analytics'), # <-- This is the line that was likely missing or incorrect
     path('schedule/', views.team_schedule_view, name='team_schedule_current'),
     path('schedule/<int:year>/<int:month>/', views.team_schedule_view, name='team_schedule'),
+    path('calendar/<uuid:token>.ics', views.calendar_feed_view, name='calendar_feed'),
+    path('calendar/<uuid:token>/team.ics', views.team_calendar_feed_view, name='team_calendar_feed'),
 
     path('reports/', views.reporting_view, name='reporting'),
+    path('reports/staffing-forecast/', views.staffing_forecast_api_view, name='staffing_forecast_api'),
+    path('reports/leave-policies/<int:policy_id>/simulate/', views.leave_policy_simulate_api_view, name='leave_policy_simulate_api'),
 
-    #path('schedule/', views.duty_schedule_view, name='duty_schedule'),
+    path('schedule/duty/', views.duty_schedule_view, name='duty_schedule'),
+    path('schedule/duty/api/', views.duty_roster_api_view, name='duty_roster_api'),
 
     path('overtime/apply/', views.overtime_apply_view, name='overtime_apply'),
     path('overtime/approve/<int:request_id>/', views.overtime_approve_view, name='overtime_approve'),
+    path('overtime/approve/bulk/', views.overtime_bulk_approve_view, name='overtime_bulk_approve'),
     path('overtime/reject/<int:request_id>/', views.overtime_reject_view, name='overtime_reject'),
 
     path('onboarding/', views.onboarding_view, name='onboarding'),
@@ -8,8 +8,8 @@ from django.contrib import messages
 from django.forms import modelformset_factory 
 from .models import (Employee, LeaveRequest, LeaveType, LeaveBalance,
                      EmployeeDocument, ReviewCycle, PerformanceReview, Goal, Announcement,
-                     OnboardingChecklist, EmployeeTask, SiteConfiguration, Department,Employee, OvertimeRequest, DutyShift, PublicHoliday,
-                     JobOpening, Candidate, Application, AttendanceRecord, PayslipItem) # <-- Make sure Department is in this list
+                     OnboardingChecklist, EmployeeTask, SiteConfiguration, Department,Employee, OvertimeRequest, DutyShift,
+                     JobOpening, Candidate, Application, AttendanceRecord, PayslipItem, Interview, MonthlyAttendanceSummary, KioskDevice, LeavePolicy) # <-- Make sure Department is in this list
 from .forms import LeaveRequestForm, OvertimeRequestForm,CandidateApplicationForm, TaxReportForm, UserUpdateForm, EmployeeUpdateForm
 from django.core.mail import send_mail, get_connection
 from django.template.loader import render_to_string
@@ -17,8 +17,10 @@ from django.urls import reverse
 import calendar
 import pandas as pd # 👈 1. 在頂部新增
 from django.db.models import Count, Sum, Q # 👈 1. 在頂部新增
-from django.http import JsonResponse, HttpResponse # 
-from datetime import datetime, timedelta, date
+from django.http import JsonResponse, HttpResponse, Http404 # 
+from django.views.decorators.http import condition, require_POST
+from django.core.cache import cache
+from datetime import datetime, timedelta, date, timezone as dt_timezone
 from dateutil.relativedelta import relativedelta
 from django.contrib.auth.decorators import user_passes_test
 from django.utils import timezone
@@ -31,6 +33,22 @@ from django.conf import settings # 👈 3. 匯入 settings
 from docx import Document
 import io
 from pypdf import PdfReader, PdfWriter
+from .shift_solver import solve_shifts
+from .roster import roster_stamp, day_statuses, employee_holidays_map
+from .ical import build_calendar, feed_window
+from .staffing import forecast_from_params
+from .policy_simulator import simulate_from_data
+from .leave_projection import projected_shortfall, projection_from_params
+from .interviews import find_common_slots
+from .attendance import get_client_ip, toggle_clock
+from .attendance_archive import day_bounds, hot_cutoff
+from .attendance_corrections import apply_week_corrections, build_week_grid, week_start
+from .overtime import approve_overtime_requests
+from .presence import team_presence, department_presence
+from .kiosk import ingest_punches, MAX_KIOSK_BATCH
+from django.views.decorators.csrf import csrf_exempt
+from django.core.exceptions import PermissionDenied
+import hashlib
 
 @login_required
 def profile_view(request):
@@ -150,6 +168,11 @@ def leave_apply_view(request):
         if form.is_valid():
             leave_request = form.save(commit=False)
             leave_request.employee = employee
+            # 加上這筆申請後，預計餘額 (含未來累計、補償、其他已申請的休假與年終作廢) 不能變成負數
+            shortfall = projected_shortfall(leave_request)
+            if shortfall is not None:
+                form.add_error(None, f'申請時數超過預計的假期餘額 (不足 {shortfall} 小時)。')
+                return render(request, 'core/leave_apply.html', {'form': form, 'employee': employee})
             leave_request.save()
 
             if employee.manager and employee.manager.user.email:
@@ -236,7 +259,7 @@ def manager_dashboard_view(request):
     pending_overtime = OvertimeRequest.objects.filter(
         employee__manager=manager_employee,
         status='Pending'
-    ).order_by('created_at')
+    ).select_related('employee__user').order_by('date', 'created_at')
     # --- 🔼 新增邏輯結束 🔼 ---
 
 
@@ -540,6 +563,66 @@ def reporting_view(request):
     }
     return render(request, 'core/reporting_hub.html', context)
 
+@login_required
+def staffing_forecast_api_view(request):
+    """
+    部門人力預測 JSON API (僅限 HR/Admin)。
+    參數：start=YYYY-MM-DD, weeks (最多 26), department (可多個), threshold (可選)
+    """
+    if not request.user.is_staff:
+        return JsonResponse({'error': '您沒有權限訪問此頁面。'}, status=403)
+    try:
+        forecast = forecast_from_params(request.GET)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse(forecast)
+
+@login_required
+def leave_projection_api_view(request):
+    """
+    假期餘額預測 JSON API。
+    參數：date=YYYY-MM-DD (可多個) 或 until=YYYY-MM-DD (每月月底一個點)、leave_type (預設年假)、pending=0 不計待審核的休假。
+    一般員工只能查詢自己；HR/Admin 可用 employee (可多個) 指定員工，或 all=1 查詢全公司。
+    """
+    if request.user.is_staff and (request.GET.get('all') == '1' or request.GET.getlist('employee')):
+        try:
+            employee_ids = None if request.GET.get('all') == '1' else [int(e) for e in request.GET.getlist('employee') if e]
+        except ValueError:
+            return JsonResponse({'error': '參數格式錯誤：employee 應為整數。'}, status=400)
+    else:
+        try:
+            employee_ids = [request.user.employee_profile.id]
+        except Employee.DoesNotExist:
+            return JsonResponse({'error': '無法找到您的員工資料。'}, status=404)
+    try:
+        projection = projection_from_params(request.GET, employee_ids)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse(projection)
+
+@login_required
+@require_POST
+def leave_policy_simulate_api_view(request, policy_id):
+    """
+    假期策略試算 JSON API (僅限 HR/Admin，不會寫入任何資料)。
+    Body: {"accrual_frequency", "accrual_amount", "accrual_unit", "rules": [{"years_of_service", "rule_type", "adjustment_amount"}], "as_of"}
+    未提供的欄位沿用目前策略。
+    """
+    if not request.user.is_staff:
+        return JsonResponse({'error': '您沒有權限訪問此頁面。'}, status=403)
+    policy = get_object_or_404(LeavePolicy, id=policy_id)
+    try:
+        data = json.loads(request.body or '{}')
+    except ValueError:
+        return JsonResponse({'error': '請求格式錯誤。'}, status=400)
+    if not isinstance(data, dict):
+        return JsonResponse({'error': '請求格式錯誤。'}, status=400)
+    try:
+        simulation = simulate_from_data(policy, data)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse(simulation)
+
 @login_required
 def team_schedule_view(request, year=None, month=None):
     # 1. 日期處理
@@ -592,9 +675,14 @@ def team_schedule_view(request, year=None, month=None):
             leave_dates_map.setdefault(emp_id, set()).add(current_date)
             current_date += timedelta(days=1)
 
-    # 抓取日曆範圍內所有國定假日
-    public_holidays = PublicHoliday.objects.filter(date__range=[first_day_of_calendar, last_day_of_calendar])
-    public_holidays_map = {h.date: h.name for h in public_holidays}
+    # 日曆範圍內的國定假日：依每位員工 (或其部門) 的假期地區，經由快取取得
+    employee_holidays = employee_holidays_map(active_employees, first_day_of_calendar, last_day_of_calendar)
+    public_holidays_map = {}
+    for holiday_dates in employee_holidays.values():
+        for holiday_date, holiday_name in holiday_dates.items():
+            names = public_holidays_map.setdefault(holiday_date, [])
+            if holiday_name not in names:
+                names.append(holiday_name)
 
 
     # 3. 產生每一天的排班數據
@@ -602,12 +690,13 @@ def team_schedule_view(request, year=None, month=None):
 
     for week in month_days:
         for day in week:
-            is_holiday = day in public_holidays_map
+            # 只有所有員工的地區當天都放假時才整天顯示為假日；部分地區放假時仍顯示其他地區的上班人員
+            is_holiday = bool(employee_holidays) and all(day in holiday_dates for holiday_dates in employee_holidays.values())
             schedule_data[day] = {
                 'employees': [],
                 'summary': {},
                 'is_holiday': is_holiday,
-                'holiday_name': public_holidays_map.get(day)
+                'holiday_name': ' / '.join(public_holidays_map.get(day, [])) or None
             }
             
             if is_holiday:
@@ -616,6 +705,9 @@ def team_schedule_view(request, year=None, month=None):
             department_counts = {}
             
             for emp in active_employees:
+                if day in employee_holidays[emp.id]:
+                    continue
+
                 is_on_leave = emp.id in leave_dates_map and day in leave_dates_map.get(emp.id, set())
                 if is_on_leave:
                     continue
@@ -643,79 +735,164 @@ def team_schedule_view(request, year=None, month=None):
         'target_date': target_date,
         'prev_month': prev_month,
         'next_month': next_month,
-        'today': date.today()
+        'today': date.today(),
+        'employee': getattr(request.user, 'employee_profile', None),
     }
     return render(request, 'core/team_schedule.html', context)
 
 # core/views.py
 
-@login_required
-def duty_schedule_view(request):
-    today = date.today()
-    start_of_week = today - timedelta(days=today.weekday())
-    week_dates = [start_of_week + timedelta(days=i) for i in range(7)]
-
-    active_employees = Employee.objects.filter(status='Active').select_related('user', 'work_schedule')
-
-    # 為了提高效率，預先抓取所有員工的預設班表規則
-    for emp in active_employees:
-        if emp.work_schedule:
-            emp.work_schedule_rules = {rule.day_of_week: rule for rule in emp.work_schedule.rules.all()}
-        else:
-            emp.work_schedule_rules = {}
-            
-    # 1. 獲取本週所有已批准的休假 (最高優先級)
-    approved_leaves = LeaveRequest.objects.filter(
-        status='Approved',
-        start_datetime__date__lte=week_dates[-1],
-        end_datetime__date__gte=week_dates[0]
-    ).select_related('employee')
-    
-    leave_map = {}
-    for leave in approved_leaves:
-        current_date = leave.start_datetime.date()
-        while current_date <= leave.end_datetime.date():
-            if week_dates[0] <= current_date <= week_dates[-1]:
-                leave_map.setdefault(leave.employee_id, {})[current_date] = "On Leave"
-            current_date += timedelta(days=1)
+ROSTER_PAGE_SIZE = 50
+ROSTER_MAX_PAGE_SIZE = 200
+
+def _duty_roster_params(request):
+    """解析值日表 API 參數，並產生對應 (週, 篩選條件, 資料版本) 的快取鍵。"""
+    if not hasattr(request, '_duty_roster_params'):
+        try:
+            week_day = date.fromisoformat(request.GET['week']) if request.GET.get('week') else date.today()
+            department_id = int(request.GET['department']) if request.GET.get('department') else None
+            manager_id = int(request.GET['manager']) if request.GET.get('manager') else None
+            cursor = int(request.GET.get('cursor') or 0)
+            limit = min(int(request.GET.get('limit') or ROSTER_PAGE_SIZE), ROSTER_MAX_PAGE_SIZE)
+        except ValueError:
+            request._duty_roster_params = None
+            return None
+        start_of_week = week_day - timedelta(days=week_day.weekday())
+        cache_key = f"duty_roster:{start_of_week}:{department_id}:{manager_id}:{cursor}:{limit}:{roster_stamp()}"
+        request._duty_roster_params = {
+            'start_of_week': start_of_week,
+            'department_id': department_id,
+            'manager_id': manager_id,
+            'cursor': cursor,
+            'limit': limit,
+            'cache_key': cache_key,
+            'etag': hashlib.md5(cache_key.encode()).hexdigest(),
+        }
+    return request._duty_roster_params
 
-    # 2. 獲取本週所有手動設定的班次 (次高優先級)
-    shifts = DutyShift.objects.filter(date__in=week_dates)
-    shift_map = {(s.employee_id, s.date): f"{s.start_time.strftime('%H:%M')}-{s.end_time.strftime('%H:%M')}" for s in shifts}
+def _duty_roster_etag(request):
+    params = _duty_roster_params(request)
+    return params['etag'] if params else None
 
-    # 3. 組合最終的排班數據
-    schedule_data = []
-    for emp in active_employees:
-        employee_schedule = {
-            'name': emp.user.get_full_name() or emp.user.username,
-            'weekly_status': []
+@login_required
+@condition(etag_func=_duty_roster_etag)
+def duty_roster_api_view(request):
+    """
+    值日表 JSON API。
+    參數：week=YYYY-MM-DD (該週任一天)、department、manager、cursor (上一頁最後的員工ID)、limit
+    以 (週, 篩選條件, 班表資料版本) 為快取鍵，並支援 ETag 重新驗證。
+    """
+    params = _duty_roster_params(request)
+    if params is None:
+        return JsonResponse({'error': '參數格式錯誤。'}, status=400)
+
+    payload = cache.get(params['cache_key'])
+    if payload is None:
+        week_dates = [params['start_of_week'] + timedelta(days=i) for i in range(7)]
+
+        employees = Employee.objects.filter(status='Active', id__gt=params['cursor'])
+        if params['department_id']:
+            employees = employees.filter(department_id=params['department_id'])
+        if params['manager_id']:
+            employees = employees.filter(manager_id=params['manager_id'])
+        page = list(
+            employees.select_related('user', 'department', 'work_schedule')
+            .prefetch_related('work_schedule__rules')
+            .order_by('id')[:params['limit'] + 1]
+        )
+        has_more = len(page) > params['limit']
+        page = page[:params['limit']]
+
+        statuses = day_statuses(page, week_dates[0], week_dates[-1])
+        payload = {
+            'week_start': week_dates[0].isoformat(),
+            'prev_week': (week_dates[0] - timedelta(days=7)).isoformat(),
+            'next_week': (week_dates[0] + timedelta(days=7)).isoformat(),
+            'dates': [day.isoformat() for day in week_dates],
+            'employees': [
+                {
+                    'id': emp.id,
+                    'name': emp.user.get_full_name() or emp.user.username,
+                    'department': emp.department.name if emp.department else '',
+                    'weekly_status': statuses[emp.id],
+                }
+                for emp in page
+            ],
+            'next_cursor': page[-1].id if has_more else None,
         }
-        for day in week_dates:
-            status = "Rest Day" # a. 預設為休息日
+        cache.set(params['cache_key'], payload, 60 * 60)
 
-            # b. 檢查預設班表
-            rule = emp.work_schedule_rules.get(day.weekday())
-            if rule:
-                status = f"{rule.start_time.strftime('%H:%M')}-{rule.end_time.strftime('%H:%M')}"
-            
-            # c. 檢查手動排班 (會覆蓋預設班表)
-            if (emp.id, day) in shift_map:
-                status = shift_map[(emp.id, day)]
-            
-            # d. 檢查休假 (會覆蓋所有其他狀態)
-            if emp.id in leave_map and day in leave_map[emp.id]:
-                status = leave_map[emp.id][day]
-                
-            employee_schedule['weekly_status'].append(status)
-        
-        schedule_data.append(employee_schedule)
+    response = JsonResponse(payload)
+    response['Cache-Control'] = 'private, no-cache' # 瀏覽器每次都以 ETag 重新驗證
+    return response
 
+@login_required
+def duty_schedule_view(request):
+    """值日表頁面：資料由 duty_roster_api_view 分頁載入。"""
     context = {
-        'week_dates': week_dates,
-        'schedule_data': schedule_data,
+        'departments': Department.objects.all(),
+        'managers': Employee.objects.filter(status='Active', role__is_manager=True).select_related('user').order_by('user__first_name'),
+        'initial_week': request.GET.get('week', ''),
     }
     return render(request, 'core/duty_schedule.html', context)
 
+def _calendar_feed_info(request, token, team):
+    """
+    行事曆訂閱的 ETag 與最後修改時間只依賴一次索引查詢與快取中的時間戳，
+    讓每 15 分鐘輪詢一次的行事曆客戶端大多只拿到 304，幾乎不佔伺服器資源。
+    """
+    cache_attr = '_team_calendar_feed_info' if team else '_calendar_feed_info'
+    if not hasattr(request, cache_attr):
+        if team:
+            employees = Employee.objects.filter(manager__calendar_token=token, status='Active')
+        else:
+            employees = Employee.objects.filter(calendar_token=token)
+        employee_ids = list(employees.order_by('id').values_list('id', flat=True))
+
+        stamp = roster_stamp(employee_ids)
+        window_start, _ = feed_window()
+        etag = hashlib.md5(f"{token}:{team}:{window_start}:{employee_ids}:{stamp}".encode()).hexdigest()
+        # 訂閱範圍每天往前滾動，所以最後修改時間至少是今天零時
+        last_modified = max(
+            datetime.fromtimestamp(stamp, tz=dt_timezone.utc),
+            timezone.make_aware(datetime.combine(timezone.localdate(), datetime.min.time()))
+        )
+        setattr(request, cache_attr, (employee_ids, etag, last_modified))
+    return getattr(request, cache_attr)
+
+def _calendar_feed_response(request, token, team):
+    employee_ids, etag, _ = _calendar_feed_info(request, token, team)
+    if not employee_ids and not Employee.objects.filter(calendar_token=token).exists():
+        raise Http404
+
+    cache_key = f'ical:{etag}'
+    content = cache.get(cache_key)
+    if content is None:
+        employees = Employee.objects.filter(id__in=employee_ids).select_related('user', 'work_schedule').prefetch_related('work_schedule__rules')
+        name = '團隊班表' if team else '我的班表'
+        content = build_calendar(employees, name)
+        cache.set(cache_key, content, 60 * 60 * 24)
+
+    response = HttpResponse(content, content_type='text/calendar; charset=utf-8')
+    response['Content-Disposition'] = 'inline; filename="team.ics"' if team else 'inline; filename="schedule.ics"'
+    return response
+
+# 個人行事曆訂閱 (班次、休假、國定假日)，以 token 代替登入
+@condition(
+    etag_func=lambda request, token: _calendar_feed_info(request, token, False)[1],
+    last_modified_func=lambda request, token: _calendar_feed_info(request, token, False)[2],
+)
+def calendar_feed_view(request, token):
+    return _calendar_feed_response(request, token, team=False)
+
+# 經理的團隊行事曆訂閱 (所有直屬下屬)
+@condition(
+    etag_func=lambda request, token: _calendar_feed_info(request, token, True)[1],
+    last_modified_func=lambda request, token: _calendar_feed_info(request, token, True)[2],
+)
+def team_calendar_feed_view(request, token):
+    return _calendar_feed_response(request, token, team=True)
+
 @login_required
 def overtime_apply_view(request):
     try:
@@ -745,17 +922,9 @@ def overtime_approve_view(request, request_id):
     # 權限檢查：確保只有該員工的直屬經理才能批准
     ot_request = get_object_or_404(OvertimeRequest, id=request_id, employee__manager__user=request.user)
 
-    if ot_request.status == 'Pending':
-        ot_request.status = 'Approved'
-        ot_request.save()
-
-        # --- 關鍵：將加班時數轉換為補休，直接加到員工的假期餘額中 ---
+    # --- 關鍵：將加班時數轉換為補休，直接加到員工的假期餘額中 ---
+    if approve_overtime_requests([ot_request]):
         employee = ot_request.employee
-        comp_type, _ = LeaveType.objects.get_or_create(name='Compensatory')
-        balance, created = LeaveBalance.objects.get_or_create(employee=employee, leave_type=comp_type)
-        balance.balance_hours += ot_request.hours
-        balance.save()
-
         messages.success(request, f"{employee.user.username} 的加班申請已批准，{ot_request.hours} 小時已轉為補休。")
         # 可以在這裡加入通知員工的郵件邏輯
     else:
@@ -763,6 +932,26 @@ def overtime_approve_view(request, request_id):
 
     return redirect('core:manager_dashboard')
 
+# 經理批次批准加班 (例如系統依打卡記錄產生的申請)
+@login_required
+@require_POST
+def overtime_bulk_approve_view(request):
+    ids = request.POST.getlist('overtime_ids')
+    # 權限檢查：只處理自己直屬員工的申請
+    requests = list(OvertimeRequest.objects.filter(id__in=[i for i in ids if i.isdigit()], employee__manager__user=request.user).only('id'))
+    if not requests:
+        messages.warning(request, "請先勾選要批准的加班申請。")
+        return redirect('core:manager_dashboard')
+
+    approved = approve_overtime_requests(requests)
+    if approved:
+        total_hours = sum(ot.hours for ot in approved)
+        messages.success(request, f"已批准 {len(approved)} 筆加班申請，共 {total_hours} 小時已轉為補休。")
+    skipped = len(requests) - len(approved)
+    if skipped:
+        messages.warning(request, f"{skipped} 筆申請已被處理過，已略過。")
+    return redirect('core:manager_dashboard')
+
 # 3. 經理拒絕加班 View
 @login_required
 def overtime_reject_view(request, request_id):
@@ -816,12 +1005,31 @@ def edit_team_schedule_view(request):
         return redirect('core:duty_schedule') # 儲存後導向到值日表查看頁面
 
     # GET 請求：準備要顯示在表單中的現有數據
-    existing_shifts = DutyShift.objects.filter(
-        employee__in=team_members,
-        date__in=next_week_dates
-    )
-    # 建立一個方便在樣板中查找的字典
-    schedule_map = {(shift.employee_id, shift.date): (shift.start_time, shift.end_time) for shift in existing_shifts}
+    if request.GET.get('auto'):
+        # 自動排班建議：只填入表單，經理確認後按「儲存」才會寫入
+        assignments, shortfalls = solve_shifts(
+            team_members.select_related('work_schedule').prefetch_related('work_schedule__rules'),
+            next_week_dates[0], next_week_dates[-1]
+        )
+        schedule_pairs = assignments.items()
+        department_names = dict(Department.objects.values_list('id', 'name'))
+        for shortfall in shortfalls:
+            messages.warning(request, (
+                f"{shortfall['date']:%m-%d} {department_names.get(shortfall['department_id'], '')}: "
+                f"需要 {shortfall['required']} 人，您的團隊只能排出 {shortfall['assigned']} 人。"
+            ))
+        messages.info(request, '已產生自動排班建議，請檢查後按「儲存班表變更」。')
+    else:
+        existing_shifts = DutyShift.objects.filter(
+            employee__in=team_members,
+            date__in=next_week_dates
+        )
+        schedule_pairs = (((shift.employee_id, shift.date), (shift.start_time, shift.end_time)) for shift in existing_shifts)
+
+    # 建立一個方便在樣板中查找的字典 {員工ID: {日期: (上班, 下班)}}
+    schedule_map = {}
+    for (emp_id, day), times in schedule_pairs:
+        schedule_map.setdefault(emp_id, {})[day] = times
 
     context = {
         'team_members': team_members,
@@ -873,56 +1081,169 @@ def job_detail_view(request, job_id):
     }
     return render(request, 'core/job_detail.html', context)
     
-# Helper function to get the user's IP address
-def get_client_ip(request):
-    x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
-    if x_forwarded_for:
-        ip = x_forwarded_for.split(',')[0]
-    else:
-        ip = request.META.get('REMOTE_ADDR')
-    return ip
-
 # 1. Employee's main attendance page
 @login_required
 def attendance_view(request):
     employee = get_object_or_404(Employee, user=request.user)
-    today = timezone.now().date()
-    last_record = AttendanceRecord.objects.filter(employee=employee, clock_in__date=today, clock_out__isnull=True).first()
-    todays_records = AttendanceRecord.objects.filter(employee=employee, clock_in__date=today)
+    day_start, day_end = day_bounds(timezone.localdate(), timezone.localdate())
+    todays_records = AttendanceRecord.objects.filter(employee=employee, clock_in__gte=day_start, clock_in__lt=day_end)
+    last_record = todays_records.filter(clock_out__isnull=True).first()
     context = {
         'last_record': last_record,
         'todays_records': todays_records,
     }
     return render(request, 'core/attendance.html', context)
 
+@login_required
+def attendance_history_view(request):
+    """個人出勤歷史：讀取每月彙總，不需要掃描原始打卡記錄。"""
+    employee = get_object_or_404(Employee, user=request.user)
+    summaries = MonthlyAttendanceSummary.objects.filter(employee=employee)[:24]
+    context = {
+        'summaries': summaries,
+    }
+    return render(request, 'core/attendance_history.html', context)
+
+def _presence_board(request):
+    """
+    看板資料：經理看到自己的下屬，HR/Admin 可以用 ?department= 查看整個部門。
+    沒有權限時回傳 None。
+    """
+    employee = Employee.objects.filter(user=request.user).first()
+    department_id = request.GET.get('department')
+    if request.user.is_staff and department_id:
+        team = Employee.objects.filter(department_id=department_id, status='Active')
+    elif employee and employee.subordinates.exists():
+        team = employee.subordinates.filter(status='Active')
+    elif request.user.is_staff:
+        team = Employee.objects.none()
+    else:
+        return None
+
+    team = list(team.select_related('user', 'department').order_by('user__first_name'))
+    presence = team_presence(team)
+
+    if request.user.is_staff:
+        departments = list(Department.objects.order_by('name').values('id', 'name', 'color'))
+    else:
+        department_ids = {emp.department_id for emp in team if emp.department_id}
+        departments = list(Department.objects.filter(id__in=department_ids).order_by('name').values('id', 'name', 'color'))
+    counts = department_presence([dept['id'] for dept in departments])
+    for dept in departments:
+        dept['present'] = counts[dept['id']]
+
+    members = [
+        {
+            'id': emp.id,
+            'name': emp.user.get_full_name() or emp.user.username,
+            'department': emp.department.name if emp.department else None,
+            'clocked_in': presence[emp.id] is not None,
+            'since': presence[emp.id],
+        }
+        for emp in team
+    ]
+    return {
+        'team': members,
+        'present': sum(1 for member in members if member['clocked_in']),
+        'departments': departments,
+    }
+
+@login_required
+def presence_board_view(request):
+    board = _presence_board(request)
+    if board is None:
+        messages.error(request, '您沒有權限訪問此頁面。')
+        return redirect('core:profile')
+    context = {
+        'board': board,
+        'selected_department': request.GET.get('department', ''),
+    }
+    return render(request, 'core/presence_board.html', context)
+
+@login_required
+def presence_api_view(request):
+    """「誰在上班」JSON：團隊成員的在班狀態與各部門在班人數，全部從快取讀取。"""
+    board = _presence_board(request)
+    if board is None:
+        return JsonResponse({'error': '您沒有權限訪問此頁面。'}, status=403)
+    return JsonResponse(board)
+
 # 2. View to handle the clock-in/out action
 @login_required
 def clock_in_out_view(request):
     if request.method == 'POST':
-        employee = get_object_or_404(Employee, user=request.user)
-        config = SiteConfiguration.load()
         client_ip = get_client_ip(request)
-
-        allowed_ips = [ip.strip() for ip in config.allowed_ip_addresses.split(',') if ip.strip()]
-        if allowed_ips and client_ip not in allowed_ips:
+        try:
+            action, record, duplicate = toggle_clock(request.user, client_ip)
+        except Employee.DoesNotExist:
+            raise Http404("No Employee matches the given query.")
+        except PermissionDenied:
             messages.error(request, f"Error: Your IP address ({client_ip}) is not in the allowed range.")
             return redirect('core:attendance')
 
-        last_record = AttendanceRecord.objects.filter(employee=employee, clock_out__isnull=True).order_by('-clock_in').first()
-
-        if last_record:
-            last_record.clock_out = timezone.now()
-            last_record.save()
+        if duplicate:
+            messages.info(request, 'Your last punch was just recorded; please wait a moment before punching again.')
+        elif action == 'out':
             messages.success(request, 'You have successfully clocked out!')
         else:
-            AttendanceRecord.objects.create(
-                employee=employee,
-                clock_in=timezone.now(),
-                ip_address=client_ip
-            )
             messages.success(request, 'You have successfully clocked in!')
     return redirect('core:attendance')
 
+def clock_api_view(request):
+    """
+    輕量的 JSON 打卡 API，供打卡頁面與行動裝置在上班尖峰時使用。
+    只接受 POST，不渲染任何頁面；連按時回傳 duplicate=true 而不會重複開記錄。
+    """
+    if not request.user.is_authenticated:
+        return JsonResponse({'error': '請先登入。'}, status=401)
+    if request.method != 'POST':
+        return JsonResponse({'error': '只接受 POST 請求。'}, status=405)
+
+    try:
+        action, record, duplicate = toggle_clock(request.user, get_client_ip(request))
+    except Employee.DoesNotExist:
+        return JsonResponse({'error': '找不到對應的員工資料。'}, status=404)
+    except PermissionDenied as e:
+        return JsonResponse({'error': str(e)}, status=403)
+
+    return JsonResponse({
+        'status': 'clocked_in' if action == 'in' else 'clocked_out',
+        'duplicate': duplicate,
+        'id': record.id,
+        'clock_in': record.clock_in,
+        'clock_out': record.clock_out,
+    })
+
+# Kiosk 打卡：共用平板不需登入，以網址中的裝置 token 識別
+def kiosk_view(request, token):
+    device = get_object_or_404(KioskDevice, token=token, is_active=True)
+    context = {
+        'device': device,
+        'max_batch': MAX_KIOSK_BATCH,
+    }
+    return render(request, 'core/kiosk.html', context)
+
+@csrf_exempt
+def kiosk_punches_api_view(request, token):
+    """
+    Kiosk 批次同步：一次上傳多筆離線暫存的打卡，依 punch_id 冪等。
+    Body: {"punches": [{"punch_id", "badge" 或 "employee_number" + "pin", "timestamp", "direction"}]}
+    """
+    device = KioskDevice.objects.filter(token=token, is_active=True).first()
+    if device is None:
+        return JsonResponse({'error': '無效的裝置。'}, status=403)
+    if request.method != 'POST':
+        return JsonResponse({'error': '只接受 POST 請求。'}, status=405)
+    try:
+        punches = json.loads(request.body)['punches']
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'error': '請求格式錯誤。'}, status=400)
+    if not isinstance(punches, list) or not all(isinstance(punch, dict) for punch in punches):
+        return JsonResponse({'error': '請求格式錯誤。'}, status=400)
+    if len(punches) > MAX_KIOSK_BATCH:
+        return JsonResponse({'error': f'每批最多 {MAX_KIOSK_BATCH} 筆打卡。'}, status=400)
+    return JsonResponse(ingest_punches(device, punches))
+
 # 3. Manager's page for manual attendance entry
 @login_required
 def manual_attendance_view(request):
@@ -956,6 +1277,50 @@ def manual_attendance_view(request):
     }
     return render(request, 'core/manual_attendance.html', context)
 
+@login_required
+def attendance_grid_view(request):
+    manager = get_object_or_404(Employee, user=request.user)
+    team_members = Employee.objects.filter(manager=manager, status='Active').select_related('user', 'work_schedule').prefetch_related('work_schedule__rules').order_by('user__first_name')
+    if not team_members.exists():
+        messages.error(request, '您沒有團隊成員。')
+        return redirect('core:manager_dashboard')
+
+    try:
+        first_day = week_start(datetime.strptime(request.GET.get('week', ''), '%Y-%m-%d').date())
+    except ValueError:
+        first_day = week_start(timezone.localdate())
+
+    if request.method == 'POST':
+        reason = request.POST.get('reason', '').strip()
+        stats, errors, conflicts = apply_week_corrections(request.user, team_members, first_day, request.POST, reason)
+        if errors:
+            for error in errors:
+                messages.error(request, error)
+            messages.warning(request, '有錯誤的格子，整張表都沒有儲存，請修正後重新送出。')
+        elif any(stats.values()):
+            messages.success(request, f"已儲存：新增 {stats['created']} 筆、修改 {stats['updated']} 筆、刪除 {stats['deleted']} 筆打卡記錄。")
+        else:
+            messages.info(request, '沒有任何變更。')
+        if not errors:
+            return redirect(f"{reverse('core:attendance_grid')}?week={first_day.isoformat()}")
+        # 以送出的值重新顯示，主管不必重新輸入；衝突的格子顯示最新記錄
+        days, rows = build_week_grid(team_members, first_day, request.POST, conflicts)
+        reason_value = reason
+    else:
+        days, rows = build_week_grid(team_members, first_day)
+        reason_value = ''
+
+    context = {
+        'days': days,
+        'rows': rows,
+        'week_start': first_day,
+        'previous_week': first_day - timedelta(days=7),
+        'next_week': first_day + timedelta(days=7),
+        'archive_cutoff': hot_cutoff(),
+        'reason': reason_value,
+    }
+    return render(request, 'core/attendance_grid.html', context)
+
 def is_staff_user(user):
     return user.is_staff
 
@@ -971,9 +1336,90 @@ def recruitment_pipeline_view(request, job_id):
         'job': job,
         'applications': applications,
         'status_choices': status_choices,
+        'interviews': Interview.objects.filter(application__job=job, end_datetime__gte=timezone.now()).select_related('application__candidate').prefetch_related('interviewers__user'),
+        'interviewer_choices': Employee.objects.filter(status='Active').select_related('user').order_by('user__first_name'),
     }
     return render(request, 'core/recruitment_pipeline.html', context)
 
+INTERVIEW_SEARCH_DAYS = 14
+INTERVIEW_MAX_MINUTES = 24 * 60
+
+@user_passes_test(is_staff_user)
+@login_required
+def interview_slots_api_view(request):
+    """
+    面試官共同空檔 (JSON)。
+    參數：interviewers (可多個員工ID)、start=YYYY-MM-DD、end=YYYY-MM-DD、duration (分鐘，預設 60)
+    """
+    try:
+        interviewer_ids = [int(i) for i in request.GET.getlist('interviewers') if i]
+        start_date = date.fromisoformat(request.GET['start']) if request.GET.get('start') else date.today()
+        end_date = date.fromisoformat(request.GET['end']) if request.GET.get('end') else start_date + timedelta(days=INTERVIEW_SEARCH_DAYS - 1)
+        duration_minutes = int(request.GET.get('duration') or 60)
+    except ValueError:
+        return JsonResponse({'error': '參數格式錯誤。'}, status=400)
+    if not 0 < duration_minutes <= INTERVIEW_MAX_MINUTES:
+        return JsonResponse({'error': f'面試長度必須介於 1 到 {INTERVIEW_MAX_MINUTES} 分鐘。'}, status=400)
+    duration = timedelta(minutes=duration_minutes)
+
+    if not interviewer_ids:
+        return JsonResponse({'error': '請至少選擇一位面試官。'}, status=400)
+    if end_date < start_date or (end_date - start_date).days >= 31:
+        return JsonResponse({'error': '搜尋範圍必須在 31 天以內。'}, status=400)
+
+    interviewers = Employee.objects.filter(id__in=interviewer_ids, status='Active').select_related('work_schedule').prefetch_related('work_schedule__rules')
+    slots = find_common_slots(interviewers, start_date, end_date, duration)
+    return JsonResponse({
+        'slots': [
+            {'start': timezone.localtime(start).isoformat(), 'end': timezone.localtime(end).isoformat()}
+            for start, end in slots
+        ]
+    })
+
+@user_passes_test(is_staff_user)
+@login_required
+def schedule_interview_view(request, app_id):
+    application = get_object_or_404(Application, id=app_id)
+    if request.method != 'POST':
+        return redirect('core:recruitment_pipeline', job_id=application.job.id)
+
+    interviewer_ids = [i for i in request.POST.getlist('interviewers') if i]
+    interviewers = list(Employee.objects.filter(id__in=interviewer_ids, status='Active').select_related('work_schedule').prefetch_related('work_schedule__rules'))
+    try:
+        start_dt = timezone.make_aware(datetime.strptime(request.POST.get('start', ''), '%Y-%m-%dT%H:%M'))
+        duration_minutes = int(request.POST.get('duration') or 60)
+    except ValueError:
+        messages.error(request, "面試時間格式錯誤。")
+        return redirect('core:recruitment_pipeline', job_id=application.job.id)
+    if not 0 < duration_minutes <= INTERVIEW_MAX_MINUTES:
+        messages.error(request, f"面試長度必須介於 1 到 {INTERVIEW_MAX_MINUTES} 分鐘。")
+        return redirect('core:recruitment_pipeline', job_id=application.job.id)
+    end_dt = start_dt + timedelta(minutes=duration_minutes)
+
+    if not interviewers:
+        messages.error(request, "請至少選擇一位面試官。")
+        return redirect('core:recruitment_pipeline', job_id=application.job.id)
+
+    # 送出前再確認一次時段仍然空著 (可能已被其他人預約)
+    free_slots = find_common_slots(interviewers, start_dt.date(), end_dt.date(), end_dt - start_dt)
+    if not any(slot_start <= start_dt and end_dt <= slot_end for slot_start, slot_end in free_slots):
+        messages.error(request, "此時段已不再是所有面試官的共同空檔，請重新搜尋。")
+        return redirect('core:recruitment_pipeline', job_id=application.job.id)
+
+    interview = Interview.objects.create(
+        application=application,
+        start_datetime=start_dt,
+        end_datetime=end_dt,
+        location=request.POST.get('location', ''),
+    )
+    interview.interviewers.set(interviewers)
+    if application.status in ('Applied', 'Screening'):
+        application.status = 'Interview'
+        application.save()
+
+    messages.success(request, f"已為 {application.candidate.get_full_name()} 安排面試：{start_dt:%Y-%m-%d %H:%M}。")
+    return redirect('core:recruitment_pipeline', job_id=application.job.id)
+
 @user_passes_test(is_staff_user)
 @login_required
 def update_application_status_view(request, app_id):
@@ -0,0 +1,184 @@
+# core/year_end.py
+"""
+年終假期結算：在假期策略的年度起始月 (fiscal_year_start_month) 把上一年度未用完的年假
+依策略結轉 (最多 max_carry_over_amount) 或作廢。
+
+- 餘額來自 LeaveBalance (已核准的休假在顯示時扣除，因此剩餘 = 餘額 - 已核准時數)。
+- 依年度起始月把策略分組，同一組的員工一起分批計算；以天為單位的上限依班表每日工時換算。
+- 每個批次在一個交易中以批次操作更新餘額、寫入調整記錄 (帳本) 並推進 YearEndSettlement，
+  因此每個策略的每個年度只會結算一次，中斷後重新執行會從下一位員工繼續。
+"""
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Sum
+from django.utils import timezone
+
+from .accruals import ANNUAL_LEAVE_TYPE, daily_work_hours
+from .models import Employee, LeaveBalance, LeaveBalanceAdjustment, LeavePolicy, LeaveRequest, LeaveType, YearEndSettlement
+
+YEAR_END_CHUNK_SIZE = 500
+# 排程停機時，年度開始後這麼多天內仍會補跑結算
+YEAR_END_GRACE_DAYS = 31
+
+PREVIEW_COLUMNS = [
+    'policy', 'fiscal_year', 'employee_id', 'employee_number', 'name', 'balance_hours', 'used_hours',
+    'remaining_hours', 'max_carry_over_hours', 'carried_over_hours', 'forfeited_hours',
+]
+
+
+def fiscal_year_start(policy, today):
+    """today 所在假期年度的第一天。"""
+    start = date(today.year, policy.fiscal_year_start_month, 1)
+    return start if start <= today else date(today.year - 1, policy.fiscal_year_start_month, 1)
+
+
+def due_policies(today):
+    """
+    回傳 {年度起始月: [(策略, 要結算的年度)]}：年度剛開始 (YEAR_END_GRACE_DAYS 天內)
+    且上一年度尚未完成結算的策略。
+    """
+    completed = set(YearEndSettlement.objects.filter(completed_at__isnull=False).values_list('policy_id', 'fiscal_year'))
+    groups = defaultdict(list)
+    for policy in LeavePolicy.objects.order_by('fiscal_year_start_month', 'id'):
+        start = fiscal_year_start(policy, today)
+        if (today - start).days > YEAR_END_GRACE_DAYS:
+            continue
+        fiscal_year = start.year - 1
+        if (policy.id, fiscal_year) not in completed:
+            groups[policy.fiscal_year_start_month].append((policy, fiscal_year))
+    return groups
+
+
+def max_carry_over_hours(employee):
+    """員工的假期策略最多可結轉的時數；以天為單位時依班表每日工時換算，不允許結轉時為 0。"""
+    policy = employee.leave_policy
+    if not policy.allow_carry_over:
+        return Decimal('0.00')
+    max_carry = policy.max_carry_over_amount
+    if policy.accrual_unit == 'DAYS':
+        max_carry *= daily_work_hours(employee)
+    return max_carry
+
+
+def split_remaining(remaining, max_carry):
+    """把年度剩餘時數分成 (結轉, 作廢)。"""
+    carried = max(min(remaining, max_carry), Decimal('0.00'))
+    forfeited = max(remaining - carried, Decimal('0.00'))
+    return carried, forfeited
+
+
+def plan_settlement(employees, leave_type, fiscal_years):
+    """計算一批員工的結轉與作廢，回傳預覽列 (欄位見 PREVIEW_COLUMNS)。"""
+    employees = list(employees)
+    balances = {
+        balance.employee_id: balance
+        for balance in LeaveBalance.objects.filter(employee__in=employees, leave_type=leave_type)
+    }
+    used = dict(
+        LeaveRequest.objects.filter(employee__in=employees, leave_type=leave_type, status='Approved')
+        .values('employee_id').annotate(total=Sum('duration_hours')).values_list('employee_id', 'total')
+    )
+
+    rows = []
+    for emp in employees:
+        policy = emp.leave_policy
+        balance_hours = balances[emp.id].balance_hours if emp.id in balances else Decimal('0.00')
+        used_hours = used.get(emp.id) or Decimal('0.00')
+        remaining = balance_hours - used_hours
+        max_carry = max_carry_over_hours(emp)
+        carried, forfeited = split_remaining(remaining, max_carry)
+
+        rows.append({
+            'policy': policy.name,
+            'fiscal_year': fiscal_years[policy.id],
+            'employee_id': emp.id,
+            'employee_number': emp.employee_number or '',
+            'name': emp.user.get_full_name() or emp.user.username,
+            'balance_hours': balance_hours,
+            'used_hours': used_hours,
+            'remaining_hours': remaining,
+            'max_carry_over_hours': max_carry.quantize(Decimal('0.01')),
+            'carried_over_hours': carried.quantize(Decimal('0.01')),
+            'forfeited_hours': forfeited.quantize(Decimal('0.01')),
+        })
+    return rows
+
+
+def _apply_chunk(rows, leave_type, settlements):
+    """在一個交易中寫入一批員工的作廢調整、更新餘額並推進結算進度。"""
+    with transaction.atomic():
+        locked = {
+            settlement.id: settlement
+            for settlement in YearEndSettlement.objects.select_for_update().filter(id__in=[s.id for s in settlements.values()])
+        }
+        # 另一個程序已經處理過的員工 (結算進度已超過) 不再重複作廢
+        rows = [row for row in rows if row['employee_id'] > locked[settlements[row['policy_id']].id].last_employee_id]
+        forfeits = {row['employee_id']: row for row in rows if row['forfeited_hours'] > 0}
+        balances = list(LeaveBalance.objects.select_for_update().filter(employee_id__in=forfeits, leave_type=leave_type))
+        for balance in balances:
+            balance.balance_hours -= forfeits[balance.employee_id]['forfeited_hours']
+        LeaveBalance.objects.bulk_update(balances, ['balance_hours'])
+        LeaveBalanceAdjustment.objects.bulk_create([
+            LeaveBalanceAdjustment(
+                employee_id=row['employee_id'], leave_type=leave_type, hours_changed=-row['forfeited_hours'],
+                reason=f"Year-end settlement for {row['fiscal_year']}: carried over {row['carried_over_hours']}, forfeited {row['forfeited_hours']} hours",
+            )
+            for row in forfeits.values()
+        ], batch_size=1000)
+
+        for row in rows:
+            settlement = locked[settlements[row['policy_id']].id]
+            settlement.last_employee_id = max(settlement.last_employee_id, row['employee_id'])
+            settlement.employees += 1
+            settlement.carried_over_hours += row['carried_over_hours']
+            settlement.forfeited_hours += row['forfeited_hours']
+        YearEndSettlement.objects.bulk_update(locked.values(), ['last_employee_id', 'employees', 'carried_over_hours', 'forfeited_hours'])
+        for settlement in locked.values():
+            settlements[settlement.policy_id] = settlement
+
+
+def _settlement_for(policy, fiscal_year):
+    try:
+        return YearEndSettlement.objects.get_or_create(policy=policy, fiscal_year=fiscal_year)[0]
+    except IntegrityError:
+        # 另一個程序剛好同時建立
+        return YearEndSettlement.objects.get(policy=policy, fiscal_year=fiscal_year)
+
+
+def process_year_end(today=None, preview=False, chunk_size=YEAR_END_CHUNK_SIZE):
+    """
+    結算所有到期的策略，回傳預覽 / 處理過的列清單。
+    preview=True 時只計算，不寫入任何資料 (也不建立 YearEndSettlement)。
+    """
+    today = today or date.today()
+    leave_type = LeaveType.objects.get(name__iexact=ANNUAL_LEAVE_TYPE)
+    all_rows = []
+
+    for policies in due_policies(today).values():
+        fiscal_years = {policy.id: fiscal_year for policy, fiscal_year in policies}
+        settlements = {} if preview else {policy.id: _settlement_for(policy, fiscal_year) for policy, fiscal_year in policies}
+
+        employees = (
+            Employee.objects.filter(status='Active', leave_policy_id__in=fiscal_years)
+            .select_related('user', 'leave_policy', 'work_schedule')
+            .prefetch_related('work_schedule__rules')
+            .order_by('id')
+        )
+        # 從每個策略上次中斷處之後繼續
+        employees = [emp for emp in employees if preview or emp.id > settlements[emp.leave_policy_id].last_employee_id]
+
+        for offset in range(0, len(employees), chunk_size):
+            chunk = employees[offset:offset + chunk_size]
+            rows = plan_settlement(chunk, leave_type, fiscal_years)
+            for emp, row in zip(chunk, rows):
+                row['policy_id'] = emp.leave_policy_id
+            if not preview:
+                _apply_chunk(rows, leave_type, settlements)
+            all_rows.extend(rows)
+
+        if not preview:
+            YearEndSettlement.objects.filter(id__in=[s.id for s in settlements.values()], completed_at__isnull=True).update(completed_at=timezone.now())
+    return all_rows
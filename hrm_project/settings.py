@@ -159,4 +159,27 @@ EMAIL_PORT = 587
 EMAIL_USE_TLS = True  # 使用 TLS 加密
 EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER')
 EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD')
-DEFAULT_FROM_EMAIL = EMAIL_HOST_USER      
\ No newline at end of file
+DEFAULT_FROM_EMAIL = EMAIL_HOST_USER      
+# 快取：班表變動時間戳、在班看板、打卡網路規則、假日行事曆等都存放在這裡，
+# 失效時必須讓所有 worker 都看得到，因此使用共用的快取，而不是各進程獨立的 LocMemCache。
+# 設定 REDIS_URL 時使用 Redis，否則使用資料庫快取 (資料表由 migration 0042 建立)。
+if os.environ.get('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.environ['REDIS_URL'],
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'hrm_cache',
+            # 預設 300 筆會頻繁淘汰每位員工的時間戳與在班狀態
+            'OPTIONS': {'MAX_ENTRIES': 100000},
+        }
+    }
+
+# 反向代理 (例如 Nginx / 負載平衡器) 的 IP 或網段。
+# 只有來自這些位址的請求才會採用 X-Forwarded-For 判斷打卡 IP。
+TRUSTED_PROXIES = []